@@ -1,4 +1,11 @@
 import enum
+import mmap
+import os
+import threading
+import time
+from typing import Iterable, Union
+
+import numpy as np
 
 from loglib.loglib import loglib
 
@@ -9,6 +16,13 @@ class FILE_FMT(enum.IntEnum):
     VIDEO = IMAGE + 1
     JSON = VIDEO + 1
     BIN = JSON + 1
+    UNKNOWN = BIN + 1
+
+
+class FSYNC(enum.IntEnum):
+    NONE = 0  # leave it to os, fastest
+    FILE = NONE + 1  # fsync file data before rename
+    DIR = FILE + 1  # fsync file and its folder, the rename survives a power loss
 
 
 class filelib:
@@ -17,7 +31,7 @@ class filelib:
     @staticmethod
     def file_write_binary(buf: bytearray, file_name: str):
         """
-         write file in binary mode.
+         write file in binary mode (atomic, see file_write_stream).
 
         Parameters
         ----------
@@ -39,29 +53,118 @@ class filelib:
                 filelib.slogger.error('file_name is None or empty!!!')
                 ret = False
                 break
-            if not buf:
+            if buf is None or (hasattr(buf, '__len__') and len(buf) == 0):
                 filelib.slogger.error('buf is None!!!')
                 ret = False
                 break
+            if not isinstance(buf, (bytes, bytearray, memoryview, np.ndarray)):
+                filelib.slogger.error('TypeError to write file ({})..'.format(type(buf).__name__))
+                ret = False
+                break
+
+            (written, _) = filelib.file_write_stream([buf], file_name)
+            ret = written >= 0
+            break
+
+        return ret
+
+    @staticmethod
+    def file_write_stream(chunks: Iterable[Union[bytes, bytearray, memoryview, np.ndarray]], file_name: str,
+                          atomic: bool = True, fsync: 'FSYNC' = None):
+        """
+         write chunks to file in binary mode, the whole payload is never joined in memory.
+
+        ps. atomic writes a temp file in the same folder and renames it (os.replace), a reader sees the old
+        file or the complete new file, never a half-written one. a symlink is kept (its target is replaced) and
+        the mode of the replaced file is kept, but it's a new file (inode): hard links and open handles of the
+        old file still see the old data, use atomic=False to write in place.
+
+        Parameters
+        ----------
+        chunks : Iterable[Union[bytes, bytearray, memoryview, np.ndarray]]
+            chunks to write in order (generator is fine), ndarray is written as its raw bytes
+        file_name : str
+            file name
+        atomic : bool
+            write temp file and rename
+        fsync : FSYNC
+            fsync policy, None for FSYNC.NONE
+
+        Returns
+        -------
+        tuple : a tuple containing:
+            - written (int): written bytes, -1 when failed
+            - bps (float): bytes per second
+        """
+
+        written = -1
+        bps = 0.0
+
+        while True:
+            if not file_name or file_name == '':
+                filelib.slogger.error('file_name is None or empty!!!')
+                break
+
+            fsync = FSYNC.NONE if fsync is None else FSYNC(fsync)
+            # replace the target of a symlink, not the link itself
+            target = os.path.realpath(file_name) if atomic and os.path.islink(file_name) else file_name
+            tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp' if atomic else file_name
+            start = time.perf_counter()
 
             try:
-                with open(file_name, 'wb') as f:
-                    f.write(buf)
-                    break
+                count = 0
+                with open(tmp, 'wb') as f:
+                    for chunk in chunks:
+                        if type(chunk) is np.ndarray:
+                            chunk = np.ascontiguousarray(chunk)
+                        view = memoryview(chunk).cast('B')
+                        f.write(view)
+                        count += view.nbytes
+                    if fsync != FSYNC.NONE:
+                        f.flush()
+                        os.fsync(f.fileno())
+                if atomic:
+                    if os.path.exists(target):
+                        os.chmod(tmp, os.stat(target).st_mode & 0o7777)
+                    os.replace(tmp, target)
+                if fsync == FSYNC.DIR:
+                    filelib._fsync_dir(os.path.dirname(os.path.abspath(target)))
+                written = count
             except IOError as e:
                 filelib.slogger.error('Cannot open or write file ({})..'.format(e))
-                ret = False
-                break
-            except TypeError as e:
-                filelib.slogger.error('TypeError to write file ({})..'.format(e))
-                ret = False
-                break
+            except Exception as e:
+                # bad chunk types, or whatever the chunk generator raises
+                filelib.slogger.error('{} to write file ({})..'.format(type(e).__name__, e))
+            finally:
+                if written < 0 and atomic and os.path.exists(tmp):
+                    os.remove(tmp)
 
-        filelib.slogger.info('ret: {}'.format(ret))
-        return ret
+            elapsed = time.perf_counter() - start
+            bps = written / elapsed if written > 0 and elapsed > 0 else 0.0
+            filelib.slogger.debug(f'{file_name}: {written} bytes, {bps / 1e6:.1f} MB/s')
+            break
+
+        return written, bps
 
     @staticmethod
-    def file_read_binary(file_name: str):
+    def _fsync_dir(folder: str):
+        """
+        fsync folder so the rename itself is durable (not supported on windows).
+        """
+        try:
+            fd = os.open(folder, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def file_read_binary(file_name: str, offset: int = 0, length: int = -1, use_mmap: bool = False,
+                         out: Union[bytearray, memoryview, np.ndarray] = None):
         """
          read file in binary mode.
 
@@ -69,11 +172,19 @@ class filelib:
         ----------
         file_name : str
             file name
+        offset : int
+            read from offset
+        length : int
+            read length, -1 to the end of file
+        use_mmap : bool
+            map the file and return a read-only memoryview over it (no copy, pages are loaded on access)
+        out : Union[bytearray, memoryview, np.ndarray]
+            read into caller buffer (readinto), up to len(out) bytes when length is -1
 
         Returns
         -------
-        bytes
-            read buffer
+        Union[bytes, memoryview]
+            read buffer, memoryview for use_mmap or out (the filled part of out)
         """
 
         buf = None
@@ -85,32 +196,207 @@ class filelib:
 
             try:
                 with open(file_name, "rb") as f:
-                    buf = f.read()
+                    if use_mmap:
+                        if os.fstat(f.fileno()).st_size == 0:
+                            # empty file can't be mapped
+                            buf = memoryview(b'')
+                            break
+                        # the mapping stays valid after the file is closed, it's released with the last view
+                        buf = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                        buf = buf[offset:] if length < 0 else buf[offset:offset + length]
+                    elif out is not None:
+                        view = memoryview(out).cast('B')
+                        if length >= 0:
+                            view = view[:length]
+                        f.seek(offset)
+                        buf = view[:f.readinto(view)]
+                    else:
+                        f.seek(offset)
+                        buf = f.read(length)
             except IOError as e:
                 filelib.slogger.error('Cannot open or read file ({})..'.format(e))
-            except TypeError as e:
-                filelib.slogger.error('TypeError to read file ({})..'.format(e))
+            except (TypeError, ValueError) as e:
+                filelib.slogger.error('{} to read file ({})..'.format(type(e).__name__, e))
 
             break
 
         return buf
 
+    # region [format]
+    # extension -> FILE_FMT, None when the extension doesn't tell (sniff the content)
+    ext_cache = {}
+
+    # (offset, magic, format), checked in order
+    MAGICS = (
+        (0, b'\xff\xd8\xff', FILE_FMT.IMAGE),  # jpeg
+        (0, b'\x89PNG\r\n\x1a\n', FILE_FMT.IMAGE),
+        (0, b'GIF8', FILE_FMT.IMAGE),
+        (0, b'BM', FILE_FMT.IMAGE),
+        (0, b'II*\0', FILE_FMT.IMAGE),  # tiff
+        (0, b'MM\0*', FILE_FMT.IMAGE),
+        (8, b'WEBP', FILE_FMT.IMAGE),
+        (8, b'AVI ', FILE_FMT.VIDEO),
+        (4, b'ftyp', FILE_FMT.VIDEO),  # mp4/mov/3gp
+        (0, b'\x1a\x45\xdf\xa3', FILE_FMT.VIDEO),  # mkv/webm
+        (0, b'\x00\x00\x01\xba', FILE_FMT.VIDEO),  # mpeg ps
+        (0, b'\x00\x00\x01\xb3', FILE_FMT.VIDEO),
+    )
+    SNIFF_SIZE = 16
+
     @staticmethod
-    def get_format(file_name: str):
-        from pathlib import Path
-        if Path(file_name).is_dir():
+    def get_format(file_name: str, sniff: bool = True):
+        """
+        get file format by extension, sniff magic bytes when the extension is unknown.
+
+        Parameters
+        ----------
+        file_name : str
+            file name
+        sniff : bool
+            read the first bytes when the extension doesn't tell
+
+        Returns
+        -------
+        FILE_FMT
+            file format, FILE_FMT.UNKNOWN when not recognized
+        """
+        if os.path.isdir(file_name):
             return FILE_FMT.FOLDER
-        else:
-            import mimetypes
-            fmt, _ = mimetypes.guess_type(file_name)
-            if fmt.startswith('video'):
-                return FILE_FMT.VIDEO
-            elif fmt.startswith('image'):
-                return FILE_FMT.IMAGE
-            elif fmt.endswith('json'):
-                return FILE_FMT.JSON
-            elif fmt.endswith('octet-stream'):
-                return FILE_FMT.BIN
+        return filelib._get_file_format(file_name, sniff)
+
+    @staticmethod
+    def _get_file_format(file_name: str, sniff: bool = True):
+        fmt = filelib._format_by_ext(os.path.splitext(file_name)[1].lower())
+        if fmt is None:
+            fmt = filelib._format_by_magic(file_name) if sniff else FILE_FMT.UNKNOWN
+        return fmt
+
+    @staticmethod
+    def _format_by_ext(ext: str):
+        try:
+            return filelib.ext_cache[ext]
+        except KeyError:
+            pass
+
+        import mimetypes
+        (mime, _) = mimetypes.guess_type(f'file{ext}')
+        fmt = None
+        if mime is None:
+            pass
+        elif mime.startswith('video'):
+            fmt = FILE_FMT.VIDEO
+        elif mime.startswith('image'):
+            fmt = FILE_FMT.IMAGE
+        elif mime.endswith('json'):
+            fmt = FILE_FMT.JSON
+        elif mime.endswith('octet-stream'):
+            fmt = FILE_FMT.BIN
+
+        filelib.ext_cache[ext] = fmt
+        return fmt
+
+    @staticmethod
+    def _format_by_magic(file_name: str):
+        try:
+            with open(file_name, 'rb') as f:
+                head = f.read(filelib.SNIFF_SIZE)
+        except OSError:
+            return FILE_FMT.UNKNOWN
+
+        for offset, magic, fmt in filelib.MAGICS:
+            if head[offset:offset + len(magic)] == magic:
+                return fmt
+        if head.lstrip()[:1] in (b'{', b'['):
+            return FILE_FMT.JSON
+        if b'\0' in head:
+            return FILE_FMT.BIN
+        return FILE_FMT.UNKNOWN
+
+    # endregion [format]
+
+    # region [scan]
+    @staticmethod
+    def scan(folder: str, recursive: bool = True, workers: int = 0, sniff: bool = True):
+        """
+        index a folder with os.scandir, records are yielded lazily.
+
+        ps. scandir gets the entry type without a stat call, the format is resolved by extension (cached),
+        only files with an unknown extension are opened (sniff).
+
+        Parameters
+        ----------
+        folder : str
+            folder to scan
+        recursive : bool
+            scan sub folders
+        workers : int
+            thread count to scan sub folders in parallel, 0 to scan in caller thread
+        sniff : bool
+            sniff magic bytes for unknown extension
+
+        Yields
+        ------
+        tuple : a tuple containing:
+            - path (str): entry path
+            - format (FILE_FMT): entry format
+            - size (int): file size, 0 for folder
+            - mtime (float): modification time
+        """
+        if not os.path.isdir(folder):
+            filelib.slogger.error(f'{folder} is not a folder!!!')
+            return
+
+        if workers <= 0:
+            folders = [folder]
+            while folders:
+                (records, subfolders) = filelib._scan_folder(folders.pop(), sniff)
+                yield from records
+                if recursive:
+                    folders.extend(reversed(subfolders))
+            return
+
+        # each job scans one folder, sub folders found are queued as new jobs;
+        # pending jobs are bounded so a huge tree isn't listed ahead of the consumer
+        from collections import deque
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        folders = deque([folder])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = set()
+            while folders or futures:
+                while folders and len(futures) < workers * 2:
+                    futures.add(pool.submit(filelib._scan_folder, folders.popleft(), sniff))
+                (done, futures) = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (records, subfolders) = future.result()
+                    if recursive:
+                        folders.extend(subfolders)
+                    yield from records
+
+    @staticmethod
+    def _scan_folder(folder: str, sniff: bool):
+        records = []
+        subfolders = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            subfolders.append(entry.path)
+                            records.append((entry.path, FILE_FMT.FOLDER, 0, st.st_mtime))
+                        elif entry.is_file():
+                            st = entry.stat()
+                            fmt = filelib._get_file_format(entry.path, sniff)
+                            records.append((entry.path, fmt, st.st_size, st.st_mtime))
+                    except OSError as e:
+                        # entry removed while scanning or broken link
+                        filelib.slogger.debug(f'{type(e).__name__}!!! {e}')
+        except OSError as e:
+            filelib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        return records, subfolders
+
+    # endregion [scan]
 
 
 # region [main]
@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from typing import Iterable, Union
+
+import numpy as np
+
+from filelib.filelib import FSYNC, filelib
+from loglib.loglib import loglib
+
+
+class writerlib:
+    """
+    Background file writer, write() puts a job into a bounded queue and returns, a worker thread writes it
+    with filelib.file_write_stream, so a frame-dump loop doesn't wait for disk.
+
+    Usage:
+        with writerlib() as writer:
+            for k, frame in enumerate(frames):
+                writer.write([frame], f'frame_{k}.raw')
+        print(writer.bps)
+    """
+
+    slogger = loglib(__name__)
+
+    def __init__(self, max_queue: int = 16, atomic: bool = True, fsync: FSYNC = FSYNC.NONE):
+        """
+        Parameters
+        ----------
+        max_queue : int
+            max pending jobs, write() blocks (or drops, see write) when the queue is full
+        atomic : bool
+            write temp file and rename, see filelib.file_write_stream (symlinks, hard links)
+        fsync : FSYNC
+            fsync policy
+        """
+        self.atomic = atomic
+        self.fsync = fsync
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        # stats
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.seconds = 0.0
+        self.files = 0
+        self.errors = 0
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._run, name='writerlib', daemon=True)
+        self.thread.start()
+
+    # region [writer]
+    def write(self, chunks: Iterable[Union[bytes, bytearray, memoryview, np.ndarray]], file_name: str,
+              copy: bool = True, block: bool = True, timeout: float = None):
+        """
+        queue a write job.
+
+        Parameters
+        ----------
+        chunks : Iterable[Union[bytes, bytearray, memoryview, np.ndarray]]
+            chunks to write in order
+        file_name : str
+            file name
+        copy : bool
+            snapshot the chunks now, keep it True when the caller reuses its buffers (e.g. imagelib out=)
+        block : bool
+            wait for a free slot when the queue is full, False to drop the job
+        timeout : float
+            max seconds to wait when block is True, None to wait forever
+
+        Returns
+        -------
+        bool
+            True when queued, False when dropped or the writer is closed
+        """
+        if self.thread is None:
+            writerlib.slogger.error('writer is closed!!!')
+            return False
+
+        if copy:
+            chunks = [bytes(np.ascontiguousarray(chunk)) if type(chunk) is np.ndarray else bytes(chunk)
+                      for chunk in chunks]
+
+        try:
+            self.queue.put((chunks, file_name), block=block, timeout=timeout)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            writerlib.slogger.warning(f'queue is full, drop {file_name}!!!')
+            return False
+
+        return True
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    break
+
+                (chunks, file_name) = job
+                start = time.perf_counter()
+                (written, _) = filelib.file_write_stream(chunks, file_name, self.atomic, self.fsync)
+                with self.lock:
+                    self.seconds += time.perf_counter() - start
+                    if written < 0:
+                        self.errors += 1
+                    else:
+                        self.bytes += written
+                        self.files += 1
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        wait until all queued jobs are written.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        write the queued jobs and stop the worker thread.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        writerlib.slogger.info(f'{self.files} files, {self.bytes} bytes, {self.bps / 1e6:.1f} MB/s, '
+                               f'errors: {self.errors}, dropped: {self.dropped}')
+
+    @property
+    def bps(self):
+        """
+        bytes per second of the worker (time spent in writing only).
+        """
+        with self.lock:
+            return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    # endregion [writer]
+
+    # region [with]
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    # endregion [with]
+
+
+def main():
+    """
+    For console test
+    """
+    import os
+    import tempfile
+
+    folder = tempfile.mkdtemp()
+    frame = np.zeros((1080, 1920, 2), dtype=np.uint8)
+    start = time.perf_counter()
+    with writerlib() as writer:
+        for k in range(30):
+            frame[...] = k
+            writer.write([frame], os.path.join(folder, f'frame_{k:03d}.raw'))
+        queued = time.perf_counter() - start
+    print(f'queued in {queued * 1000:.1f} ms, written in {(time.perf_counter() - start) * 1000:.1f} ms, '
+          f'{writer.bps / 1e6:.1f} MB/s')
+
+    import shutil
+    shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
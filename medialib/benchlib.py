@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from loglib.loglib import loglib
+from medialib import DICT_RESOLUTIONS
+from medialib.geomlib import geomlib
+from medialib.imagelib import imagelib
+
+
+class benchlib:
+    """
+    Benchmark of imagelib hot paths on synthetic frames.
+
+    Every case runs at each size of DICT_RESOLUTIONS plus 4K and reports:
+        ms: ms per call (best of repeat)
+        ns_pixel: ns per pixel
+        mbps: MB/s of input data
+        peak_bytes: peak bytes allocated during a call (tracemalloc, numpy buffers are traced)
+
+    ps. there's no allocation count per call, tracemalloc only sees the blocks still alive (a snapshot misses the
+    temporaries freed within the call), peak_bytes catches them.
+
+    Results are saved as json, compare() reports cases slower than a base result.
+
+    Usage:
+        python -m medialib.benchlib --out new.json --compare base.json
+    """
+
+    slogger = loglib(__name__)
+
+    RESOLUTIONS = {**DICT_RESOLUTIONS, '3840x2160': {'w': 3840, 'h': 2160, 'default': False}}
+
+    # region [case]
+    @staticmethod
+    def cases(width: int, height: int, folder: str):
+        """
+        benchmark cases of one resolution.
+
+        Parameters
+        ----------
+        width : int
+            width of frame
+        height : int
+            height of frame
+        folder : str
+            folder to save the synthetic image files for im2* loaders
+
+        Returns
+        -------
+        dict
+            name -> (func, input bytes)
+        """
+        rng = np.random.default_rng(0)
+        # gradient + noise, so jpeg has something to code (pure noise is unrealistic slow)
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        rgb888 = np.stack((x + 0 * y, y + 0 * x, (x + y) / 2), axis=-1)
+        rgb888 = (rgb888 + rng.normal(0, 8, rgb888.shape)).clip(0, 255).astype(np.uint8)
+        rgba = imagelib.rgb8882rgba(rgb888)
+        rgb565 = imagelib.rgb8882rgb565(rgb888)
+        yuv444 = imagelib.rgb8882yuv444(rgb888)
+        ycrcb444 = imagelib.rgb8882ycrcb444(rgb888)
+
+        jpg = os.path.join(folder, f'{width}x{height}.jpg')
+        png = os.path.join(folder, f'{width}x{height}.png')
+        Image.fromarray(rgb888).save(jpg, quality=90)
+        Image.fromarray(rgb888).save(png, compress_level=1)
+        jpg_size = os.path.getsize(jpg)
+        png_size = os.path.getsize(png)
+
+        (w2, h2) = (width // 2, height // 2)
+        n = rgb888.nbytes
+        return {
+            # convert
+            'rgb5652rgb888': (lambda: imagelib.rgb5652rgb888(rgb565, width, height), len(rgb565)),
+            'rgb5652rgb888_replicate': (lambda: imagelib.rgb5652rgb888(rgb565, width, height, True), len(rgb565)),
+            'rgb8882rgb565': (lambda: imagelib.rgb8882rgb565(rgb888), n),
+            'rgb8882rgb565_dither': (lambda: imagelib.rgb8882rgb565(rgb888, dither=True), n),
+            'bgr8882rgb565': (lambda: imagelib.bgr8882rgb565(rgb888), n),
+            'rgba2rgb888': (lambda: imagelib.rgba2rgb888(rgba, width, height), rgba.nbytes),
+            'rgb8882rgba': (lambda: imagelib.rgb8882rgba(rgb888), n),
+            'buf2rgba_rgb565': (lambda: imagelib.buf2rgba(rgb565, width, height, 2), len(rgb565)),
+            'rgb8882yuv444': (lambda: imagelib.rgb8882yuv444(rgb888), n),
+            'yuv4442rgb888': (lambda: imagelib.yuv4442rgb888(yuv444), n),
+            'rgb8882yuv422': (lambda: imagelib.rgb8882yuv422(rgb888), n),
+            'rgb8882uyvy': (lambda: imagelib.rgb8882uyvy(rgb888), n),
+            'rgb8882nv12': (lambda: imagelib.rgb8882nv12(rgb888), n),
+            'rgb8882i420': (lambda: imagelib.rgb8882i420(rgb888), n),
+            'rgb8882ycrcb444': (lambda: imagelib.rgb8882ycrcb444(rgb888), n),
+            'ycrcb4442rgb888': (lambda: imagelib.ycrcb4442rgb888(ycrcb444), n),
+            'rgb8882ycrcb422': (lambda: imagelib.rgb8882ycrcb422(rgb888), n),
+            # geometry
+            'cv2resize_half': (lambda: imagelib.cv2resize(rgb888, w2, h2), n),
+            'pilresize_half': (lambda: imagelib.pilresize(rgb888, w2, h2), n),
+            'cv2crop_center': (lambda: imagelib.cv2crop(rgb888, w2 // 2, h2 // 2, w2, h2), n),
+            'pilcrop_center': (lambda: imagelib.pilcrop(rgb888, w2 // 2, h2 // 2, w2, h2), n),
+            'pilrotate_90': (lambda: imagelib.pilrotate(rgb888, 90), n),
+            'pilrotate_30': (lambda: imagelib.pilrotate(rgb888, 30), n),
+            'geomlib_resize_half': (lambda: geomlib.resize(rgb888, w2, h2), n),
+            'geomlib_crop_center': (lambda: geomlib.crop(rgb888, w2 // 2, h2 // 2, w2, h2, copy=True), n),
+            'geomlib_rotate_30': (lambda: geomlib.rotate(rgb888, 30), n),
+            # loader
+            'im2rgb888_jpg': (lambda: imagelib.im2rgb888(jpg), jpg_size),
+            'im2rgb888_png': (lambda: imagelib.im2rgb888(png), png_size),
+            'im2rgba_jpg': (lambda: imagelib.im2rgba(jpg), jpg_size),
+            'im2rgb565_jpg': (lambda: imagelib.im2rgb565(jpg), jpg_size),
+            'im2rgb565_jpg_320x240': (lambda: imagelib.im2rgb565(jpg, 320, 240), jpg_size),
+            'cv2imread_jpg': (lambda: imagelib.cv2imread(jpg), jpg_size),
+        }
+
+    @staticmethod
+    def measure(func: Callable, pixels: int, nbytes: int, number: int = 5, repeat: int = 3):
+        """
+        measure one case.
+
+        Parameters
+        ----------
+        func : Callable
+            case function
+        pixels : int
+            pixels per call
+        nbytes : int
+            input bytes per call
+        number : int
+            calls per repeat
+        repeat : int
+            repeat count, the best one is reported
+
+        Returns
+        -------
+        dict
+            ms, ns_pixel, mbps, peak_bytes
+        """
+        # warm up (lazy tables, plans, caches of libraries)
+        func()
+
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            best = min(best, (time.perf_counter() - start) / number)
+
+        # tracemalloc slows calls down, so the peak is measured in another run; start() begins with a fresh peak
+        # (no reset_peak, it's python 3.9+)
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            func()
+            peak_bytes = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+        return {'ms': best * 1e3, 'ns_pixel': best * 1e9 / pixels, 'mbps': nbytes / best / 1e6,
+                'peak_bytes': peak_bytes}
+
+    # endregion [case]
+
+    # region [run]
+    @staticmethod
+    def run(resolutions: list = None, pattern: str = None, number: int = 5, repeat: int = 3):
+        """
+        run benchmark.
+
+        Parameters
+        ----------
+        resolutions : list
+            resolution names (keys of RESOLUTIONS), None for all
+        pattern : str
+            regex of case names, None for all
+        number : int
+            calls per repeat
+        repeat : int
+            repeat count
+
+        Returns
+        -------
+        dict
+            {'meta': {...}, 'results': {resolution: {case: {ms, ns_pixel, mbps, peak_bytes}}}}
+        """
+        import tempfile
+
+        # loaders log image_info on every call
+        level = imagelib.slogger.logger.level
+        imagelib.slogger.setlevel(logging.WARNING)
+
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                for name in resolutions or benchlib.RESOLUTIONS:
+                    res = benchlib.RESOLUTIONS[name]
+                    (width, height) = (res['w'], res['h'])
+                    results[name] = {}
+                    for case, (func, nbytes) in benchlib.cases(width, height, folder).items():
+                        if pattern and not re.search(pattern, case):
+                            continue
+                        results[name][case] = benchlib.measure(func, width * height, nbytes, number, repeat)
+                        r = results[name][case]
+                        benchlib.slogger.info(f'{name} {case}: {r["ms"]:.3f} ms, {r["ns_pixel"]:.2f} ns/pixel, '
+                                              f'{r["mbps"]:.0f} MB/s, peak {r["peak_bytes"] / 1e6:.2f} MB')
+        finally:
+            imagelib.slogger.setlevel(level)
+
+        return {'meta': benchlib.meta(), 'results': results}
+
+    @staticmethod
+    def meta():
+        """
+        environment of a run, to tell results of different machines or commits apart.
+        """
+        import subprocess
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            commit = ''
+
+        return {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'machine': platform.machine(),
+                'processor': platform.processor(), 'python': platform.python_version(), 'numpy': np.__version__,
+                'cv2': cv2.__version__, 'pillow': Image.__version__, 'threads': cv2.getNumThreads()}
+
+    # endregion [run]
+
+    # region [result]
+    @staticmethod
+    def save(result: dict, file: str):
+        """
+        save result as json.
+        """
+        loglib.create_parent_folder(os.path.abspath(file))
+        with open(file, 'w') as f:
+            json.dump(result, f, indent=1)
+
+    @staticmethod
+    def load(file: str):
+        """
+        load result json, None when failed.
+        """
+        try:
+            with open(file, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            benchlib.slogger.error(f'{type(e).__name__}!!! {e}')
+        return None
+
+    @staticmethod
+    def compare(base: dict, new: dict, threshold: float = 0.1):
+        """
+        compare two results, cases of both results are compared.
+
+        Parameters
+        ----------
+        base : dict
+            base result (e.g. of the previous commit)
+        new : dict
+            new result
+        threshold : float
+            ratio of slow down (or more allocation) to report, 0.1 = 10%
+
+        Returns
+        -------
+        list
+            regressions, (resolution, case, metric, base value, new value, ratio)
+        """
+        regressions = []
+        for name, cases in new['results'].items():
+            for case, r in cases.items():
+                b = base['results'].get(name, {}).get(case)
+                if b is None:
+                    continue
+                for metric in ('ms', 'peak_bytes'):
+                    # not in results of older versions
+                    if metric not in b or metric not in r:
+                        continue
+                    # ignore the noise of tiny allocations
+                    if metric == 'peak_bytes' and r[metric] - b[metric] < 4096:
+                        continue
+                    ratio = r[metric] / b[metric] if b[metric] else float('inf')
+                    if ratio > 1 + threshold:
+                        regressions.append((name, case, metric, b[metric], r[metric], ratio))
+                        benchlib.slogger.warning(f'{name} {case} {metric}: {b[metric]:.3f} -> {r[metric]:.3f} '
+                                                 f'({(ratio - 1) * 100:+.0f}%)')
+
+        return regressions
+
+    # endregion [result]
+
+
+def main():
+    """
+    For console test
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='imagelib benchmark')
+    parser.add_argument('--out', help='save result json')
+    parser.add_argument('--compare', help='base result json to compare with')
+    parser.add_argument('--resolution', action='append', choices=list(benchlib.RESOLUTIONS),
+                        help='resolution (repeatable), default all')
+    parser.add_argument('--case', help='regex of case names')
+    parser.add_argument('--number', type=int, default=5, help='calls per repeat')
+    parser.add_argument('--repeat', type=int, default=3, help='repeat count')
+    parser.add_argument('--threshold', type=float, default=0.1, help='regression threshold')
+    args = parser.parse_args()
+
+    result = benchlib.run(args.resolution, args.case, args.number, args.repeat)
+    if args.out:
+        benchlib.save(result, args.out)
+
+    if args.compare:
+        base = benchlib.load(args.compare)
+        if base is not None:
+            regressions = benchlib.compare(base, result, args.threshold)
+            print(f'{len(regressions)} regressions')
+            return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,479 @@
+import functools
+import json
+import math
+import os
+import time
+from threading import Lock
+from typing import Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from loglib.loglib import loglib
+
+
+class geomlib:
+    """
+    Geometric ops (resize, crop, rotate) with the fastest backend per (op, dtype, channel, size).
+
+    Backends:
+        cv2: works on the ndarray in place of memory, no conversion
+        pil: Image.fromarray -> op -> np.array, two copies, sometimes faster anyway (e.g. BOX resize)
+        numpy: crop only, a view (or one copy)
+
+    The choice comes from a calibration (time every backend once on synthetic frames, about a second) run at the
+    first use and saved as json (calibration_file), it's run again when cv2/Pillow/numpy versions are changed.
+    Only the default filter of resize/rotate (INTERS_CALIBRATED) is calibrated, cv2 and PIL differ a lot by filter.
+    Opt out by calibration_file = None or PYMISC2_GEOMLIB_CALIBRATE=0. The static choice (cv2, numpy for crop) is
+    used for the other filters and when opted out.
+    """
+
+    slogger = loglib(__name__)
+
+    VERSION = 2
+    calibration_file = os.path.join(os.path.expanduser('~'), '.cache', 'pymisc2', 'geomlib.json')
+    # False to never calibrate at the first use (only load calibration_file)
+    auto_calibrate = os.environ.get('PYMISC2_GEOMLIB_CALIBRATE', '1') != '0'
+
+    # size buckets (pixels), an image uses the first bucket not smaller than it (the last one when larger)
+    SIZES = {'small': (320, 240), 'medium': (1280, 720), 'large': (1920, 1080)}
+    # (dtype, channel) combinations to calibrate
+    TYPES = (('uint8', 1), ('uint8', 3), ('uint8', 4), ('float32', 1))
+    OPS = ('resize', 'crop', 'rotate')
+
+    INTERS = {
+        'nearest': (cv2.INTER_NEAREST, Image.NEAREST),
+        'linear': (cv2.INTER_LINEAR, Image.BILINEAR),
+        'cubic': (cv2.INTER_CUBIC, Image.BICUBIC),
+        'area': (cv2.INTER_AREA, Image.BOX),
+        'lanczos': (cv2.INTER_LANCZOS4, Image.LANCZOS),
+    }
+
+    # op -> the filter calibrated (the default one)
+    INTERS_CALIBRATED = {'resize': 'area', 'rotate': 'nearest'}
+
+    # counterclockwise turns -> cv2.rotate code
+    ROTATE_CODES = {1: cv2.ROTATE_90_COUNTERCLOCKWISE, 2: cv2.ROTATE_180, 3: cv2.ROTATE_90_CLOCKWISE}
+
+    lock = Lock()
+    # key -> backend, see get_table
+    table = None
+
+    # region [backend]
+    @staticmethod
+    def key(op: str, image: np.ndarray, inter: str = None):
+        """
+        calibration key of an op (with filter inter) on image, e.g. 'resize/area/uint8/3/medium', 'crop/uint8/3/small'.
+        """
+        pixels = image.shape[0] * image.shape[1]
+        size = next((name for name, (w, h) in geomlib.SIZES.items() if pixels <= w * h), 'large')
+        channel = 1 if image.ndim == 2 else image.shape[2]
+        return f'{op}/{inter}/{image.dtype}/{channel}/{size}' if inter else f'{op}/{image.dtype}/{channel}/{size}'
+
+    @staticmethod
+    def pil_supported(image: np.ndarray):
+        """
+        if PIL has a mode for image (L, RGB, RGBA, F).
+        """
+        channel = 1 if image.ndim == 2 else image.shape[2]
+        return (image.dtype == np.uint8 and channel in (1, 3, 4)) or (image.dtype == np.float32 and channel == 1)
+
+    @staticmethod
+    def backend(op: str, image: np.ndarray, inter: str = None):
+        """
+        get the backend of an op (with filter inter, resize/rotate) on image.
+
+        Returns
+        -------
+        str
+            'cv2', 'pil' or 'numpy'
+        """
+        default = 'numpy' if op == 'crop' else 'cv2'
+        if not geomlib.pil_supported(image):
+            return default
+        if inter and inter != geomlib.INTERS_CALIBRATED.get(op):
+            return default
+        return geomlib.get_table().get(geomlib.key(op, image, inter), default)
+
+    @staticmethod
+    def get_table():
+        """
+        get backend table, load it from calibration_file at first use, calibrate and save it when it's not found
+        or out of date.
+
+        Returns
+        -------
+        dict
+            key -> backend, empty (static choice) when calibration is opted out (see auto_calibrate)
+        """
+        if geomlib.table is not None:
+            return geomlib.table
+
+        with geomlib.lock:
+            if geomlib.table is None:
+                table = geomlib.load()
+                if table is None and geomlib.calibration_file and geomlib.auto_calibrate:
+                    table = geomlib.calibrate()
+                    geomlib.save(table)
+                geomlib.table = {} if table is None else table
+            return geomlib.table
+
+    @staticmethod
+    def env():
+        return {'version': geomlib.VERSION, 'cv2': cv2.__version__, 'pillow': Image.__version__,
+                'numpy': np.__version__, 'threads': cv2.getNumThreads()}
+
+    @staticmethod
+    def load():
+        """
+        load backend table from calibration_file, None when not found or calibrated in another environment.
+        """
+        if not geomlib.calibration_file or not os.path.isfile(geomlib.calibration_file):
+            return None
+        try:
+            with open(geomlib.calibration_file, 'r') as f:
+                data = json.load(f)
+            if data.get('env') == geomlib.env():
+                return data['table']
+        except (IOError, ValueError, KeyError) as e:
+            geomlib.slogger.error(f'{type(e).__name__}!!! {e}')
+        return None
+
+    @staticmethod
+    def save(table: dict):
+        """
+        save backend table to calibration_file (write temp file and rename).
+        """
+        if not geomlib.calibration_file:
+            return False
+        try:
+            loglib.create_parent_folder(os.path.abspath(geomlib.calibration_file))
+            tmp = f'{geomlib.calibration_file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'env': geomlib.env(), 'table': table}, f, indent=1)
+            os.replace(tmp, geomlib.calibration_file)
+        except IOError as e:
+            geomlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return False
+        return True
+
+    @staticmethod
+    def calibrate(number: int = 2, save: bool = False):
+        """
+        time every backend of every (op, dtype, channel, size) on synthetic frames, about a second.
+
+        Parameters
+        ----------
+        number : int
+            calls per backend, the best one is used
+        save : bool
+            True to use the table from now on and save it to calibration_file
+
+        Returns
+        -------
+        dict
+            key -> fastest backend
+        """
+        start = time.perf_counter()
+        rng = np.random.default_rng(0)
+        cases = {
+            'resize': lambda image, backend: geomlib.resize(image, image.shape[1] // 2, image.shape[0] // 2,
+                                                            geomlib.INTERS_CALIBRATED['resize'], backend),
+            'crop': lambda image, backend: geomlib.crop(image, 8, 8, image.shape[1] // 2, image.shape[0] // 2,
+                                                        copy=True, backend=backend),
+            'rotate': lambda image, backend: geomlib.rotate(image, 30, inter=geomlib.INTERS_CALIBRATED['rotate'],
+                                                            backend=backend),
+        }
+
+        table = {}
+        for (w, h) in geomlib.SIZES.values():
+            for dtype, channel in geomlib.TYPES:
+                shape = (h, w) if channel == 1 else (h, w, channel)
+                image = rng.integers(0, 256, shape).astype(dtype)
+                for op in geomlib.OPS:
+                    timings = {}
+                    for backend in ('numpy' if op == 'crop' else 'cv2', 'pil'):
+                        cases[op](image, backend)
+                        best = float('inf')
+                        for _ in range(number):
+                            t = time.perf_counter()
+                            cases[op](image, backend)
+                            best = min(best, time.perf_counter() - t)
+                        timings[backend] = best
+                    table[geomlib.key(op, image, geomlib.INTERS_CALIBRATED.get(op))] = min(timings, key=timings.get)
+
+        geomlib.slogger.info(f'calibrated in {time.perf_counter() - start:.1f} s')
+        if save:
+            with geomlib.lock:
+                geomlib.table = table
+            geomlib.save(table)
+        return table
+
+    # endregion [backend]
+
+    # region [op]
+    @staticmethod
+    def _pil(image: np.ndarray):
+        return Image.fromarray(image)
+
+    @staticmethod
+    def resize(image: np.ndarray, width: int = 0, height: int = 0, inter: str = 'area', backend: str = None):
+        """
+        image resize and keep the aspect rate of the original image when width is 0 or height is 0.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            image buffer, (h, w) or (h, w, c)
+        width : int
+            width
+        height : int
+            height
+        inter : str
+            'nearest', 'linear', 'cubic', 'area' (box filter in PIL) or 'lanczos'
+        backend : str
+            'cv2' or 'pil', None to choose by calibration
+
+        Returns
+        -------
+        np.ndarray
+            resized buffer, image itself when both width and height are 0
+        """
+        (h, w) = image.shape[:2]
+        if width == 0 and height == 0:
+            return image
+        if width == 0:
+            width = int(w * height / float(h))
+        elif height == 0:
+            height = int(h * width / float(w))
+
+        backend = backend or geomlib.backend('resize', image, inter)
+        (cv2_inter, pil_inter) = geomlib.INTERS[inter]
+        if backend == 'pil':
+            # np.array, np.asarray of a PIL image is read-only and the other backends are writable
+            return np.array(geomlib._pil(image).resize((width, height), pil_inter))
+        return cv2.resize(image, (width, height), interpolation=cv2_inter)
+
+    @staticmethod
+    def crop(image: np.ndarray, x: int = 0, y: int = 0, width: int = 0, height: int = 0, copy: bool = False,
+             backend: str = None):
+        """
+        image crop, the box is clipped to the image.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            image buffer
+        x : int
+            x
+        y : int
+            y
+        width : int
+            width, 0 to the right edge
+        height : int
+            height, 0 to the bottom edge
+        copy : bool
+            False to return a view (no copy, it shares memory with image), True for an own (contiguous) buffer
+        backend : str
+            'numpy' or 'pil' (copy only), None to choose by calibration
+
+        Returns
+        -------
+        np.ndarray
+            crop buffer
+        """
+        (h, w) = image.shape[:2]
+        (x, y) = (max(0, int(x)), max(0, int(y)))
+        x2 = w if width == 0 else min(w, x + int(width))
+        y2 = h if height == 0 else min(h, y + int(height))
+
+        if not copy:
+            return image[y:y2, x:x2]
+
+        backend = backend or geomlib.backend('crop', image)
+        if backend == 'pil':
+            return np.array(geomlib._pil(image).crop((x, y, x2, y2)))
+        return image[y:y2, x:x2].copy()
+
+    @staticmethod
+    def rotate(image: np.ndarray, angle: float, expand: bool = True, inter: str = 'nearest', backend: str = None,
+               copy: bool = True):
+        """
+        image rotate, same semantics as PIL: counterclockwise in degrees around the center, black fill.
+
+        ps. right angles (0/90/180/270, 90/270 when expand or square, same as PIL) are lossless: a view
+        (copy=False) or one cv2.rotate copy; other angles are one cv2.warpAffine with a cached matrix.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            image buffer
+        angle : float
+            angle in degrees, counterclockwise
+        expand : bool
+            enlarge the output to hold the whole rotated image, False to keep the size
+        inter : str
+            'nearest', 'linear' or 'cubic' ('area' and 'lanczos' are always done by cv2)
+        backend : str
+            'cv2' or 'pil', None to choose by calibration (other angles only)
+        copy : bool
+            False to return a view for right angles (np.rot90, not contiguous)
+
+        Returns
+        -------
+        np.ndarray
+            rotated buffer
+        """
+        (h, w) = image.shape[:2]
+        k = geomlib.right_angle(w, h, angle, expand)
+        if k is not None:
+            if not copy:
+                return np.rot90(image, k)
+            return image.copy() if k == 0 else cv2.rotate(image, geomlib.ROTATE_CODES[k])
+
+        backend = backend or geomlib.backend('rotate', image, inter)
+        (cv2_inter, pil_inter) = geomlib.INTERS[inter]
+        # PIL rotate supports nearest/linear/cubic only
+        if backend == 'pil' and pil_inter in (Image.NEAREST, Image.BILINEAR, Image.BICUBIC):
+            return np.array(geomlib._pil(image).rotate(angle, pil_inter, expand))
+
+        (matrix, width, height) = geomlib.rotate_matrix(w, h, angle, expand)
+        return cv2.warpAffine(image, matrix, (width, height), flags=cv2_inter | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    @staticmethod
+    def rotate_batch(frames: Union[np.ndarray, list], angle: float, expand: bool = True, inter: str = 'nearest',
+                     copy: bool = True, out: np.ndarray = None):
+        """
+        rotate frames of the same size by the same angle, the matrix and output geometry are computed once.
+
+        Parameters
+        ----------
+        frames : Union[np.ndarray, list]
+            (N, h, w) or (N, h, w, c) ndarray, or list of frames
+        angle : float
+            angle in degrees, counterclockwise
+        expand : bool
+            see rotate
+        inter : str
+            see rotate
+        copy : bool
+            False to return a view for right angles (np.rot90 of the stack)
+        out : np.ndarray
+            output buffer, (N, h', w'[, c]) contiguous, None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (N, h', w'[, c]) rotated frames, out when out is given; None when failed
+        """
+        try:
+            frames = np.asarray(frames) if type(frames) is list else frames
+            (h, w) = frames.shape[1:3]
+            k = geomlib.right_angle(w, h, angle, expand)
+            if k is not None and not copy and out is None:
+                return np.rot90(frames, k, axes=(1, 2))
+
+            if k is None:
+                (matrix, width, height) = geomlib.rotate_matrix(w, h, angle, expand)
+            else:
+                (width, height) = (h, w) if k % 2 else (w, h)
+            shape = (len(frames), height, width) + frames.shape[3:]
+            if out is None:
+                out = np.empty(shape, dtype=frames.dtype)
+            elif out.shape != shape or not out.flags.c_contiguous:
+                geomlib.slogger.error(f'out shape {out.shape} != {shape} or not contiguous!!!')
+                return None
+
+            for frame, dst in zip(frames, out):
+                if k is None:
+                    cv2.warpAffine(frame, matrix, (width, height), dst=dst,
+                                   flags=geomlib.INTERS[inter][0] | cv2.WARP_INVERSE_MAP,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+                elif k == 0:
+                    np.copyto(dst, frame)
+                else:
+                    cv2.rotate(frame, geomlib.ROTATE_CODES[k], dst=dst)
+        except Exception as e:
+            geomlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return None
+
+        return out
+
+    @staticmethod
+    def right_angle(width: int, height: int, angle: float, expand: bool = True):
+        """
+        number of 90 degree turns when the rotation is a lossless transpose, the cases PIL transposes.
+
+        Returns
+        -------
+        int
+            0 ~ 3 (counterclockwise), None when it's not a right angle rotation
+        """
+        k = {0: 0, 90: 1, 180: 2, 270: 3}.get(angle % 360)
+        if k is None or (k % 2 and not expand and width != height):
+            return None
+        return k
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def rotate_matrix(width: int, height: int, angle: float, expand: bool = True):
+        """
+        inverse affine matrix (output pixel -> input position) of PIL Image.rotate, for cv2.warpAffine with
+        WARP_INVERSE_MAP. results are cached (the matrix is read-only).
+
+        Parameters
+        ----------
+        width : int
+            input width
+        height : int
+            input height
+        angle : float
+            angle in degrees, counterclockwise
+        expand : bool
+            enlarge the output to hold the whole rotated image
+
+        Returns
+        -------
+        tuple : a tuple containing:
+            - matrix (np.ndarray): 2x3 float64 matrix
+            - width (int): output width
+            - height (int): output height
+        """
+        # same steps (and rounding) as PIL, so the output size and pixels are the same
+        rad = -math.radians(angle % 360.0)
+        (a, b, d, e) = (round(math.cos(rad), 15), round(math.sin(rad), 15), round(-math.sin(rad), 15),
+                        round(math.cos(rad), 15))
+        (cx, cy) = (width / 2.0, height / 2.0)
+        c = a * -cx + b * -cy + cx
+        f = d * -cx + e * -cy + cy
+
+        (w, h) = (width, height)
+        if expand:
+            xx = [a * x + b * y + c for x, y in ((0, 0), (width, 0), (width, height), (0, height))]
+            yy = [d * x + e * y + f for x, y in ((0, 0), (width, 0), (width, height), (0, height))]
+            w = math.ceil(max(xx)) - math.floor(min(xx))
+            h = math.ceil(max(yy)) - math.floor(min(yy))
+            (tx, ty) = (-(w - width) / 2.0, -(h - height) / 2.0)
+            (c, f) = (a * tx + b * ty + c, d * tx + e * ty + f)
+
+        # PIL maps the pixel center (x + 0.5, y + 0.5) to a continuous position (pixel k covers [k, k + 1)),
+        # cv2 maps pixel x to a position in pixel centers (pixel k is at k), so shift both by half a pixel
+        matrix = np.array([[a, b, c + (a + b) / 2 - 0.5], [d, e, f + (d + e) / 2 - 0.5]], dtype=np.float64)
+        matrix.flags.writeable = False
+        return matrix, w, h
+
+    # endregion [op]
+
+
+def main():
+    """
+    For console test, calibrate and save to calibration_file
+    """
+    for key, backend in sorted(geomlib.calibrate(save=True).items()):
+        print(f'{key}: {backend}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import enum
+import os
+import threading
+from collections import OrderedDict
 from typing import Union
 
 import cv2
@@ -5,16 +9,93 @@ import numpy as np
 from PIL import Image, UnidentifiedImageError
 
 from loglib.loglib import loglib
+from medialib.geomlib import geomlib
 
-MASK5 = 0b011111
-MASK6 = 0b111111
+
+class PIX_FMT(enum.Enum):
+    L8 = 'l8'
+    RGB565 = 'rgb565'
+    RGB888 = 'rgb888'
+    BGR888 = 'bgr888'
+    RGBA = 'rgba'
+    # output only
+    YUYV = 'yuyv'
+    UYVY = 'uyvy'
+    NV12 = 'nv12'
+    NV21 = 'nv21'
+    I420 = 'i420'
+
+
+# buf2* channel -> pixel format
+CHANNEL_FMT = {1: PIX_FMT.L8, 2: PIX_FMT.RGB565, 3: PIX_FMT.RGB888, 4: PIX_FMT.RGBA}
 
 
 class imagelib:
     slogger = loglib(__name__)
 
+    # decoded image cache of pilopen/cv2imread (imlrulib), None to decode every time, see set_cache
+    cache = None
+
+    @staticmethod
+    def set_cache(max_bytes: int = 256 << 20):
+        """
+        enable (or disable) the in-process decoded image cache of pilopen/cv2imread.
+
+        ps. cached cv2imread buffers are shared and read-only (copy before writing), pilopen returns a copy of
+        the cached (loaded) image, so draft() no longer reduces the decode of a cached file.
+
+        Parameters
+        ----------
+        max_bytes : int
+            max total decoded bytes, 0 to disable
+
+        Returns
+        -------
+        imlrulib
+            the cache, None when disabled
+        """
+        if max_bytes <= 0:
+            imagelib.cache = None
+        else:
+            from medialib.imlrulib import imlrulib
+            imagelib.cache = imlrulib(max_bytes)
+        return imagelib.cache
+
+    @staticmethod
+    def _out(out: Union[np.ndarray, bytearray, memoryview, None], shape: tuple):
+        """
+        get the output ndarray for a conversion.
+
+        Parameters
+        ----------
+        out : Union[np.ndarray, bytearray, memoryview, None]
+            caller supplied output buffer, None to allocate a new one
+        shape : tuple
+            output shape (uint8)
+
+        Returns
+        -------
+        np.ndarray
+            out itself when it is a contiguous ndarray of the shape, otherwise a writable uint8 view over out
+        """
+        if out is None:
+            return np.empty(shape, dtype=np.uint8)
+        if type(out) is np.ndarray and out.dtype == np.uint8 and out.shape == tuple(shape):
+            # cv2 dst= silently reallocates a non-contiguous array instead of writing into it
+            if not out.flags.c_contiguous:
+                raise ValueError('out is not contiguous!!!')
+            if not out.flags.writeable:
+                raise ValueError('out is read-only!!!')
+            return out
+
+        # view over caller memory (must be contiguous and writable, reshape never copies here)
+        view = np.frombuffer(out, dtype=np.uint8).reshape(shape)
+        if not view.flags.writeable:
+            raise ValueError('out is read-only!!!')
+        return view
+
     @staticmethod
-    def rgba2rgb888(rgba: bytes, width: int, height: int):
+    def rgba2rgb888(rgba: bytes, width: int, height: int, out: Union[np.ndarray, bytearray] = None):
         """
         RGBA to RGB888.
 
@@ -26,25 +107,29 @@ class imagelib:
             width of image
         height : int
             height of image
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 3 bytes), None to allocate
 
         Returns
         -------
         np.ndarray
-            rgb888 image data
+            rgb888 image data (view over out when out is given)
         """
 
         rgb888 = None
 
         try:
             rgba = np.frombuffer(rgba, dtype=np.uint8).reshape(height, width, 4)
-            rgb888 = cv2.cvtColor(rgba, cv2.COLOR_RGBA2RGB)
+            rgb888 = imagelib._out(out, (height, width, 3))
+            np.copyto(rgb888, rgba[..., :3])
         except Exception as e:
             imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
 
         return rgb888
 
     @staticmethod
-    def rgb8882rgba(rgb888: Union[bytes, np.ndarray], width: int = 0, height: int = 0):
+    def rgb8882rgba(rgb888: Union[bytes, np.ndarray], width: int = 0, height: int = 0,
+                    out: Union[np.ndarray, bytearray] = None):
         """
         RGB888 to RGBA.
 
@@ -56,33 +141,40 @@ class imagelib:
             width of image
         height : int
             height of image
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 4 bytes), None to allocate
 
         Returns
         -------
         np.ndarray
-            rgba image data
+            rgba image data (view over out when out is given)
         """
 
         rgba = None
 
         try:
-            if type(rgb888) is bytes:
+            if type(rgb888) is not np.ndarray:
                 rgb888 = np.frombuffer(rgb888, dtype=np.uint8).reshape(height, width, 3)
-            elif type(rgb888) is np.ndarray:
-                pass
-            rgba = cv2.cvtColor(rgb888, cv2.COLOR_RGB2RGBA)
+            (height, width) = rgb888.shape[:2]
+            rgba = imagelib._out(out, (height, width, 4))
+            rgba[..., :3] = rgb888
+            rgba[..., 3] = 0xff
         except Exception as e:
             imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
 
         return rgba
 
     @staticmethod
-    def rgb5652rgb888(rgb565: bytes, width: int, height: int):
+    def rgb5652rgb888(rgb565: bytes, width: int, height: int, replicate: bool = False,
+                      out: Union[np.ndarray, bytearray] = None):
         """
         RGB565 to RGB888.
 
         reference: https://tinyurl.com/y8fqbvfm
 
+        ps. the buffer is viewed as little-endian uint16 once and r/g/b are written straight into the rgb888
+        output, no full-size intermediate plane is created.
+
         Parameters
         ----------
         rgb565 : bytes
@@ -91,34 +183,79 @@ class imagelib:
             width of image
         height : int
             height of image
+        replicate : bool
+            replicate the high bits into the low bits (r << 3 | r >> 2), so 0x1f maps to 0xff instead of 0xf8
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 3 bytes), None to allocate
 
         Returns
         -------
         np.ndarray
-            rgb888 image data
+            rgb888 image data (view over out when out is given)
         """
 
         rgb888 = None
 
         try:
-            # convert to ndarray (height, width, channel)
-            rgb565 = np.frombuffer(rgb565, dtype=np.uint8).reshape(height, width, 2)
-            # convert WxHx2 array of uint8 into WxH array of uint16
-            byte0 = rgb565[:, :, 0].astype(np.uint16)
-            byte1 = rgb565[:, :, 1].astype(np.uint16)
-            rgb565 = (byte0 | byte1 << 8)
-            # convert 565 to 888
-            b8 = (rgb565 & MASK5) << 3
-            g8 = ((rgb565 >> 5) & MASK6) << 2
-            r8 = ((rgb565 >> (5 + 6)) & MASK5) << 3
-            rgb888 = np.dstack((r8, g8, b8)).astype(np.uint8)
+            # view as little-endian uint16 (height, width), no copy
+            rgb565 = np.frombuffer(rgb565, dtype='<u2').reshape(height, width)
+            rgb888 = imagelib._out(out, (height, width, 3))
+            if replicate and rgb888.flags.c_contiguous:
+                # the lookup table is one gather, faster than shift + or per channel
+                from medialib.lutlib import lutlib
+                lutlib.decode(rgb565, width, height, replicate, rgb888)
+            else:
+                imagelib._rgb565_decode(rgb565, rgb888[..., 0], rgb888[..., 1], rgb888[..., 2], replicate)
         except Exception as e:
             imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
 
         return rgb888
 
     @staticmethod
-    def rgb8882rgb565(rgb888: np.ndarray):
+    def _rgb565_decode(rgb565: np.ndarray, r8: np.ndarray, g8: np.ndarray, b8: np.ndarray,
+                       replicate: bool = False):
+        """
+        decode uint16 rgb565 into uint8 r/g/b planes (usually channel views of one output).
+
+        ps. ufuncs with out= and casting='unsafe' keep the low 8 bits, so each channel is one shift and one mask.
+
+        Parameters
+        ----------
+        rgb565 : np.ndarray
+            rgb565 data as uint16 (height, width)
+        r8 : np.ndarray
+            output red plane, uint8 (height, width)
+        g8 : np.ndarray
+            output green plane, uint8 (height, width)
+        b8 : np.ndarray
+            output blue plane, uint8 (height, width)
+        replicate : bool
+            replicate the high bits into the low bits
+        """
+        # r8 = ((v >> 11) & 0x1f) << 3 = (v >> 8) & 0xf8
+        np.right_shift(rgb565, 8, out=r8, casting='unsafe')
+        np.bitwise_and(r8, 0xf8, out=r8)
+        # g8 = ((v >> 5) & 0x3f) << 2 = (v >> 3) & 0xfc
+        np.right_shift(rgb565, 3, out=g8, casting='unsafe')
+        np.bitwise_and(g8, 0xfc, out=g8)
+        # b8 = (v & 0x1f) << 3 = low byte of (v << 3)
+        np.left_shift(rgb565, 3, out=b8, casting='unsafe')
+
+        if not replicate:
+            return
+
+        # x8 |= x8 >> (bits), done in row bands so the scratch stays small
+        band = 64
+        scratch = np.empty((min(band, r8.shape[0]),) + r8.shape[1:], dtype=np.uint8)
+        for y in range(0, r8.shape[0], band):
+            for plane, bits in ((r8, 5), (g8, 6), (b8, 5)):
+                rows = plane[y:y + band]
+                tmp = scratch[:rows.shape[0]]
+                np.right_shift(rows, bits, out=tmp)
+                np.bitwise_or(rows, tmp, out=rows)
+
+    @staticmethod
+    def rgb8882rgb565(rgb888: np.ndarray, out: Union[np.ndarray, bytearray] = None, dither: bool = False):
         """
         RGB888 to RGB565.
 
@@ -128,22 +265,63 @@ class imagelib:
         ----------
         rgb888 : np.ndarray
             rgb888 image data
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes), None to allocate
+        dither : bool
+            4x4 ordered dither to full range levels (lutlib.encode), hides banding on 565 displays
 
         Returns
         -------
-        bytes
-            rgb565 image data
+        Union[bytes, np.ndarray]
+            rgb565 image data, (height, width, 2) view over out when out is given
         """
+        if dither:
+            from medialib.lutlib import lutlib
+            rgb565 = lutlib.encode(rgb888, dither=True, out=out)
+            if rgb565 is None:
+                return None
+            return rgb565.tobytes() if out is None else rgb565
 
-        r5 = (rgb888[..., 0] >> 3).astype(np.uint16) << 11
-        g6 = (rgb888[..., 1] >> 2).astype(np.uint16) << 5
-        b5 = (rgb888[..., 2] >> 3).astype(np.uint16)
-        rgb565 = r5 | g6 | b5
+        return imagelib._rgb8882rgb565(rgb888, cv2.COLOR_RGB2BGR565, out)
 
-        return rgb565.tobytes()
+    @staticmethod
+    def _rgb8882rgb565(image: np.ndarray, code: int, out: Union[np.ndarray, bytearray] = None):
+        """
+        pack 3 channel image to little-endian RGB565 with cv2 (r >> 3 << 11 | g >> 2 << 5 | b >> 3), other
+        integer dtypes than uint8 (cv2 rejects them) are packed by numpy.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            rgb888/bgr888 image data
+        code : int
+            cv2.COLOR_RGB2BGR565 for rgb888, cv2.COLOR_BGR2BGR565 for bgr888
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes), None to allocate
+
+        Returns
+        -------
+        Union[bytes, np.ndarray]
+            rgb565 image data, (height, width, 2) view over out when out is given
+        """
+        # cv2 cannot wrap negative strides (e.g. [..., ::-1])
+        if min(image.strides) < 0:
+            image = np.ascontiguousarray(image)
+
+        rgb565 = imagelib._out(out, image.shape[:-1] + (2,))
+        if image.dtype != np.uint8:
+            (r, b) = (0, 2) if code == cv2.COLOR_RGB2BGR565 else (2, 0)
+            words = rgb565.view('<u2')[..., 0]
+            np.copyto(words, (image[..., r] >> 3).astype(np.uint16) << 11, casting='unsafe')
+            np.bitwise_or(words, (image[..., 1] >> 2).astype(np.uint16) << 5, out=words)
+            np.bitwise_or(words, (image[..., b] >> 3).astype(np.uint16), out=words)
+        else:
+            cv2.cvtColor(image, code, dst=rgb565)
+
+        return rgb565.tobytes() if out is None else rgb565
 
     @staticmethod
-    def bgr8882rgb565(bgr888: np.ndarray):
+    def bgr8882rgb565(bgr888: np.ndarray, out: Union[np.ndarray, bytearray] = None, dither: bool = False):
         """
         BGR888 to RGB565.
 
@@ -153,22 +331,23 @@ class imagelib:
         ----------
         bgr888 : np.ndarray
             bgr888 image data
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes), None to allocate
+        dither : bool
+            4x4 ordered dither to full range levels (lutlib.encode), hides banding on 565 displays
 
         Returns
         -------
-        bytes
-            rgb565 image data
+        Union[bytes, np.ndarray]
+            rgb565 image data, (height, width, 2) view over out when out is given
         """
+        if dither:
+            return imagelib.rgb8882rgb565(bgr888[..., ::-1], out, dither)
 
-        r5 = (bgr888[..., 2] >> 3).astype(np.uint16) << 11
-        g6 = (bgr888[..., 1] >> 2).astype(np.uint16) << 5
-        b5 = (bgr888[..., 0] >> 3).astype(np.uint16)
-        rgb565 = r5 | g6 | b5
-
-        return rgb565.tobytes()
+        return imagelib._rgb8882rgb565(bgr888, cv2.COLOR_BGR2BGR565, out)
 
     @staticmethod
-    def cv2imread(img_name: str, cvt_rgb: bool = True):
+    def cv2imread(img_name: str, cvt_rgb: bool = True, reduce: int = 1):
         """
          read image file.
 
@@ -178,11 +357,13 @@ class imagelib:
             image name
         cvt_rgb : bool
             if convert to RGB
+        reduce : int
+            1 for full size, 2/4/8 to decode at 1/2, 1/4, 1/8 size (JPEG uses DCT scaling)
 
         Returns
         -------
         np.ndarray
-            image buffer
+            image buffer, read-only when imagelib.cache is set (shared with the cache, copy() to modify it)
         """
 
         buf = None
@@ -192,9 +373,23 @@ class imagelib:
                 imagelib.slogger.error('file_name is None or empty!!!')
                 break
 
-            buf = cv2.imread(img_name)
+            cache = imagelib.cache
+            if cache is not None:
+                key = ('cv2imread', os.path.abspath(img_name), cvt_rgb, reduce)
+                stamp = cache.stamp(img_name)
+                buf = cache.get(key, stamp)
+                if buf is not None:
+                    break
+
+            flags = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                     8: cv2.IMREAD_REDUCED_COLOR_8}.get(reduce, cv2.IMREAD_COLOR)
+            buf = cv2.imread(img_name, flags)
             if cvt_rgb:
                 buf = cv2.cvtColor(buf, cv2.COLOR_BGR2RGB)
+
+            if cache is not None and buf is not None:
+                buf.flags.writeable = False
+                cache.put(key, stamp, buf, buf.nbytes)
             break
 
         return buf
@@ -297,7 +492,7 @@ class imagelib:
         return crop
 
     @staticmethod
-    def getiminfo(file: str):
+    def getiminfo(file: str, index=None):
         """
         get image (jpg,bmp...etc) info (width, height, channel).
 
@@ -305,6 +500,8 @@ class imagelib:
         ----------
         file : str
             file name
+        index : imindexlib
+            image info index, query the index instead of opening the file (None to open the file)
 
         Returns
         -------
@@ -314,8 +511,11 @@ class imagelib:
             - channel (int): image channel
         """
 
-        # get image info
-        pilimage = imagelib.pilopen(file)
+        if index is not None:
+            return index.getiminfo(file)
+
+        # get image info (header only, no decode)
+        pilimage = imagelib.pilopen(file, lazy=True)
 
         if pilimage is None:
             imagelib.slogger.error('pilimage is None!!!')
@@ -330,7 +530,7 @@ class imagelib:
         return width, height, channel
 
     @staticmethod
-    def buf2rgba(buffer: bytes, width: int, height: int, channel: int):
+    def buf2rgba(buffer: bytes, width: int, height: int, channel: int, out: Union[np.ndarray, bytearray] = None):
         """
         convert buffer to rgba.
 
@@ -344,6 +544,8 @@ class imagelib:
             height of image
         channel : int
             color channel
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 4 bytes), None to allocate
 
         Returns
         -------
@@ -351,22 +553,12 @@ class imagelib:
             rgba image data
         """
 
-        rgba = None
-        if channel == 1:
-            image = Image.frombytes('L', (width, height), buffer, 'raw')
-            rgba = image.convert('RGBA')
-            rgba = np.array(rgba)
-        elif channel == 2:
-            buffer = imagelib.rgb5652rgb888(buffer, width, height)
-            rgba = imagelib.rgb8882rgba(buffer, width, height)
-        elif channel == 3:
-            rgba = imagelib.rgb8882rgba(buffer, width, height)
-        elif channel == 4:
-            rgba = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
-        return rgba
+        if channel not in CHANNEL_FMT:
+            return None
+        return imagelib.convert(buffer, CHANNEL_FMT[channel], PIX_FMT.RGBA, width, height, out)
 
     @staticmethod
-    def buf2rgb888(buffer: bytes, width: int, height: int, channel: int):
+    def buf2rgb888(buffer: bytes, width: int, height: int, channel: int, out: Union[np.ndarray, bytearray] = None):
         """
         convert buffer to rgb888.
 
@@ -380,6 +572,8 @@ class imagelib:
             height of image
         channel : int
             color channel
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 3 bytes), None to allocate
 
         Returns
         -------
@@ -387,21 +581,12 @@ class imagelib:
             rgb888 image data
         """
 
-        rgb888 = None
-        if channel == 1:
-            image = Image.frombytes('L', (width, height), buffer, 'raw')
-            rgb888 = image.convert('RGB')
-            rgb888 = np.array(rgb888)
-        elif channel == 2:
-            rgb888 = imagelib.rgb5652rgb888(buffer, width, height)
-        elif channel == 3:
-            rgb888 = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
-        elif channel == 4:
-            rgb888 = imagelib.rgba2rgb888(buffer, width, height)
-        return rgb888
+        if channel not in CHANNEL_FMT:
+            return None
+        return imagelib.convert(buffer, CHANNEL_FMT[channel], PIX_FMT.RGB888, width, height, out)
 
     @staticmethod
-    def buf2rgb565(buffer: bytes, width: int, height: int, channel: int):
+    def buf2rgb565(buffer: bytes, width: int, height: int, channel: int, out: Union[np.ndarray, bytearray] = None):
         """
         convert buffer to rgb565.
 
@@ -415,6 +600,8 @@ class imagelib:
             height of image
         channel : int
             color channel
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes), None to allocate
 
         Returns
         -------
@@ -422,26 +609,175 @@ class imagelib:
             rgb565 image data
         """
 
-        rgb565 = None
-        if channel == 1:
-            image = Image.frombytes('L', (width, height), buffer, 'raw')
-            rgb888 = image.convert('RGB')
-            rgb888 = np.array(rgb888)
-            rgb565 = imagelib.rgb8882rgb565(rgb888)
-        elif channel == 2:
-            pass
-        elif channel == 3:
-            rgb565 = imagelib.rgb8882rgb565(buffer)
-        elif channel == 4:
-            buffer = imagelib.rgba2rgb888(buffer, width, height)
-            rgb565 = imagelib.rgb8882rgb565(buffer)
+        if channel not in CHANNEL_FMT:
+            return None
+        return imagelib.convert(buffer, CHANNEL_FMT[channel], PIX_FMT.RGB565, width, height, out)
 
-        # bytes to np.ndarray
-        rgb565 = np.frombuffer(rgb565, dtype=np.uint8).reshape(height, width, 2)
-        return rgb565
+    # region [convert]
+    plan = None
 
     @staticmethod
-    def im2rgba(file: str, resize_width: int = 0, resize_height: int = 0):
+    def convert(buffer: Union[bytes, np.ndarray], src_fmt: Union[PIX_FMT, str], dst_fmt: Union[PIX_FMT, str],
+                width: int, height: int, out: Union[np.ndarray, bytearray] = None):
+        """
+        convert pixel format with one direct kernel per (src_fmt, dst_fmt), no intermediate format.
+
+        ps. same format returns a view over buffer when out is None.
+
+        Parameters
+        ----------
+        buffer : Union[bytes, np.ndarray]
+            image data
+        src_fmt : Union[PIX_FMT, str]
+            source pixel format (l8, rgb565, rgb888, bgr888, rgba)
+        dst_fmt : Union[PIX_FMT, str]
+            destination pixel format (PIX_FMT)
+        width : int
+            width of image
+        height : int
+            height of image
+        out : Union[np.ndarray, bytearray]
+            output buffer, None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            converted image data, shape see imagelib.fmt_shape
+        """
+
+        converted = None
+
+        try:
+            (src_fmt, dst_fmt) = (PIX_FMT(src_fmt), PIX_FMT(dst_fmt))
+            plan = imagelib.get_plan()
+            if (src_fmt, dst_fmt) not in plan:
+                imagelib.slogger.error(f'{src_fmt} -> {dst_fmt} is not supported!!!')
+                return None
+
+            src = np.frombuffer(buffer, dtype=np.uint8).reshape(imagelib.fmt_shape(src_fmt, width, height))
+            if src_fmt == dst_fmt:
+                converted = src
+                if out is not None:
+                    converted = imagelib._out(out, src.shape)
+                    np.copyto(converted, src)
+            else:
+                dst = imagelib._out(out, imagelib.fmt_shape(dst_fmt, width, height))
+                converted = plan[(src_fmt, dst_fmt)](src, dst)
+        except Exception as e:
+            imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        return converted
+
+    @staticmethod
+    def fmt_shape(fmt: PIX_FMT, width: int, height: int):
+        """
+        ndarray shape (uint8) of pixel format.
+
+        Parameters
+        ----------
+        fmt : PIX_FMT
+            pixel format
+        width : int
+            width of image
+        height : int
+            height of image
+
+        Returns
+        -------
+        tuple
+            (height, width) for l8, (height * 3 / 2, width) for 420, otherwise (height, width, bytes per pixel)
+        """
+        if fmt == PIX_FMT.L8:
+            return height, width
+        elif fmt in (PIX_FMT.NV12, PIX_FMT.NV21, PIX_FMT.I420):
+            return height * 3 // 2, width
+        elif fmt in (PIX_FMT.RGB888, PIX_FMT.BGR888):
+            return height, width, 3
+        elif fmt == PIX_FMT.RGBA:
+            return height, width, 4
+        return height, width, 2
+
+    @staticmethod
+    def get_plan():
+        """
+        conversion plan, {(src_fmt, dst_fmt): kernel(src, dst) -> dst}, built once.
+
+        Returns
+        -------
+        dict
+            conversion plan
+        """
+        if imagelib.plan is not None:
+            return imagelib.plan
+
+        def cvt(code: int):
+            return lambda src, dst: cv2.cvtColor(src, code, dst=dst)
+
+        def rgb565(r: int, g: int, b: int, alpha: bool = False):
+            # decode straight into the channels of dst
+            def kernel(src, dst):
+                u16 = src.view('<u2').reshape(src.shape[:2])
+                imagelib._rgb565_decode(u16, dst[..., r], dst[..., g], dst[..., b])
+                if alpha:
+                    dst[..., 3] = 0xff
+                return dst
+            return kernel
+
+        def yuv(code: int, pack):
+            return lambda src, dst: pack(cv2.cvtColor(src[..., :3], code), out=dst)
+
+        from functools import partial
+        packs = ((PIX_FMT.YUYV, partial(imagelib._pack422, uyvy=False)),
+                 (PIX_FMT.UYVY, partial(imagelib._pack422, uyvy=True)),
+                 (PIX_FMT.NV12, partial(imagelib._pack420, layout='nv12')),
+                 (PIX_FMT.NV21, partial(imagelib._pack420, layout='nv21')),
+                 (PIX_FMT.I420, partial(imagelib._pack420, layout='i420')))
+
+        plan = {
+            (PIX_FMT.L8, PIX_FMT.RGB565): cvt(cv2.COLOR_GRAY2BGR565),
+            (PIX_FMT.L8, PIX_FMT.RGB888): cvt(cv2.COLOR_GRAY2RGB),
+            (PIX_FMT.L8, PIX_FMT.BGR888): cvt(cv2.COLOR_GRAY2BGR),
+            (PIX_FMT.L8, PIX_FMT.RGBA): cvt(cv2.COLOR_GRAY2RGBA),
+
+            (PIX_FMT.RGB565, PIX_FMT.L8): cvt(cv2.COLOR_BGR5652GRAY),
+            (PIX_FMT.RGB565, PIX_FMT.RGB888): rgb565(0, 1, 2),
+            (PIX_FMT.RGB565, PIX_FMT.BGR888): rgb565(2, 1, 0),
+            (PIX_FMT.RGB565, PIX_FMT.RGBA): rgb565(0, 1, 2, alpha=True),
+
+            (PIX_FMT.RGB888, PIX_FMT.L8): cvt(cv2.COLOR_RGB2GRAY),
+            (PIX_FMT.RGB888, PIX_FMT.RGB565): cvt(cv2.COLOR_RGB2BGR565),
+            (PIX_FMT.RGB888, PIX_FMT.BGR888): cvt(cv2.COLOR_RGB2BGR),
+            (PIX_FMT.RGB888, PIX_FMT.RGBA): cvt(cv2.COLOR_RGB2RGBA),
+
+            (PIX_FMT.BGR888, PIX_FMT.L8): cvt(cv2.COLOR_BGR2GRAY),
+            (PIX_FMT.BGR888, PIX_FMT.RGB565): cvt(cv2.COLOR_BGR2BGR565),
+            (PIX_FMT.BGR888, PIX_FMT.RGB888): cvt(cv2.COLOR_BGR2RGB),
+            (PIX_FMT.BGR888, PIX_FMT.RGBA): cvt(cv2.COLOR_BGR2RGBA),
+
+            (PIX_FMT.RGBA, PIX_FMT.L8): cvt(cv2.COLOR_RGBA2GRAY),
+            (PIX_FMT.RGBA, PIX_FMT.RGB565): cvt(cv2.COLOR_RGBA2BGR565),
+            (PIX_FMT.RGBA, PIX_FMT.RGB888): cvt(cv2.COLOR_RGBA2RGB),
+            (PIX_FMT.RGBA, PIX_FMT.BGR888): cvt(cv2.COLOR_RGBA2BGR),
+        }
+
+        # same format (handled in convert)
+        for fmt in CHANNEL_FMT.values():
+            plan[(fmt, fmt)] = None
+        plan[(PIX_FMT.BGR888, PIX_FMT.BGR888)] = None
+
+        # yuv: rgb/bgr/rgba -> yuv444 -> strided pack
+        for (src_fmt, code) in ((PIX_FMT.RGB888, cv2.COLOR_RGB2YUV), (PIX_FMT.BGR888, cv2.COLOR_BGR2YUV),
+                                (PIX_FMT.RGBA, cv2.COLOR_RGB2YUV)):
+            for (dst_fmt, pack) in packs:
+                plan[(src_fmt, dst_fmt)] = yuv(code, pack)
+
+        imagelib.plan = plan
+        return plan
+
+    # endregion [convert]
+
+    @staticmethod
+    def im2rgba(file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
         """
         convert image (jpg,bmp...etc) to rgba.
 
@@ -453,6 +789,11 @@ class imagelib:
             resize width, resize when both w/h are not 0
         resize_height : int
             resize height, resize when both w/h are not 0
+        reducing_gap : float
+            None for full decode + exact resize, otherwise decode reduced first (JPEG DCT scaling, 1/2 ~ 1/8)
+            to no less than reducing_gap times the resize size, then resize exactly.
+            speed vs quality: 1.0 is fastest (less is used as 1.0), 2.0 ~ 3.0 is hardly different from the full
+            decode
 
         Returns
         -------
@@ -464,8 +805,8 @@ class imagelib:
             - buf (bytes): image rgba data
         """
 
-        # get image info
-        pilimage = imagelib.pilopen(file)
+        # get image info (not cached when it's going to be drafted)
+        pilimage = imagelib.pilopen(file, lazy=bool(reducing_gap and resize_width and resize_height))
 
         if pilimage is None:
             imagelib.slogger.error('pilimage is None!!!')
@@ -481,7 +822,7 @@ class imagelib:
         # resize image when both w/h are not 0
         if resize_width != 0 and resize_height != 0:
             (height, width) = (resize_height, resize_width)
-            pilimage = pilimage.resize((resize_width, resize_height))
+            pilimage = imagelib._pilresize_reduced(pilimage, resize_width, resize_height, reducing_gap)
 
         # Modes: https://pillow.readthedocs.io/en/stable/handbook/concepts.html#modes
         if pilimage.mode == 'RGBA':
@@ -498,7 +839,7 @@ class imagelib:
         return width, height, 4, image_info, buf.tobytes()
 
     @staticmethod
-    def im2rgb888(file: str, resize_width: int = 0, resize_height: int = 0):
+    def im2rgb888(file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
         """
         convert image (jpg,bmp...etc) to rgb888.
 
@@ -510,6 +851,11 @@ class imagelib:
             resize width, resize when both w/h are not 0
         resize_height : int
             resize height, resize when both w/h are not 0
+        reducing_gap : float
+            None for full decode + exact resize, otherwise decode reduced first (JPEG DCT scaling, 1/2 ~ 1/8)
+            to no less than reducing_gap times the resize size, then resize exactly.
+            speed vs quality: 1.0 is fastest (less is used as 1.0), 2.0 ~ 3.0 is hardly different from the full
+            decode
 
         Returns
         -------
@@ -521,8 +867,8 @@ class imagelib:
             - buf (bytes): image rgb888 data
         """
 
-        # get image info
-        pilimage = imagelib.pilopen(file)
+        # get image info (not cached when it's going to be drafted)
+        pilimage = imagelib.pilopen(file, lazy=bool(reducing_gap and resize_width and resize_height))
 
         if pilimage is None:
             imagelib.slogger.error('pilimage is None!!!')
@@ -538,7 +884,7 @@ class imagelib:
         # resize image when both w/h are not 0
         if resize_width != 0 and resize_height != 0:
             (height, width) = (resize_height, resize_width)
-            pilimage = pilimage.resize((resize_width, resize_height))
+            pilimage = imagelib._pilresize_reduced(pilimage, resize_width, resize_height, reducing_gap)
 
         # Modes: https://pillow.readthedocs.io/en/stable/handbook/concepts.html#modes
         if pilimage.mode == 'RGB':
@@ -555,7 +901,7 @@ class imagelib:
         return width, height, 3, image_info, buf.tobytes()
 
     @staticmethod
-    def im2rgb565(file: str, resize_width: int = 0, resize_height: int = 0):
+    def im2rgb565(file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
         """
         convert image (jpg,bmp...etc) to rgb565.
 
@@ -567,6 +913,11 @@ class imagelib:
             resize width, resize when both w/h are not 0
         resize_height : int
             resize height, resize when both w/h are not 0
+        reducing_gap : float
+            None for full decode + exact resize, otherwise decode reduced first (JPEG DCT scaling, 1/2 ~ 1/8)
+            to no less than reducing_gap times the resize size, then resize exactly.
+            speed vs quality: 1.0 is fastest (less is used as 1.0), 2.0 ~ 3.0 is hardly different from the full
+            decode
 
         Returns
         -------
@@ -579,7 +930,7 @@ class imagelib:
         """
 
         # get RGB888 first
-        width, height, _, image_info, buf888 = imagelib.im2rgb888(file, resize_width, resize_height)
+        width, height, _, image_info, buf888 = imagelib.im2rgb888(file, resize_width, resize_height, reducing_gap)
 
         # convert to ndarray
         rgb888 = np.frombuffer(buf888, dtype=np.uint8).reshape(height, width, 3)
@@ -593,14 +944,139 @@ class imagelib:
         return width, height, 2, image_info, buf
 
     @staticmethod
-    def pilopen(img_name: str):
+    def im2file_tiled(file: Union[str, np.ndarray], file_out: str, dst_fmt: Union[PIX_FMT, str] = PIX_FMT.RGB565,
+                      resize_width: int = 0, resize_height: int = 0, band_height: int = 64,
+                      reducing_gap: float = None):
+        """
+        convert image (jpg,bmp...etc or rgb888 ndarray) in horizontal bands and write each band to file_out.
+
+        ps. only the decoded image and one band of rgb888 + output are in memory, no full-size rgb888 copy,
+        converted frame or bytes copy. band memory is band_height * width * (3 + bytes per pixel).
+        bands are written to a temp file renamed to file_out at the end (filelib.file_write_stream), a failed
+        conversion keeps the old file_out (or none).
+
+        Parameters
+        ----------
+        file : Union[str, np.ndarray]
+            file name, or (height, width, 3) rgb888 image data
+        file_out : str
+            output file name (raw data, no header)
+        dst_fmt : Union[PIX_FMT, str]
+            output pixel format, rgb565, rgba, yuyv or uyvy (row based formats)
+        resize_width : int
+            resize width, resize when both w/h are not 0 (file only)
+        resize_height : int
+            resize height, resize when both w/h are not 0 (file only)
+        band_height : int
+            rows of one band
+        reducing_gap : float
+            see im2rgb888
+
+        Returns
+        -------
+        tuple : a tuple containing:
+            - width (int): image width, 0 when fail
+            - height (int): image height, 0 when fail
+        """
+
+        try:
+            dst_fmt = PIX_FMT(dst_fmt)
+            if dst_fmt not in (PIX_FMT.RGB565, PIX_FMT.RGBA, PIX_FMT.YUYV, PIX_FMT.UYVY):
+                imagelib.slogger.error(f'{dst_fmt} is not row based!!!')
+                return 0, 0
+
+            if type(file) is np.ndarray:
+                pilimage = None
+                (height, width) = file.shape[:2]
+            else:
+                pilimage = imagelib.pilopen(file, lazy=bool(reducing_gap and resize_width and resize_height))
+                if pilimage is None:
+                    imagelib.slogger.error('pilimage is None!!!')
+                    return 0, 0
+                if resize_width != 0 and resize_height != 0:
+                    pilimage = imagelib._pilresize_reduced(pilimage, resize_width, resize_height, reducing_gap)
+                (width, height) = pilimage.size
+
+            # one band buffer, reused for every band
+            band_height = max(1, min(band_height, height))
+            band_out = np.empty(imagelib.fmt_shape(dst_fmt, width, band_height), dtype=np.uint8)
+
+            def bands():
+                for y in range(0, height, band_height):
+                    rows = min(band_height, height - y)
+                    if pilimage is None:
+                        band = file[y:y + rows]
+                    else:
+                        band = pilimage.crop((0, y, width, y + rows))
+                        if band.mode != 'RGB':
+                            band = band.convert('RGB')
+                        band = np.asarray(band)
+                    band = np.ascontiguousarray(band)
+                    converted = imagelib.convert(band, PIX_FMT.RGB888, dst_fmt, width, rows, band_out[:rows])
+                    if converted is None:
+                        raise ValueError(f'band {y} convert fail')
+                    yield converted
+
+            # temp file and rename, a failure never leaves a partial file_out
+            from filelib.filelib import filelib
+            if filelib.file_write_stream(bands(), file_out)[0] < 0:
+                return 0, 0
+        except Exception as e:
+            imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return 0, 0
+
+        return width, height
+
+    @staticmethod
+    def _pilresize_reduced(pilimage: Image.Image, width: int, height: int, reducing_gap: float = None):
+        """
+        resize pil image, reduce first when reducing_gap is given.
+
+        ps. draft() only works before the image is loaded and only for JPEG (others are reduced by
+        Image.reduce inside resize).
+
+        Parameters
+        ----------
+        pilimage : Image.Image
+            pil image object (not loaded yet)
+        width : int
+            resize width
+        height : int
+            resize height
+        reducing_gap : float
+            None to resize from the full decode, see im2rgb888
+
+        Returns
+        -------
+        Image.Image
+            resized pil image object
+        """
+        if not reducing_gap:
+            return pilimage.resize((width, height))
+        if reducing_gap < 1.0:
+            # PIL raises ValueError for a gap less than 1.0
+            imagelib.slogger.warning(f'reducing_gap {reducing_gap} < 1.0, use 1.0!!!')
+            reducing_gap = 1.0
+
+        # JPEG decodes with DCT scaling to the smallest scale not less than the requested size
+        pilimage.draft(None, (int(width * reducing_gap), int(height * reducing_gap)))
+
+        return pilimage.resize((width, height), reducing_gap=reducing_gap)
+
+    @staticmethod
+    def pilopen(img_name: str, lazy: bool = False):
         """
          read image file.
 
+        ps. with imagelib.cache (set_cache) the image is an already loaded copy, draft() and reduce on load
+        don't work on it, use lazy=True when the caller drafts it (or only reads the header).
+
         Parameters
         ----------
         img_name : str
             image name
+        lazy : bool
+            open lazily (Image.open, not loaded) and skip the cache
 
         Returns
         -------
@@ -616,7 +1092,25 @@ class imagelib:
                 break
 
             try:
-                buf = Image.open(img_name)
+                cache = imagelib.cache
+                if cache is None or lazy:
+                    buf = Image.open(img_name)
+                    break
+
+                key = ('pilopen', os.path.abspath(img_name))
+                stamp = cache.stamp(img_name)
+                cached = cache.get(key, stamp)
+                if cached is None:
+                    with Image.open(img_name) as pilimage:
+                        # copy of the decoded image, the file is closed when leaving with
+                        cached = pilimage.copy()
+                        cached.format = pilimage.format
+                    nbytes = cached.width * cached.height * len(cached.getbands())
+                    cache.put(key, stamp, cached, nbytes * {'I': 4, 'F': 4, 'I;16': 2}.get(cached.mode, 1))
+
+                # callers may change the image (draft, paste...), keep the cached one intact
+                buf = cached.copy()
+                buf.format = cached.format
             except Exception as e:
                 imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
 
@@ -738,6 +1232,11 @@ class imagelib:
             imagelib.slogger.warning('angle is 0 or None , ignore!!!')
             return image
 
+        # right angles are a transpose, no need of the PIL round trip
+        (h, w) = image.shape[:2]
+        if geomlib.right_angle(w, h, angle, expand) is not None:
+            return geomlib.rotate(image, angle, expand)
+
         # rotate the image
         image = Image.fromarray(image)
         rotate = image.rotate(angle=angle, expand=expand)
@@ -746,114 +1245,641 @@ class imagelib:
         return np.array(rotate)
 
     @staticmethod
-    def rgb8882yuv444(rgb888: np.array, bgr2rgb: bool = False):
+    def rgb8882yuv444(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
         if bgr2rgb:
             rgb888 = cv2.cvtColor(rgb888, cv2.COLOR_BGRA2RGB)
-        yuv444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YUV)
+        dst = None if out is None else imagelib._out(out, rgb888.shape)
+        yuv444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YUV, dst=dst)
         return yuv444
 
     @staticmethod
-    def yuv4442rgb888(yuv444: np.array):
-        rgb888 = cv2.cvtColor(yuv444, cv2.COLOR_YUV2RGB)
+    def yuv4442rgb888(yuv444: np.array, out: Union[np.ndarray, bytearray] = None):
+        dst = None if out is None else imagelib._out(out, yuv444.shape)
+        rgb888 = cv2.cvtColor(yuv444, cv2.COLOR_YUV2RGB, dst=dst)
         return rgb888
 
     @staticmethod
-    def rgb8882yuv422(rgb888: np.array, bgr2rgb: bool = False):
+    def rgb8882yuv422(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                      avg_chroma: bool = False):
         """
         https://stackoverflow.com/questions/70496578/conversion-from-bgr-to-yuyv-with-opencv-python
+
+        YUYV (Y0 U Y1 V), width must be even.
+
+        out: output buffer (height * width * 2 bytes), None to allocate
+        avg_chroma: average u/v of each pixel pair instead of taking the even pixel
         """
-        if bgr2rgb:
-            rgb888 = cv2.cvtColor(rgb888, cv2.COLOR_BGRA2RGB)
-        yuv444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YUV)
+        yuv444 = imagelib.rgb8882yuv444(rgb888, bgr2rgb)
+        return imagelib._pack422(yuv444, False, avg_chroma, out)
 
-        # Create YUYV from YUV
-        y0 = np.expand_dims(yuv444[..., 0][::, ::2], axis=2)
-        u = np.expand_dims(yuv444[..., 1][::, ::2], axis=2)
-        y1 = np.expand_dims(yuv444[..., 0][::, 1::2], axis=2)
-        v = np.expand_dims(yuv444[..., 2][::, ::2], axis=2)
-        yuv422 = np.concatenate((y0, u, y1, v), axis=2)
-        yuv422 = yuv422.reshape((yuv422.shape[0], yuv422.shape[1] * 2, int(yuv422.shape[2] / 2)))
-        return yuv422
+    @staticmethod
+    def rgb8882uyvy(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                    avg_chroma: bool = False):
+        """
+        UYVY (U Y0 V Y1), width must be even, see rgb8882yuv422.
+        """
+        yuv444 = imagelib.rgb8882yuv444(rgb888, bgr2rgb)
+        return imagelib._pack422(yuv444, True, avg_chroma, out)
 
     @staticmethod
-    def rgb8882ycrcb444(rgb888: np.array, bgr2rgb: bool = False):
+    def rgb8882nv12(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                    avg_chroma: bool = False):
+        """
+        NV12 (Y plane + interleaved UV plane), width and height must be even.
+
+        out: output buffer (height * 3 / 2 * width bytes), None to allocate
+        avg_chroma: average u/v of each 2x2 block instead of taking the top-left pixel
+
+        return: (height * 3 / 2, width) ndarray
+        """
+        yuv444 = imagelib.rgb8882yuv444(rgb888, bgr2rgb)
+        return imagelib._pack420(yuv444, 'nv12', avg_chroma, out)
+
+    @staticmethod
+    def rgb8882nv21(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                    avg_chroma: bool = False):
+        """
+        NV21 (Y plane + interleaved VU plane), see rgb8882nv12.
+        """
+        yuv444 = imagelib.rgb8882yuv444(rgb888, bgr2rgb)
+        return imagelib._pack420(yuv444, 'nv21', avg_chroma, out)
+
+    @staticmethod
+    def rgb8882i420(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                    avg_chroma: bool = False):
+        """
+        I420 (Y plane + U plane + V plane), see rgb8882nv12.
+        """
+        yuv444 = imagelib.rgb8882yuv444(rgb888, bgr2rgb)
+        return imagelib._pack420(yuv444, 'i420', avg_chroma, out)
+
+    @staticmethod
+    def rgb8882ycrcb444(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
         if bgr2rgb:
             rgb888 = cv2.cvtColor(rgb888, cv2.COLOR_BGRA2RGB)
-        ycrcb444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YCrCb)
+        dst = None if out is None else imagelib._out(out, rgb888.shape)
+        ycrcb444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YCrCb, dst=dst)
         return ycrcb444
 
     @staticmethod
-    def ycrcb4442rgb888(yuv444: np.array):
-        rgb888 = cv2.cvtColor(yuv444, cv2.COLOR_YCrCb2RGB)
+    def ycrcb4442rgb888(yuv444: np.array, out: Union[np.ndarray, bytearray] = None):
+        dst = None if out is None else imagelib._out(out, yuv444.shape)
+        rgb888 = cv2.cvtColor(yuv444, cv2.COLOR_YCrCb2RGB, dst=dst)
         return rgb888
 
     @staticmethod
-    def rgb8882ycrcb422(rgb888: np.array, bgr2rgb: bool = False):
+    def rgb8882ycrcb422(rgb888: np.array, bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None,
+                        avg_chroma: bool = False):
         """
         https://stackoverflow.com/questions/70496578/conversion-from-bgr-to-yuyv-with-opencv-python
+
+        Y0 Cr Y1 Cb, width must be even.
+
+        out: output buffer (height * width * 2 bytes), None to allocate
+        avg_chroma: average cr/cb of each pixel pair instead of taking the even pixel
         """
-        if bgr2rgb:
-            rgb888 = cv2.cvtColor(rgb888, cv2.COLOR_BGRA2RGB)
-        ycrcb444 = cv2.cvtColor(rgb888, cv2.COLOR_RGB2YCrCb)
+        ycrcb444 = imagelib.rgb8882ycrcb444(rgb888, bgr2rgb)
+        return imagelib._pack422(ycrcb444, False, avg_chroma, out)
+
+    @staticmethod
+    def _pack422(yuv444: np.ndarray, uyvy: bool = False, avg_chroma: bool = False,
+                 out: Union[np.ndarray, bytearray] = None):
+        """
+        pack 444 into 422 by strided writes into one output, no intermediate interleave.
+
+        Parameters
+        ----------
+        yuv444 : np.ndarray
+            (height, width, 3) y/c1/c2 image data, width must be even
+        uyvy : bool
+            False for Y0 C1 Y1 C2, True for C1 Y0 C2 Y1
+        avg_chroma : bool
+            average c1/c2 of each pixel pair, otherwise take the even pixel
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes), None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (height, width, 2) 422 image data
+        """
+        (h, w) = yuv444.shape[:2]
+        line = imagelib._out(out, (h, w * 2))
+
+        if avg_chroma:
+            # at exactly 1/2 width INTER_LINEAR samples between the pair, i.e. their average
+            # (INTER_AREA gives the same but is much slower for a 1-D reduce)
+            chroma = cv2.resize(yuv444, (w // 2, h), interpolation=cv2.INTER_LINEAR)
+        else:
+            chroma = yuv444[:, ::2]
 
-        # Create YUYV from YUV
-        y0 = np.expand_dims(ycrcb444[..., 0][::, ::2], axis=2)
-        u = np.expand_dims(ycrcb444[..., 1][::, ::2], axis=2)
-        y1 = np.expand_dims(ycrcb444[..., 0][::, 1::2], axis=2)
-        v = np.expand_dims(ycrcb444[..., 2][::, ::2], axis=2)
-        ycrcb422 = np.concatenate((y0, u, y1, v), axis=2)
-        ycrcb422 = ycrcb422.reshape((ycrcb422.shape[0], ycrcb422.shape[1] * 2, int(ycrcb422.shape[2] / 2)))
-        return ycrcb422
+        (y, c1, c2) = (1, 0, 2) if uyvy else (0, 1, 3)
+        line[:, y::2] = yuv444[..., 0]
+        line[:, c1::4] = chroma[..., 1]
+        line[:, c2::4] = chroma[..., 2]
+
+        return line.reshape(h, w, 2)
+
+    @staticmethod
+    def _pack420(yuv444: np.ndarray, layout: str = 'nv12', avg_chroma: bool = False,
+                 out: Union[np.ndarray, bytearray] = None):
+        """
+        pack 444 into planar 420 by strided writes into one output.
+
+        Parameters
+        ----------
+        yuv444 : np.ndarray
+            (height, width, 3) y/u/v image data, width and height must be even
+        layout : str
+            'nv12' (Y + UV), 'nv21' (Y + VU) or 'i420' (Y + U + V)
+        avg_chroma : bool
+            average u/v of each 2x2 block (cv2 INTER_AREA), otherwise take the top-left pixel
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * 3 / 2 * width bytes), None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (height * 3 / 2, width) 420 image data
+        """
+        (h, w) = yuv444.shape[:2]
+        planar = imagelib._out(out, (h * 3 // 2, w))
+
+        if avg_chroma:
+            chroma = cv2.resize(yuv444, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+        else:
+            chroma = yuv444[::2, ::2]
+
+        planar[:h] = yuv444[..., 0]
+        if layout == 'i420':
+            uv = planar[h:].reshape(2, h // 2, w // 2)
+            uv[0] = chroma[..., 1]
+            uv[1] = chroma[..., 2]
+        else:
+            (u, v) = (0, 1) if layout == 'nv12' else (1, 0)
+            planar[h:, u::2] = chroma[..., 1]
+            planar[h:, v::2] = chroma[..., 2]
+
+        return planar
+
+    # region [batch]
+    @staticmethod
+    def stack_frames(frames: Union[np.ndarray, list], width: int = 0, height: int = 0, channel: int = 0):
+        """
+        stack frames into one contiguous (N, H, W, C) uint8 array.
+
+        Parameters
+        ----------
+        frames : Union[np.ndarray, list]
+            (N, H, W, C) ndarray (returned as is when contiguous), or list of equal-size buffers (bytes/ndarray)
+        width : int
+            width of image, 0 to take it from a 4-dim ndarray (or the first (H, W, C) / (H, W) ndarray of a list)
+        height : int
+            height of image, 0 to take it from a 4-dim ndarray (or the first (H, W, C) / (H, W) ndarray of a list)
+        channel : int
+            color channel, 0 to take it from a 4-dim ndarray (or the first (H, W, C) / (H, W) ndarray of a list)
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, C) frames
+        """
+
+        stack = None
+
+        try:
+            if type(frames) is np.ndarray:
+                if frames.ndim == 4:
+                    (_, height, width, channel) = frames.shape
+                stack = np.ascontiguousarray(frames, dtype=np.uint8).reshape(-1, height, width, channel)
+            else:
+                if len(frames) and type(frames[0]) is np.ndarray and frames[0].ndim in (2, 3):
+                    shape = frames[0].shape
+                    (height, width) = (height or shape[0], width or shape[1])
+                    channel = channel or (shape[2] if len(shape) == 3 else 1)
+                frames_new = np.empty((len(frames), height, width, channel), dtype=np.uint8)
+                for i, frame in enumerate(frames):
+                    if type(frame) is not np.ndarray:
+                        frame = np.frombuffer(frame, dtype=np.uint8)
+                    frames_new[i] = frame.reshape(height, width, channel)
+                stack = frames_new
+        except Exception as e:
+            imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        return stack
+
+    @staticmethod
+    def _batch(frames: Union[np.ndarray, list], width: int, height: int, channel: int, cvt,
+               out: Union[np.ndarray, bytearray] = None):
+        """
+        run a single frame converter over N frames in one pass.
+
+        ps. all converters are per pixel (or per row pair for 422), so (N, H, W, C) is converted as
+        one (N * H, W, C) frame and reshaped back.
+
+        Parameters
+        ----------
+        frames : Union[np.ndarray, list]
+            see stack_frames
+        width : int
+            width of image
+        height : int
+            height of image
+        channel : int
+            color channel of input
+        cvt : callable
+            cvt(frame (N * H, W, C) ndarray, width, height (N * H), out) -> converted frame (bytes or ndarray)
+        out : Union[np.ndarray, bytearray]
+            contiguous output buffer (N * H * W * C' bytes), None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, C') converted frames
+        """
+
+        stack = imagelib.stack_frames(frames, width, height, channel)
+        if stack is None:
+            return None
+
+        (n, h, w, c) = stack.shape
+        if out is not None:
+            out = np.frombuffer(out, dtype=np.uint8).reshape(n * h, w, -1)
+        ret = cvt(stack.reshape(n * h, w, c), w, n * h, out)
+        if ret is None:
+            return None
+        if type(ret) is not np.ndarray:
+            ret = np.frombuffer(ret, dtype=np.uint8)
+
+        return ret.reshape(n, h, w, -1)
+
+    @staticmethod
+    def rgba2rgb888_batch(rgba: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                          out: Union[np.ndarray, bytearray] = None):
+        """
+        RGBA to RGB888 for N frames, see rgba2rgb888.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) rgb888 image data
+        """
+        return imagelib._batch(rgba, width, height, 4, imagelib.rgba2rgb888, out)
+
+    @staticmethod
+    def rgb8882rgba_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                          out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to RGBA for N frames, see rgb8882rgba.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 4) rgba image data
+        """
+        return imagelib._batch(rgb888, width, height, 3, imagelib.rgb8882rgba, out)
+
+    @staticmethod
+    def rgb5652rgb888_batch(rgb565: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            replicate: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB565 to RGB888 for N frames, see rgb5652rgb888.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) rgb888 image data
+        """
+        return imagelib._batch(rgb565, width, height, 2,
+                               lambda buf, w, h, dst: imagelib.rgb5652rgb888(buf, w, h, replicate, dst), out)
+
+    @staticmethod
+    def rgb8882rgb565_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to RGB565 for N frames, see rgb8882rgb565.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 2) rgb565 image data
+        """
+        return imagelib._batch(rgb888, width, height, 3, lambda buf, w, h, dst: imagelib.rgb8882rgb565(buf, dst), out)
+
+    @staticmethod
+    def bgr8882rgb565_batch(bgr888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            out: Union[np.ndarray, bytearray] = None):
+        """
+        BGR888 to RGB565 for N frames, see bgr8882rgb565.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 2) rgb565 image data
+        """
+        return imagelib._batch(bgr888, width, height, 3, lambda buf, w, h, dst: imagelib.bgr8882rgb565(buf, dst), out)
+
+    @staticmethod
+    def rgb8882yuv444_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to YUV444 for N frames, see rgb8882yuv444.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) yuv444 image data
+        """
+        return imagelib._batch(rgb888, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.rgb8882yuv444(buf, bgr2rgb, dst), out)
+
+    @staticmethod
+    def yuv4442rgb888_batch(yuv444: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            out: Union[np.ndarray, bytearray] = None):
+        """
+        YUV444 to RGB888 for N frames, see yuv4442rgb888.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) rgb888 image data
+        """
+        return imagelib._batch(yuv444, width, height, 3, lambda buf, w, h, dst: imagelib.yuv4442rgb888(buf, dst), out)
+
+    @staticmethod
+    def rgb8882yuv422_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                            bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to YUV422 (YUYV) for N frames, see rgb8882yuv422.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 2) yuv422 image data
+        """
+        return imagelib._batch(rgb888, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.rgb8882yuv422(buf, bgr2rgb, dst), out)
+
+    @staticmethod
+    def rgb8882uyvy_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                          bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to UYVY for N frames, see rgb8882uyvy.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 2) uyvy image data
+        """
+        return imagelib._batch(rgb888, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.rgb8882uyvy(buf, bgr2rgb, dst), out)
+
+    @staticmethod
+    def rgb8882ycrcb444_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                              bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to YCrCb444 for N frames, see rgb8882ycrcb444.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) ycrcb444 image data
+        """
+        return imagelib._batch(rgb888, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.rgb8882ycrcb444(buf, bgr2rgb, dst), out)
+
+    @staticmethod
+    def ycrcb4442rgb888_batch(ycrcb444: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                              out: Union[np.ndarray, bytearray] = None):
+        """
+        YCrCb444 to RGB888 for N frames, see ycrcb4442rgb888.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 3) rgb888 image data
+        """
+        return imagelib._batch(ycrcb444, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.ycrcb4442rgb888(buf, dst), out)
 
     @staticmethod
-    def folder_crop_resize(folder: str, prefix_name: str, w_resize: int, h_resize: int):
+    def rgb8882ycrcb422_batch(rgb888: Union[np.ndarray, list], width: int = 0, height: int = 0,
+                              bgr2rgb: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to YCrCb422 for N frames, see rgb8882ycrcb422.
+
+        Returns
+        -------
+        np.ndarray
+            (N, H, W, 2) ycrcb422 image data
+        """
+        return imagelib._batch(rgb888, width, height, 3,
+                               lambda buf, w, h, dst: imagelib.rgb8882ycrcb422(buf, bgr2rgb, dst), out)
+
+    # endregion [batch]
+
+    @staticmethod
+    def folder_crop_resize(folder: str, prefix_name: str, w_resize: int, h_resize: int, workers: int = 1,
+                           incremental: bool = True):
         """
         test only, not handle exception.
+
+        files are streamed from os.walk (sorted, convert folder skipped), with workers > 1 they are sent to a
+        process pool, at most workers * 4 files are in flight, so nothing waits for the whole walk.
+
+        output names ({prefix_name}_{w}x{h}_{n:03}) are kept per source in a manifest
+        (convert/{prefix_name}_{w}x{h}.json, source path relative to folder -> name, size, mtime_ns), so adding,
+        removing or renaming sources doesn't shift the names of the others. a new source takes the next unused
+        number (sources of a first run are numbered in walk order), outputs of removed sources are deleted.
+
+        Parameters
+        ----------
+        folder : str
+            source folder
+        prefix_name : str
+            prefix of converted file name
+        w_resize : int
+            resize width
+        h_resize : int
+            resize height
+        workers : int
+            process count, 1 to run in this process, 0 for os.cpu_count()
+        incremental : bool
+            skip the source when it's unchanged since its last conversion (manifest) and both outputs exist
+
+        Returns
+        -------
+        dict
+            stats: files, skipped, failed, removed, seconds and per stage seconds (decode, crop, resize, encode)
         """
+        import json
+        import os
+        import time
+
         # create folder if not exist
         convert_folder = f'{folder}/convert/'
-        import os
         if not os.path.isdir(convert_folder):
             import pathlib
             pathlib.Path(convert_folder).mkdir(parents=True, exist_ok=True)
 
-        files = []
+        def walk():
+            convert_path = os.path.abspath(convert_folder)
+            for r, d, f in os.walk(folder):
+                # don't walk into converted output, keep the order stable for numbering
+                d[:] = sorted(name for name in d if os.path.abspath(os.path.join(r, name)) != convert_path)
+                for file in sorted(f):
+                    yield os.path.join(r, file)
+
+        prefix = f'{prefix_name}_{w_resize}x{h_resize}'
+        manifest_file = f'{convert_folder}{prefix}.json'
+        manifest = {}
+        if os.path.isfile(manifest_file):
+            try:
+                with open(manifest_file, 'r') as f:
+                    manifest = json.load(f)
+            except (IOError, ValueError) as e:
+                imagelib.slogger.error(f'{type(e).__name__}!!! {e}')
+        numbers = [int(entry['name'].rsplit('_', 1)[1]) for entry in manifest.values()]
+        next_number = max(numbers, default=0) + 1
 
-        # get all files
-        import os
-        for r, d, f in os.walk(folder):
-            # append full path with file name
-            full_paths = [os.path.join(r, file) for file in f]
-            files.extend(full_paths)
+        def is_done(entry: dict, st: os.stat_result):
+            return (entry is not None and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns
+                    and all(os.path.isfile(f'{convert_folder}{entry["name"]}{ext}') for ext in ('.jpg', '.raw')))
+
+        stats = {'files': 0, 'skipped': 0, 'failed': 0, 'removed': 0, 'seconds': 0.0,
+                 'decode': 0.0, 'crop': 0.0, 'resize': 0.0, 'encode': 0.0}
 
-        # crop/resize each file
-        for i, file in enumerate(files):
-            file_new = f'{convert_folder}{prefix_name}_{w_resize}x{h_resize}_{(i + 1):03}'
-            imagelib.file_crop_resize(file, file_new, w_resize, h_resize)
+        def done(file: str, entry: dict, job):
+            try:
+                stages = job() if callable(job) else job.result()
+                for stage in stages:
+                    stats[stage] += stages[stage]
+                stats['files'] += 1
+                manifest[os.path.relpath(file, folder)] = entry
+            except Exception as e:
+                stats['failed'] += 1
+                imagelib.slogger.error(f'{file} {type(e).__name__}!!! {e}')
+
+        time_start = time.perf_counter()
+        workers = workers or os.cpu_count() or 1
+        pool = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers)
+        pending = {}
+        seen = set()
+
+        try:
+            # crop/resize each file
+            for file in walk():
+                rel = os.path.relpath(file, folder)
+                seen.add(rel)
+                st = os.stat(file)
+                entry = manifest.get(rel)
+                if incremental and is_done(entry, st):
+                    stats['skipped'] += 1
+                    continue
+                if entry is None:
+                    entry = {'name': f'{prefix}_{next_number:03}'}
+                    next_number += 1
+                entry = {'name': entry['name'], 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                file_new = f'{convert_folder}{entry["name"]}'
+
+                if not pool:
+                    done(file, entry, lambda: imagelib.file_crop_resize(file, file_new, w_resize, h_resize))
+                    continue
+
+                pending[pool.submit(imagelib.file_crop_resize, file, file_new, w_resize, h_resize)] = (file, entry)
+                if len(pending) >= workers * 4:
+                    from concurrent.futures import wait, FIRST_COMPLETED
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done(*pending.pop(future), future)
+
+            for future in list(pending):
+                done(*pending.pop(future), future)
+
+            # outputs of removed (or renamed) sources
+            for rel in [rel for rel in manifest if rel not in seen]:
+                for ext in ('.jpg', '.raw'):
+                    if os.path.isfile(f'{convert_folder}{manifest[rel]["name"]}{ext}'):
+                        os.remove(f'{convert_folder}{manifest[rel]["name"]}{ext}')
+                manifest.pop(rel)
+                stats['removed'] += 1
+        finally:
+            if pool:
+                for future in pending:
+                    future.cancel()
+                pool.shutdown()
+
+            # converted sources so far (an interrupted run resumes from here)
+            tmp = f'{manifest_file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp, manifest_file)
+
+        stats['seconds'] = time.perf_counter() - time_start
+
+        # report throughput, stage time is summed over workers
+        imagelib.slogger.info(f'files: {stats["files"]}, skipped: {stats["skipped"]}, failed: {stats["failed"]}, '
+                              f'removed: {stats["removed"]}, {stats["seconds"]:.3f} s, '
+                              f'{stats["files"] / max(stats["seconds"], 1e-9):.1f} files/s ({workers} workers)')
+        for stage in ('decode', 'crop', 'resize', 'encode'):
+            imagelib.slogger.info(f'{stage}: {stats[stage]:.3f} s, '
+                                  f'{stats["files"] / max(stats[stage], 1e-9):.1f} files/s per worker')
+
+        return stats
+
+    # pipelibs of file_crop_resize per thread (pipes: (w_resize, h_resize) -> pipelib, oldest first), the
+    # buffers are reused by the files of a thread and never shared by two threads
+    crop_resize_pipes = threading.local()
+    MAX_CROP_RESIZE_PIPES = 4
 
     @staticmethod
     def file_crop_resize(file: str, file_new: str, w_resize: int, h_resize: int):
         """
         test only, not handle exception.
-        """
-        w, h, c, image_info, rgb888 = imagelib.im2rgb888(file)
-
-        rgb888 = np.frombuffer(rgb888, dtype=np.uint8).reshape(h, w, 3)
 
-        if w > h:
-            x = int((w - h) / 2)
-            y = 0
-            w = h
-            rgb888 = imagelib.cv2crop(rgb888, x, y, w, h)
-        elif w < h:
-            x = 0
-            y = int((h - w) / 2)
-            h = w
-            rgb888 = imagelib.cv2crop(rgb888, x, y, w, h)
+        center square crop -> resize -> {file_new}.jpg and {file_new}.raw (rgb565) with a compiled pipelib,
+        the image stays bgr888 from decode to the jpg (no channel swap copy). Decoded by cv2 (PIL for formats
+        cv2 can't read, e.g. gif), see pipelib.run_file for the pixel differences to the PIL decode.
 
-        rgb888 = imagelib.cv2resize(rgb888, w_resize, h_resize)
-        cv2.imwrite(f'{file_new}.jpg', rgb888[:, :, ::-1])  # convert rgb888 to bgr888 for cv2 save image
-        rgb565 = imagelib.rgb8882rgb565(rgb888)
-
-        from filelib import filelib
-        filelib.file_write_binary(rgb565, f'{file_new}.raw')
+        Returns
+        -------
+        dict
+            seconds of each stage (decode, crop, resize, encode)
+        """
+        import time
+        from medialib.pipelib import pipelib
+
+        pipes = getattr(imagelib.crop_resize_pipes, 'pipes', None)
+        if pipes is None:
+            pipes = imagelib.crop_resize_pipes.pipes = OrderedDict()
+        pipe = pipes.get((w_resize, h_resize))
+        if pipe is None:
+            pipe = pipelib().center_square().resize(w_resize, h_resize).to(PIX_FMT.RGB565)
+            pipes[(w_resize, h_resize)] = pipe
+            if len(pipes) > imagelib.MAX_CROP_RESIZE_PIPES:
+                pipes.popitem(last=False)
+        else:
+            pipes.move_to_end((w_resize, h_resize))
+
+        pipe.timings.clear()
+        rgb565 = pipe.run_file(file)
+        if rgb565 is None:
+            raise ValueError(f'{file} convert fail')
+        time_convert = time.perf_counter()
+
+        # a failed write must not be recorded as done (the old outputs would be kept by later runs)
+        if not cv2.imwrite(f'{file_new}.jpg', pipe.image):
+            raise IOError(f'{file_new}.jpg write fail')
+
+        from filelib.filelib import filelib
+        if not filelib.file_write_binary(rgb565, f'{file_new}.raw'):
+            raise IOError(f'{file_new}.raw write fail')
+        time_write = time.perf_counter()
+
+        # a skipped stage (e.g. resize to 0x0, the size is kept) has no timing
+        (decode, crop, resize, to) = (pipe.timings.get(name, (0.0, 0))[0]
+                                      for name in ('decode', 'center_square', 'resize', 'to'))
+        return {'decode': decode, 'crop': crop, 'resize': resize, 'encode': to + time_write - time_convert}
@@ -0,0 +1,331 @@
+import hashlib
+import os
+import threading
+from typing import Callable
+
+import numpy as np
+
+from loglib.loglib import loglib
+from medialib.imagelib import PIX_FMT, imagelib
+from medialib.rawlib import rawlib
+
+
+class imcachelib:
+    """
+    Persistent conversion cache, (content hash, conversion, parameters) -> rawlib container.
+
+    A hit is a mmap load of the container (no decode, no resize, no conversion). Entries are written to a
+    temp file and renamed, so concurrent processes never see a half-written entry, and the mtime of an entry
+    is touched on every hit, eviction removes the least recently used entries when the total size is over
+    max_bytes.
+
+    Usage:
+        cache = imcachelib('~/.cache/pymisc2/im')
+        (width, height, channel, image_info, buf) = cache.im2rgb565('a.jpg', 320, 240)
+    """
+
+    slogger = loglib(__name__)
+
+    # bump it when the output of a conversion is changed, old entries are never hit again (and get evicted)
+    VERSION = 1
+    EXT = '.raw'
+    CHUNK = 1 << 20
+
+    def __init__(self, folder: str, max_bytes: int = 1 << 30):
+        """
+        Parameters
+        ----------
+        folder : str
+            cache folder
+        max_bytes : int
+            max total size of entries
+        """
+        self.folder = os.path.abspath(os.path.expanduser(folder))
+        self.max_bytes = max_bytes
+        os.makedirs(self.folder, exist_ok=True)
+
+        self.lock = threading.Lock()
+        # (path, size, mtime_ns) -> content hash, avoid hashing the same file again in this process
+        self.hashes = {}
+        # total size of entries, None until the first eviction check scans the folder
+        self.total = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # region [key]
+    def hash_file(self, file: str):
+        """
+        content hash of file (blake2b, 128 bits), memoized by (path, size, mtime).
+
+        Parameters
+        ----------
+        file : str
+            file name
+
+        Returns
+        -------
+        str
+            hex digest
+        """
+        st = os.stat(file)
+        memo = (os.path.abspath(file), st.st_size, st.st_mtime_ns)
+        with self.lock:
+            digest = self.hashes.get(memo)
+        if digest is not None:
+            return digest
+
+        h = hashlib.blake2b(digest_size=16)
+        with open(file, 'rb') as f:
+            while chunk := f.read(imcachelib.CHUNK):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        with self.lock:
+            self.hashes[memo] = digest
+        return digest
+
+    def key(self, file: str, conversion: str, *params):
+        """
+        cache key of a conversion.
+
+        Parameters
+        ----------
+        file : str
+            source file name
+        conversion : str
+            conversion name, e.g. 'im2rgb565'
+        params
+            conversion parameters
+
+        Returns
+        -------
+        str
+            hex digest
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((imcachelib.VERSION, self.hash_file(file), conversion, params)).encode())
+        return h.hexdigest()
+
+    def path(self, key: str):
+        """
+        entry path of key, entries are spread over 256 sub folders.
+        """
+        return os.path.join(self.folder, key[:2], key + imcachelib.EXT)
+
+    # endregion [key]
+
+    # region [cache]
+    def get(self, key: str):
+        """
+        load an entry.
+
+        Parameters
+        ----------
+        key : str
+            cache key
+
+        Returns
+        -------
+        tuple
+            (width, height, channel, image_info, buf), buf is a read-only ndarray view of the mapped entry;
+            None when not cached
+        """
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with rawlib(path) as raw:
+                if len(raw) != 1:
+                    return None
+                frame = raw.frame(0)
+                header = raw.header
+            # touch for LRU
+            os.utime(path)
+        except OSError:
+            # not cached, or evicted by another process
+            return None
+
+        meta = header['meta']
+        image_info = meta['image_info']
+        image_info['size'] = tuple(image_info['size'])
+        return header['width'], header['height'], meta['channel'], image_info, frame.reshape(-1)
+
+    def put(self, key: str, pix_fmt: PIX_FMT, width: int, height: int, channel: int, image_info: dict,
+            buf: bytes):
+        """
+        save an entry (write temp file and rename), evict old entries when over max_bytes.
+
+        Returns
+        -------
+        bool
+            save status
+        """
+        path = self.path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not rawlib.write(tmp, [buf], pix_fmt, width, height, {'channel': channel, 'image_info': image_info}):
+                raise IOError(f'write {tmp} fail')
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            imcachelib.slogger.error(f'{type(e).__name__}!!! {e}')
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+
+        with self.lock:
+            if self.total is not None:
+                self.total += size
+            full = self.total is None or self.total > self.max_bytes
+        if full:
+            self.evict()
+
+        return True
+
+    def evict(self, max_bytes: int = None):
+        """
+        remove least recently used entries until the total size is not more than max_bytes.
+
+        Parameters
+        ----------
+        max_bytes : int
+            None for self.max_bytes
+
+        Returns
+        -------
+        int
+            total size of entries after eviction
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        # other processes share the folder, so the folder is the truth
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for file in files:
+                if not file.endswith(imcachelib.EXT):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, file))
+                    entries.append((st.st_mtime_ns, st.st_size, os.path.join(root, file)))
+                except OSError:
+                    pass
+
+        total = sum(size for _, size, _ in entries)
+        evictions = 0
+        if total > max_bytes:
+            for _, size, file in sorted(entries):
+                try:
+                    os.remove(file)
+                except OSError:
+                    # removed by another process, or still mapped (windows)
+                    continue
+                total -= size
+                evictions += 1
+                if total <= max_bytes:
+                    break
+
+        with self.lock:
+            self.total = total
+            self.evictions += evictions
+
+        return total
+
+    def clear(self):
+        """
+        remove all entries.
+        """
+        self.evict(0)
+
+    def convert(self, conversion: Callable, pix_fmt: PIX_FMT, file: str, *params):
+        """
+        cached conversion, call conversion(file, *params) when not cached.
+
+        Parameters
+        ----------
+        conversion : Callable
+            imagelib.im2rgb565/im2rgb888/im2rgba or alike, returns (width, height, channel, image_info, buf)
+        pix_fmt : PIX_FMT
+            pixel format of buf
+        file : str
+            source file name
+        params
+            conversion parameters
+
+        Returns
+        -------
+        tuple
+            (width, height, channel, image_info, buf), buf is a read-only flat uint8 ndarray for a hit or a miss
+            (a view of the mapped entry or of the converted bytes, bytes(buf) to copy); buf is None when failed
+        """
+        try:
+            key = self.key(file, conversion.__name__, *params)
+        except OSError as e:
+            imcachelib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return 0, 0, 0, None, None
+
+        ret = self.get(key)
+        with self.lock:
+            if ret is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if ret is not None:
+            return ret
+
+        ret = conversion(file, *params)
+        (width, height, channel, image_info, buf) = ret
+        if buf is None:
+            return ret
+        self.put(key, pix_fmt, width, height, channel, image_info, buf)
+        # the same type as a hit, a read-only flat view (no copy)
+        return width, height, channel, image_info, np.frombuffer(buf, dtype=np.uint8)
+
+    # endregion [cache]
+
+    # region [conversion]
+    def im2rgba(self, file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
+        """
+        cached imagelib.im2rgba.
+        """
+        return self.convert(imagelib.im2rgba, PIX_FMT.RGBA, file, resize_width, resize_height, reducing_gap)
+
+    def im2rgb888(self, file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
+        """
+        cached imagelib.im2rgb888.
+        """
+        return self.convert(imagelib.im2rgb888, PIX_FMT.RGB888, file, resize_width, resize_height, reducing_gap)
+
+    def im2rgb565(self, file: str, resize_width: int = 0, resize_height: int = 0, reducing_gap: float = None):
+        """
+        cached imagelib.im2rgb565.
+        """
+        return self.convert(imagelib.im2rgb565, PIX_FMT.RGB565, file, resize_width, resize_height, reducing_gap)
+
+    # endregion [conversion]
+
+
+def main():
+    """
+    For console test
+    """
+    import sys
+    import tempfile
+    import timeit
+
+    if len(sys.argv) < 2:
+        print('usage: python -m medialib.imcachelib image_file')
+        return
+
+    cache = imcachelib(tempfile.mkdtemp())
+    cold = timeit.timeit(lambda: imagelib.im2rgb565(sys.argv[1], 320, 240), number=1)
+    cache.im2rgb565(sys.argv[1], 320, 240)
+    hot = timeit.timeit(lambda: cache.im2rgb565(sys.argv[1], 320, 240), number=10) / 10
+    print(f'decode: {cold * 1000:.1f} ms, cached: {hot * 1000:.2f} ms, hits: {cache.hits}, misses: {cache.misses}')
+    cache.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import json
+import os
+from threading import Lock, get_ident
+from typing import Iterable, Union
+
+from PIL import Image, UnidentifiedImageError
+
+from loglib.loglib import loglib
+
+
+class imindexlib:
+    """
+    Persistent image info index, (path, size, mtime) -> (width, height, channel, format, mode).
+
+    Entries are kept in a dict (O(1) lookup) and saved as json, an entry is re-probed when the file size
+    or mtime is changed. Files not indexed yet are probed by header only (Image.open doesn't decode).
+    """
+
+    slogger = loglib(__name__)
+
+    # entry: [size, mtime_ns, width, height, channel, format, mode], [size, mtime_ns] for non image file
+    VERSION = 1
+
+    def __init__(self, index_file: str = None):
+        """
+        Parameters
+        ----------
+        index_file : str
+            json file to load/save the index, None for memory only
+        """
+        self.index_file = index_file
+        self.index = {}
+        # changes not saved yet
+        self.dirty = 0
+        self.lock = Lock()
+        self.load()
+
+    # region [index]
+    def load(self):
+        """
+        load index from index_file, a broken or old version file is ignored.
+        """
+        if not self.index_file or not os.path.isfile(self.index_file):
+            return
+
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == imindexlib.VERSION:
+                with self.lock:
+                    self.index = data['index']
+                    self.dirty = 0
+        except (IOError, ValueError, KeyError) as e:
+            imindexlib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+    def save(self):
+        """
+        save index to index_file (write temp file and rename, readers never see a half-written file).
+
+        Returns
+        -------
+        bool
+            save status
+        """
+        if not self.index_file:
+            return False
+
+        with self.lock:
+            if not self.dirty:
+                return True
+            data = {'version': imindexlib.VERSION, 'index': dict(self.index)}
+            saving = self.dirty
+
+        tmp = f'{self.index_file}.{os.getpid()}.{get_ident()}.tmp'
+        try:
+            loglib.create_parent_folder(os.path.abspath(self.index_file))
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_file)
+        except IOError as e:
+            imindexlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            # still dirty, saved next time
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+
+        # only the saved changes, the ones made while writing are saved next time
+        with self.lock:
+            self.dirty -= saving
+        return True
+
+    @staticmethod
+    def probe(file: str):
+        """
+        probe image info by header only.
+
+        Parameters
+        ----------
+        file : str
+            file name
+
+        Returns
+        -------
+        tuple : a tuple containing:
+            - width (int): image width
+            - height (int): image height
+            - channel (int): image channel
+            - format (str): image format
+            - mode (str): image mode
+        """
+        with Image.open(file) as pilimage:
+            (width, height) = pilimage.size
+            return width, height, len(pilimage.getbands()), pilimage.format, pilimage.mode
+
+    def get(self, file: str):
+        """
+        get image info, probe and index it when not indexed or changed.
+
+        Parameters
+        ----------
+        file : str
+            file name
+
+        Returns
+        -------
+        tuple
+            (width, height, channel, format, mode), None when file is not an image
+        """
+        try:
+            path = os.path.abspath(file)
+            st = os.stat(path)
+            with self.lock:
+                entry = self.index.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                return tuple(entry[2:]) or None
+
+            try:
+                info = imindexlib.probe(path)
+            except UnidentifiedImageError:
+                info = ()
+            with self.lock:
+                self.index[path] = [st.st_size, st.st_mtime_ns, *info]
+                self.dirty += 1
+            return info or None
+        except Exception as e:
+            imindexlib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        return None
+
+    def getiminfo(self, file: str):
+        """
+        same as imagelib.getiminfo, but from the index.
+
+        Returns
+        -------
+        tuple
+            (width, height, channel), (0, 0, 0) when file is not an image
+        """
+        info = self.get(file)
+        if info is None:
+            return 0, 0, 0
+        return info[:3]
+
+    def populate(self, files: Union[str, Iterable[str]], workers: int = 8):
+        """
+        index files with a thread pool (probing is mostly waiting for disk).
+
+        Parameters
+        ----------
+        files : Union[str, Iterable[str]]
+            folder (walk all files) or file names
+        workers : int
+            thread count
+
+        Returns
+        -------
+        int
+            count of indexed images
+        """
+        if type(files) is str:
+            folder = files
+            files = (os.path.join(r, file) for r, d, f in os.walk(folder) for file in f)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            infos = pool.map(self.get, files)
+            count = sum(1 for info in infos if info is not None)
+
+        return count
+
+    def prune(self):
+        """
+        remove entries of deleted files.
+        """
+        with self.lock:
+            for path in [path for path in self.index if not os.path.exists(path)]:
+                self.index.pop(path)
+                self.dirty += 1
+
+    # endregion [index]
+
+    # region [with]
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+    # endregion [with]
@@ -0,0 +1,135 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from loglib.loglib import loglib
+
+
+class imlrulib:
+    """
+    In-process LRU cache of decoded images, bounded by total decoded bytes (not entry count).
+
+    An entry is stamped with (size, mtime_ns) of its file, a changed file is a miss and its old entry is
+    dropped. All methods are thread-safe, decoding is done by the caller outside the lock.
+
+    Usage (opt-in for imagelib.pilopen/cv2imread):
+        imagelib.set_cache(256 << 20)
+        imagelib.cache.stats()
+    """
+
+    slogger = loglib(__name__)
+
+    def __init__(self, max_bytes: int = 256 << 20):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            max total decoded bytes
+        """
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        # key -> (stamp, value, nbytes), oldest first
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def stamp(file: str):
+        """
+        file stamp (size, mtime_ns), None when file doesn't exist.
+        """
+        try:
+            st = os.stat(file)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    # region [cache]
+    def get(self, key: tuple, stamp: tuple):
+        """
+        get value, count a hit or miss.
+
+        Parameters
+        ----------
+        key : tuple
+            cache key
+        stamp : tuple
+            file stamp, see stamp()
+
+        Returns
+        -------
+        object
+            cached value, None when not cached or stale
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] != stamp:
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, stamp: tuple, value: object, nbytes: int):
+        """
+        put value, evict least recently used entries when over max_bytes.
+
+        Parameters
+        ----------
+        key : tuple
+            cache key
+        stamp : tuple
+            file stamp, see stamp()
+        value : object
+            value to cache
+        nbytes : int
+            decoded bytes of value
+
+        Returns
+        -------
+        bool
+            True when cached, False when value alone is larger than max_bytes
+        """
+        if stamp is None or nbytes > self.max_bytes:
+            return False
+
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (stamp, value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+                self.evictions += 1
+
+        return True
+
+    def _pop(self, key: tuple):
+        (_, _, nbytes) = self.entries.pop(key)
+        self.bytes -= nbytes
+
+    def clear(self):
+        """
+        remove all entries (counters are kept).
+        """
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            hits, misses, evictions, entries, bytes
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.entries), 'bytes': self.bytes}
+
+    # endregion [cache]
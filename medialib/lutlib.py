@@ -0,0 +1,241 @@
+from threading import Lock
+from typing import Union
+
+import numpy as np
+
+from loglib.loglib import loglib
+
+# 4x4 bayer matrix, threshold = (BAYER4 + 0.5) / 16
+BAYER4 = np.array([[0, 8, 2, 10],
+                   [12, 4, 14, 6],
+                   [3, 11, 1, 9],
+                   [15, 7, 13, 5]], dtype=np.uint16)
+
+
+class lutlib:
+    """
+    Lookup table engine for RGB565.
+
+    decode: 65536 entries of rgb888 triples, rgb565 -> rgb888 is one gather (lut[u16]).
+    encode: 256 entries per channel (16 x 256 with ordered dither), rgb888 -> rgb565 is three gathers.
+
+    Tables are built lazily once per process. imagelib uses them only where they beat the arithmetic/cv2 path
+    (decode with replicate, dithered encode), plain decode/encode stay arithmetic/cv2 (see benchmark).
+
+    ps. the gathers are np.take(..., mode='clip'), indices are always in range and the default mode='raise'
+    writes into a full-frame temporary before copying to out.
+    """
+
+    slogger = loglib(__name__)
+
+    lock = Lock()
+    luts = {}
+
+    # region [lut]
+    @staticmethod
+    def get_lut(name: str):
+        """
+        get lookup table, build it at first use.
+
+        Parameters
+        ----------
+        name : str
+            'decode', 'decode_replicate', 'encode' or 'encode_dither'
+
+        Returns
+        -------
+        np.ndarray
+            decode: (65536, 3) uint8
+            encode: (3, 256) uint16, r/g/b contribution to rgb565
+            encode_dither: (3, 16, 256) uint16, r/g/b contribution for each bayer threshold
+        """
+        lut = lutlib.luts.get(name)
+        if lut is not None:
+            return lut
+
+        with lutlib.lock:
+            if name not in lutlib.luts:
+                lutlib.luts[name] = lutlib._build(name)
+            return lutlib.luts[name]
+
+    @staticmethod
+    def _build(name: str):
+        if name.startswith('decode'):
+            v = np.arange(0x10000, dtype=np.uint32)
+            (r5, g6, b5) = ((v >> 11) & 0x1f, (v >> 5) & 0x3f, v & 0x1f)
+            if name == 'decode_replicate':
+                lut = np.stack((r5 << 3 | r5 >> 2, g6 << 2 | g6 >> 4, b5 << 3 | b5 >> 2), axis=-1)
+            else:
+                lut = np.stack((r5 << 3, g6 << 2, b5 << 3), axis=-1)
+            return lut.astype(np.uint8)
+
+        v = np.arange(256, dtype=np.uint32)
+        if name == 'encode_dither':
+            # scale to the full 5/6 bits range (0xff -> 0x1f/0x3f, what a 565 panel shows) and add the threshold
+            t = (np.arange(16)[:, None] + 0.5) / 16
+            c5 = np.floor(v * 0x1f / 0xff + t).astype(np.uint32)
+            c6 = np.floor(v * 0x3f / 0xff + t).astype(np.uint32)
+        else:
+            (c5, c6) = (v >> 3, v >> 2)
+        return np.stack((c5 << 11, c6 << 5, c5), axis=0).astype(np.uint16)
+
+    # endregion [lut]
+
+    # region [convert]
+    @staticmethod
+    def decode(rgb565: Union[bytes, np.ndarray], width: int, height: int, replicate: bool = False,
+               out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB565 to RGB888 by lookup table, same result as imagelib.rgb5652rgb888.
+
+        Parameters
+        ----------
+        rgb565 : Union[bytes, np.ndarray]
+            rgb565 image data (little-endian)
+        width : int
+            width of image
+        height : int
+            height of image
+        replicate : bool
+            replicate the high bits into the low bits
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 3 bytes, contiguous), None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (height, width, 3) rgb888 image data
+        """
+
+        rgb888 = None
+
+        try:
+            lut = lutlib.get_lut('decode_replicate' if replicate else 'decode')
+            u16 = np.frombuffer(rgb565, dtype='<u2', count=width * height)
+            if out is None:
+                out = np.empty((height, width, 3), dtype=np.uint8)
+            rgb888 = np.frombuffer(out, dtype=np.uint8).reshape(height, width, 3)
+            np.take(lut, u16, axis=0, out=rgb888.reshape(-1, 3), mode='clip')
+        except Exception as e:
+            lutlib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        return rgb888
+
+    @staticmethod
+    def encode(rgb888: np.ndarray, dither: bool = False, out: Union[np.ndarray, bytearray] = None):
+        """
+        RGB888 to RGB565 by lookup table, same result as imagelib.rgb8882rgb565 when dither is False.
+
+        ps. dither is 4x4 ordered (bayer) dither, it hides the banding of smooth gradients on 565 displays.
+        the dithered levels are full range, decode them with replicate=True.
+
+        Parameters
+        ----------
+        rgb888 : np.ndarray
+            (height, width, 3) rgb888 image data, channel order r/g/b (a [..., ::-1] view for bgr888)
+        dither : bool
+            ordered dither before truncation
+        out : Union[np.ndarray, bytearray]
+            output buffer (height * width * 2 bytes, contiguous), None to allocate
+
+        Returns
+        -------
+        np.ndarray
+            (height, width, 2) rgb565 image data (little-endian)
+        """
+
+        rgb565 = None
+
+        try:
+            (h, w) = rgb888.shape[:2]
+            if out is None:
+                out = np.empty((h, w, 2), dtype=np.uint8)
+            rgb565 = np.frombuffer(out, dtype=np.uint8).reshape(h, w, 2)
+            u16 = rgb565.view('<u2').reshape(h, w)
+
+            # g and b are gathered into one scratch plane
+            tmp = np.empty((h, w), dtype=np.uint16)
+            if dither:
+                lut = lutlib.get_lut('encode_dither').reshape(3, -1)
+                # index = threshold * 256 + value
+                threshold = np.tile(BAYER4 << 8, ((h + 3) // 4, (w + 3) // 4))[:h, :w]
+                np.take(lut[0], threshold + rgb888[..., 0], out=u16, mode='clip')
+                for c in (1, 2):
+                    u16 |= np.take(lut[c], threshold + rgb888[..., c], out=tmp, mode='clip')
+            else:
+                lut = lutlib.get_lut('encode')
+                np.take(lut[0], rgb888[..., 0], out=u16, mode='clip')
+                for c in (1, 2):
+                    u16 |= np.take(lut[c], rgb888[..., c], out=tmp, mode='clip')
+        except Exception as e:
+            lutlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            rgb565 = None
+
+        return rgb565
+
+    # endregion [convert]
+
+    # region [benchmark]
+    @staticmethod
+    def benchmark(width: int = 1920, height: int = 1080, number: int = 20):
+        """
+        benchmark lookup table against arithmetic (imagelib) path.
+
+        Parameters
+        ----------
+        width : int
+            width of image
+        height : int
+            height of image
+        number : int
+            run count of each case
+
+        Returns
+        -------
+        dict
+            ms per call of each case
+        """
+        import timeit
+        from medialib.imagelib import imagelib
+
+        rgb565 = np.random.default_rng(0).integers(0, 256, width * height * 2, dtype=np.uint8).tobytes()
+        rgb888 = np.random.default_rng(1).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        out888 = np.empty((height, width, 3), dtype=np.uint8)
+        out565 = np.empty((height, width, 2), dtype=np.uint8)
+        words = np.frombuffer(rgb565, dtype='<u2').reshape(height, width)
+        planes = (out888[..., 0], out888[..., 1], out888[..., 2])
+
+        # build tables first
+        for name in ('decode', 'decode_replicate', 'encode', 'encode_dither'):
+            lutlib.get_lut(name)
+
+        cases = {
+            'decode_arithmetic': lambda: imagelib.rgb5652rgb888(rgb565, width, height, out=out888),
+            'decode_lut': lambda: lutlib.decode(rgb565, width, height, out=out888),
+            # rgb5652rgb888 routes replicate with out to the lut, call the arithmetic kernel itself
+            'decode_replicate_arithmetic': lambda: imagelib._rgb565_decode(words, *planes, replicate=True),
+            'decode_replicate_lut': lambda: lutlib.decode(rgb565, width, height, True, out888),
+            'encode_arithmetic': lambda: imagelib.rgb8882rgb565(rgb888, out=out565),
+            'encode_lut': lambda: lutlib.encode(rgb888, out=out565),
+            'encode_dither_lut': lambda: lutlib.encode(rgb888, dither=True, out=out565),
+        }
+
+        ret = {}
+        for case in cases:
+            ret[case] = timeit.timeit(cases[case], number=number) / number * 1000
+            lutlib.slogger.info(f'{width}x{height} {case}: {ret[case]:.3f} ms')
+
+        return ret
+
+    # endregion [benchmark]
+
+
+def main():
+    """
+    For console test
+    """
+    lutlib.benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import time
+from collections import OrderedDict
+from typing import Union
+
+import cv2
+import numpy as np
+
+from loglib.loglib import loglib
+from medialib.geomlib import geomlib
+from medialib.imagelib import PIX_FMT, imagelib
+
+
+class pipelib:
+    """
+    Declarative image pipeline, crop -> resize -> rotate -> pixel format.
+
+    Stages are compiled once per input geometry (shape, dtype, pixel format): crop boxes, sizes and matrices
+    are computed and output buffers are allocated at compile time, a run is only the kernels. Crops are
+    views, resize/rotate/format write into the compiled buffers (no intermediate copies).
+
+    ps. the output (and image) is a compiled buffer reused by the next run of the same geometry, copy it
+    when it must outlive the next run. For the same reason a pipelib is not thread-safe, use one per thread.
+
+    Usage:
+        pipe = pipelib().center_square().resize(320, 240).to('rgb565')
+        rgb565 = pipe.run_file('a.jpg')
+        print(pipe.timings)
+    """
+
+    slogger = loglib(__name__)
+
+    # max compiled geometries of a pipelib, the least recently used one (and its buffers) is dropped
+    MAX_COMPILED = 8
+
+    def __init__(self):
+        # (name, params) in order
+        self.stages = []
+        # (shape, dtype, src_fmt) -> compiled stages [(name, kernel)], oldest first
+        self.compiled = OrderedDict()
+        # stage -> [seconds, runs]
+        self.timings = {}
+        # image before pixel format conversion of the last run (crop/resize/rotate result)
+        self.image = None
+
+    # region [stage]
+    def _add(self, name: str, **params):
+        self.stages.append((name, params))
+        self.compiled.clear()
+        return self
+
+    def center_square(self):
+        """
+        crop the largest centered square (view).
+        """
+        return self._add('center_square')
+
+    def crop(self, x: int, y: int, width: int, height: int):
+        """
+        crop a box (view), the box is clipped to the image.
+        """
+        return self._add('crop', x=x, y=y, width=width, height=height)
+
+    def resize(self, width: int = 0, height: int = 0, inter: str = 'area'):
+        """
+        resize, keep the aspect rate when width or height is 0, see geomlib.resize.
+        """
+        return self._add('resize', width=width, height=height, inter=inter)
+
+    def rotate(self, angle: float, expand: bool = True, inter: str = 'nearest'):
+        """
+        rotate counterclockwise, see geomlib.rotate.
+        """
+        return self._add('rotate', angle=angle, expand=expand, inter=inter)
+
+    def to(self, dst_fmt: Union[PIX_FMT, str]):
+        """
+        convert to pixel format, the last stage.
+        """
+        return self._add('to', dst_fmt=PIX_FMT(dst_fmt))
+
+    # endregion [stage]
+
+    # region [compile]
+    def compile(self, shape: tuple, dtype: np.dtype = np.uint8, src_fmt: Union[PIX_FMT, str] = PIX_FMT.RGB888):
+        """
+        compile stages for an input geometry.
+
+        Parameters
+        ----------
+        shape : tuple
+            input shape (h, w) or (h, w, c)
+        dtype : np.dtype
+            input dtype
+        src_fmt : Union[PIX_FMT, str]
+            input pixel format (l8, rgb888, bgr888, rgba), used by to()
+
+        Returns
+        -------
+        list
+            [(name, kernel(src) -> dst)]
+        """
+        src_fmt = PIX_FMT(src_fmt)
+        key = (tuple(shape), np.dtype(dtype), src_fmt)
+        compiled = self.compiled.get(key)
+        if compiled is not None:
+            self.compiled.move_to_end(key)
+            return compiled
+
+        (h, w) = shape[:2]
+        rest = tuple(shape[2:])
+        compiled = []
+        for name, params in self.stages:
+            kernel = None
+            if name == 'center_square':
+                size = min(w, h)
+                (x, y) = ((w - size) // 2, (h - size) // 2)
+                kernel = pipelib._crop_kernel(x, y, size, size)
+                (w, h) = (size, size)
+            elif name == 'crop':
+                x = min(max(0, int(params['x'])), w)
+                y = min(max(0, int(params['y'])), h)
+                (cw, ch) = (min(int(params['width']), w - x), min(int(params['height']), h - y))
+                kernel = pipelib._crop_kernel(x, y, cw, ch)
+                (w, h) = (cw, ch)
+            elif name == 'resize':
+                (rw, rh) = (params['width'], params['height'])
+                if rw == 0 and rh == 0:
+                    continue
+                if rw == 0:
+                    rw = int(w * rh / float(h))
+                elif rh == 0:
+                    rh = int(h * rw / float(w))
+                buf = np.empty((rh, rw) + rest, dtype=dtype)
+                kernel = pipelib._resize_kernel(buf, geomlib.INTERS[params['inter']][0])
+                (w, h) = (rw, rh)
+            elif name == 'rotate':
+                k = geomlib.right_angle(w, h, params['angle'], params['expand'])
+                if k == 0:
+                    continue
+                if k is None:
+                    (matrix, rw, rh) = geomlib.rotate_matrix(w, h, params['angle'], params['expand'])
+                else:
+                    (matrix, rw, rh) = (None, h, w) if k % 2 else (None, w, h)
+                buf = np.empty((rh, rw) + rest, dtype=dtype)
+                kernel = pipelib._rotate_kernel(buf, k, matrix, geomlib.INTERS[params['inter']][0])
+                (w, h) = (rw, rh)
+            elif name == 'to':
+                dst_fmt = params['dst_fmt']
+                plan = imagelib.get_plan()
+                if (src_fmt, dst_fmt) not in plan:
+                    raise ValueError(f'{src_fmt} -> {dst_fmt} is not supported')
+                buf = np.empty(imagelib.fmt_shape(dst_fmt, w, h), dtype=np.uint8)
+                kernel = pipelib._format_kernel(buf, plan[(src_fmt, dst_fmt)])
+            compiled.append((name, kernel))
+
+        self.compiled[key] = compiled
+        if len(self.compiled) > pipelib.MAX_COMPILED:
+            self.compiled.popitem(last=False)
+        return compiled
+
+    @staticmethod
+    def _crop_kernel(x: int, y: int, width: int, height: int):
+        return lambda src: src[y:y + height, x:x + width]
+
+    @staticmethod
+    def _resize_kernel(buf: np.ndarray, inter: int):
+        (h, w) = buf.shape[:2]
+        return lambda src: cv2.resize(src, (w, h), dst=buf, interpolation=inter)
+
+    @staticmethod
+    def _rotate_kernel(buf: np.ndarray, k: int, matrix: np.ndarray, inter: int):
+        if k is not None:
+            return lambda src: cv2.rotate(src, geomlib.ROTATE_CODES[k], dst=buf)
+        (h, w) = buf.shape[:2]
+        return lambda src: cv2.warpAffine(src, matrix, (w, h), dst=buf, flags=inter | cv2.WARP_INVERSE_MAP,
+                                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    @staticmethod
+    def _format_kernel(buf: np.ndarray, kernel):
+        if kernel is None:
+            # same format
+            def copy(src):
+                np.copyto(buf, src)
+                return buf
+            return copy
+        return lambda src: kernel(src, buf)
+
+    # endregion [compile]
+
+    # region [run]
+    def run(self, image: np.ndarray, src_fmt: Union[PIX_FMT, str] = PIX_FMT.RGB888):
+        """
+        run the pipeline on an image.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            (h, w) or (h, w, c) image
+        src_fmt : Union[PIX_FMT, str]
+            pixel format of image
+
+        Returns
+        -------
+        np.ndarray
+            output (a compiled buffer or a view of image), None when failed
+        """
+        try:
+            compiled = self.compile(image.shape, image.dtype, src_fmt)
+            self.image = image
+            for name, kernel in compiled:
+                start = time.perf_counter()
+                image = kernel(image)
+                timing = self.timings.setdefault(name, [0.0, 0])
+                timing[0] += time.perf_counter() - start
+                timing[1] += 1
+                if name != 'to':
+                    self.image = image
+        except Exception as e:
+            pipelib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return None
+
+        return image
+
+    def run_file(self, file: str):
+        """
+        decode file (cv2, bgr888, exif orientation ignored like PIL) and run the pipeline.
+
+        ps. formats cv2 can't decode (e.g. gif) are decoded by PIL and converted to bgr888, and a jpeg
+        decoded by cv2 may differ from PIL by a few levels (different libjpeg build/upsampling).
+
+        Parameters
+        ----------
+        file : str
+            image file
+
+        Returns
+        -------
+        np.ndarray
+            output, None when failed
+        """
+        start = time.perf_counter()
+        image = cv2.imread(file, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if image is None:
+            image = pipelib._pil_decode(file)
+        if image is None:
+            pipelib.slogger.error(f'{file} decode fail!!!')
+            return None
+        timing = self.timings.setdefault('decode', [0.0, 0])
+        timing[0] += time.perf_counter() - start
+        timing[1] += 1
+
+        return self.run(image, PIX_FMT.BGR888)
+
+    @staticmethod
+    def _pil_decode(file: str):
+        """
+        decode file by PIL to bgr888, None when failed.
+        """
+        pilimage = imagelib.pilopen(file, lazy=True)
+        if pilimage is None:
+            return None
+        try:
+            with pilimage:
+                rgb888 = np.asarray(pilimage.convert('RGB'))
+        except (OSError, ValueError) as e:
+            pipelib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return None
+        return cv2.cvtColor(rgb888, cv2.COLOR_RGB2BGR)
+
+    def __call__(self, image: np.ndarray, src_fmt: Union[PIX_FMT, str] = PIX_FMT.RGB888):
+        return self.run(image, src_fmt)
+
+    def report(self):
+        """
+        log ms per run of each stage.
+
+        Returns
+        -------
+        dict
+            stage -> ms per run
+        """
+        ms = {name: seconds / runs * 1000 for name, (seconds, runs) in self.timings.items() if runs}
+        pipelib.slogger.info(', '.join(f'{name}: {v:.3f} ms' for name, v in ms.items()))
+        return ms
+
+    # endregion [run]
+
+
+def main():
+    """
+    For console test
+    """
+    image = np.random.default_rng(0).integers(0, 256, (3000, 4000, 3), dtype=np.uint8)
+    pipe = pipelib().center_square().resize(320, 240).rotate(90).to('rgb565')
+    for _ in range(10):
+        pipe(image)
+    pipe.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import json
+import mmap
+import os
+import struct
+from typing import Union
+
+import numpy as np
+
+from loglib.loglib import loglib
+from medialib.imagelib import PIX_FMT, imagelib
+
+
+class rawlib:
+    """
+    Raw framebuffer container, a small header + N frames of raw pixel data.
+
+    header (little-endian, 40 bytes):
+        magic (4s) b'PMRW', version (H), header_size (H), width (I), height (I), pix_fmt (8s),
+        stride (I, bytes per row), frame_size (I), frame_count (I), meta_size (I)
+    followed by meta (json, meta_size bytes) and padding to header_size (64 bytes aligned),
+    then frame_count frames of frame_size bytes.
+
+    The loader maps the file (mmap) and returns ndarray views, frame k is at header_size + k * frame_size.
+    """
+
+    slogger = loglib(__name__)
+
+    MAGIC = b'PMRW'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHII8sIIII')
+    ALIGN = 64
+    # offset of frame_count in header
+    OFFSET_FRAME_COUNT = 32
+
+    def __init__(self, file: str):
+        """
+        open container file with mmap (read only).
+
+        Parameters
+        ----------
+        file : str
+            file name
+        """
+        self.file = file
+        self.header = None
+        self.mm = None
+        self.frames = None
+        self.open()
+
+    # region [reader]
+    def open(self):
+        """
+        (re)map the file, call it again to see the frames appended after open.
+        """
+        self.close()
+
+        try:
+            self.header = rawlib.read_header(self.file)
+            if self.header is None:
+                return
+
+            with open(self.file, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            # frames view: (n, rows, stride) -> drop row padding -> (n, *shape)
+            h = self.header
+            shape = imagelib.fmt_shape(PIX_FMT(h['pix_fmt']), h['width'], h['height'])
+            count = min(h['frame_count'], (len(self.mm) - h['header_size']) // h['frame_size'])
+            frames = np.frombuffer(self.mm, dtype=np.uint8, count=count * h['frame_size'], offset=h['header_size'])
+            frames = frames.reshape(count, shape[0], h['stride'])[:, :, :int(np.prod(shape[1:]))]
+            self.frames = frames.reshape((count,) + shape)
+        except Exception as e:
+            rawlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            self.close()
+
+    def close(self):
+        self.frames = None
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # a view is still alive, the mapping is released with the last view
+                pass
+            self.mm = None
+
+    def frame(self, k: int):
+        """
+        get frame k (zero-copy view).
+
+        Parameters
+        ----------
+        k : int
+            frame index, negative index counts from the end
+
+        Returns
+        -------
+        np.ndarray
+            frame view, shape see imagelib.fmt_shape, None when out of range
+        """
+        if self.frames is None or not -len(self.frames) <= k < len(self.frames):
+            rawlib.slogger.error(f'frame {k} is out of range!!!')
+            return None
+        return self.frames[k]
+
+    def __len__(self):
+        return 0 if self.frames is None else len(self.frames)
+
+    @staticmethod
+    def read_header(file: str):
+        """
+        read container header.
+
+        Parameters
+        ----------
+        file : str
+            file name
+
+        Returns
+        -------
+        dict
+            width, height, pix_fmt, stride, frame_size, frame_count, header_size, meta; None when not a container
+        """
+        try:
+            with open(file, 'rb') as f:
+                data = f.read(rawlib.HEADER.size)
+                if len(data) < rawlib.HEADER.size:
+                    rawlib.slogger.error(f'{file} is too short!!!')
+                    return None
+
+                (magic, version, header_size, width, height, pix_fmt, stride, frame_size, frame_count,
+                 meta_size) = rawlib.HEADER.unpack(data)
+                if magic != rawlib.MAGIC or version != rawlib.VERSION:
+                    rawlib.slogger.error(f'{file} is not a raw container!!!')
+                    return None
+
+                meta = json.loads(f.read(meta_size)) if meta_size else {}
+        except (IOError, ValueError) as e:
+            rawlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return None
+
+        return {'width': width, 'height': height, 'pix_fmt': pix_fmt.rstrip(b'\0').decode(), 'stride': stride,
+                'frame_size': frame_size, 'frame_count': frame_count, 'header_size': header_size, 'meta': meta}
+
+    # endregion [reader]
+
+    # region [writer]
+    @staticmethod
+    def write(file: str, frames: Union[np.ndarray, list], pix_fmt: Union[PIX_FMT, str], width: int, height: int,
+              meta: dict = None):
+        """
+        write a new container (overwrite).
+
+        Parameters
+        ----------
+        file : str
+            file name
+        frames : Union[np.ndarray, list]
+            one frame, (N, *shape) ndarray or list of frames (bytes/ndarray), empty list for header only
+        pix_fmt : Union[PIX_FMT, str]
+            pixel format
+        width : int
+            width of image
+        height : int
+            height of image
+        meta : dict
+            extra info saved as json in header
+
+        Returns
+        -------
+        bool
+            write status
+        """
+        try:
+            pix_fmt = PIX_FMT(pix_fmt)
+            shape = imagelib.fmt_shape(pix_fmt, width, height)
+            frame_size = int(np.prod(shape))
+            stride = frame_size // shape[0]
+
+            meta = json.dumps(meta).encode() if meta else b''
+            header_size = -(-(rawlib.HEADER.size + len(meta)) // rawlib.ALIGN) * rawlib.ALIGN
+            header = rawlib.HEADER.pack(rawlib.MAGIC, rawlib.VERSION, header_size, width, height,
+                                        pix_fmt.value.encode(), stride, frame_size, 0, len(meta))
+
+            with open(file, 'wb') as f:
+                f.write(header)
+                f.write(meta)
+                f.write(b'\0' * (header_size - len(header) - len(meta)))
+        except Exception as e:
+            rawlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return False
+
+        if type(frames) is np.ndarray and frames.size == frame_size:
+            frames = [frames]
+
+        return rawlib.append(file, frames)
+
+    @staticmethod
+    def append(file: str, frames: Union[np.ndarray, list, bytes]):
+        """
+        append frames to a container, frame data is written before frame_count is updated, so a reader
+        never sees a frame that is not completely written.
+
+        Parameters
+        ----------
+        file : str
+            file name
+        frames : Union[np.ndarray, list, bytes]
+            one frame (bytes or ndarray of frame_size), (N, *shape) ndarray or list of frames
+
+        Returns
+        -------
+        bool
+            append status
+        """
+        header = rawlib.read_header(file)
+        if header is None:
+            return False
+
+        frame_size = header['frame_size']
+
+        try:
+            if type(frames) is not list:
+                frames = np.frombuffer(frames, dtype=np.uint8) if type(frames) is not np.ndarray else frames
+                frames = list(np.ascontiguousarray(frames).reshape(-1, frame_size))
+
+            with open(file, 'r+b') as f:
+                count = header['frame_count']
+                f.seek(header['header_size'] + count * frame_size)
+                for frame in frames:
+                    data = memoryview(np.ascontiguousarray(np.frombuffer(frame, dtype=np.uint8)
+                                                           if type(frame) is not np.ndarray else frame))
+                    if data.nbytes != frame_size:
+                        rawlib.slogger.error(f'frame size {data.nbytes} != {frame_size}!!!')
+                        break
+                    f.write(data.cast('B'))
+                    count += 1
+
+                f.flush()
+                f.seek(rawlib.OFFSET_FRAME_COUNT)
+                f.write(struct.pack('<I', count))
+        except (IOError, ValueError) as e:
+            rawlib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return False
+
+        return count == header['frame_count'] + len(frames)
+
+    # endregion [writer]
+
+    # region [with]
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    # endregion [with]
+
+
+def main():
+    """
+    For console test
+    """
+    file = 'rawlib_test.raw'
+    rgb565 = np.random.default_rng(0).integers(0, 256, (4, 240, 320, 2), dtype=np.uint8)
+    rawlib.write(file, rgb565[:2], PIX_FMT.RGB565, 320, 240, {'source': 'main'})
+    rawlib.append(file, rgb565[2:])
+    with rawlib(file) as raw:
+        print(raw.header, len(raw), (raw.frame(3) == rgb565[3]).all())
+    os.remove(file)
+
+
+if __name__ == "__main__":
+    main()
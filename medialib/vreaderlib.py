@@ -0,0 +1,465 @@
+import bisect
+import json
+import os
+import queue
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+
+import cv2
+
+from loglib.loglib import loglib
+
+
+class vreaderlib:
+    """
+    Video file reader, a worker thread decodes ahead into a bounded queue, the read-ahead window doubles with
+    each sequential read (up to queue_size) and is reset by a seek.
+
+    A keyframe/timestamp index is built by one grab() pass at the first open and cached next to the file
+    (<file>.index.json, built again when the file is changed). Random access (seek/read_at) picks the cheapest
+    way to a frame:
+        - recently read: replayed from the history, no decode
+        - queued: queued frames before it are dropped
+        - ahead and no farther than a seek would decode: grab() forward, no seek
+        - else: CAP_PROP_POS_FRAMES seek, ffmpeg seeks to the keyframe before frame - SEEK_DELTA and decodes forward
+    Keyframes come from CAP_PROP_LRF_HAS_KEY_FRAME, when it's not supported a seek is assumed to decode
+    SEEK_DELTA frames. A seek of read_at decodes the frame on the caller's thread; cv2 seeks to the keyframe before
+    frame - SEEK_DELTA whatever frame is set, so the index can't make a seek itself cheaper.
+
+    ps. read/seek from one thread, frames are shared with the history (copy before modifying them).
+
+    Usage:
+        with vreaderlib('a.mp4') as vr:
+            (n, ms, frame) = vr.read_at(100)
+            while frame is not None:
+                (n, ms, frame) = vr.read()
+    """
+
+    slogger = loglib(__name__)
+
+    INDEX_VERSION = 1
+    # frames cv2 (ffmpeg) seeks before the target frame
+    SEEK_DELTA = 16
+    # cost of a seek itself, in decoded frames
+    SEEK_COST = 2
+
+    def __init__(self, file: str, queue_size: int = 16, history: int = 16, use_index: bool = True):
+        """
+        Parameters
+        ----------
+        file : str
+            video file
+        queue_size : int
+            max frames decoded ahead
+        history : int
+            recently read frames kept for seeking back
+        use_index : bool
+            build (or load) the keyframe/timestamp index
+        """
+        self.file = file
+        self.stream = cv2.VideoCapture(file)
+        self.index = vreaderlib.get_index(file) if use_index and self.stream.isOpened() else None
+
+        self.queue = queue.Queue(max(1, queue_size))
+        self.history = deque(maxlen=max(1, history))
+        # history frames to return before the queue, after seeking back
+        self.replay = deque()
+        self.lock = Lock()
+        self.cond = Condition(self.lock)
+        self.worker = None
+        self.started = False
+        # held while the stream is positioned or read (by the worker, or by read_at on the reader's thread)
+        self.stream_lock = Lock()
+        # next frame of the stream
+        self.stream_pos = 0
+
+        # generation of seek, the worker repositions to target when it's changed; queued frames of older
+        # generations are dropped
+        self.gen = 0
+        self.target = 0
+        # next frame from the queue, queued frames before skip_to are dropped
+        self.pos = 0
+        self.skip_to = 0
+        self.eof = False
+        # frames decoded ahead of pos, grown by sequential reads and reset by seeks (random access decodes
+        # nothing it doesn't read)
+        self.window = 0
+        self.streak = 0
+        self.waiting = False
+        # how frames are reached: replay, skip, grab, seek
+        self.counts = {'replay': 0, 'skip': 0, 'grab': 0, 'seek': 0}
+
+    # region [index]
+    @staticmethod
+    def index_file(file: str):
+        return f'{file}.index.json'
+
+    @staticmethod
+    def get_index(file: str):
+        """
+        load the index of file, or build and save it.
+
+        Returns
+        -------
+        dict
+            frames, fps, stamps (ms of each frame), keyframes (frame numbers, None when unknown); None when failed
+        """
+        index = vreaderlib.load_index(file)
+        if index is None:
+            index = vreaderlib.build_index(file)
+            if index is not None:
+                vreaderlib.save_index(file, index)
+        return index
+
+    @staticmethod
+    def build_index(file: str):
+        """
+        build the index by one grab() pass (no color conversion).
+        """
+        start = time.perf_counter()
+        cap = cv2.VideoCapture(file)
+        try:
+            if not cap.isOpened():
+                vreaderlib.slogger.error(f'open {file} fail!!!')
+                return None
+            (stamps, keyframes, has_key) = ([], [], True)
+            while cap.grab():
+                stamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+                key = cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)
+                if key < 0 or (not stamps[1:] and not key):
+                    # not supported (or the first frame isn't a keyframe, can't be trusted)
+                    has_key = False
+                elif key:
+                    keyframes.append(len(stamps) - 1)
+            index = {'frames': len(stamps), 'fps': cap.get(cv2.CAP_PROP_FPS), 'stamps': stamps,
+                     'keyframes': keyframes if has_key else None}
+        finally:
+            cap.release()
+
+        vreaderlib.slogger.info(f'{file}: {index["frames"]} frames, '
+                                f'{len(keyframes) if has_key else "unknown"} keyframes, '
+                                f'{(time.perf_counter() - start) * 1000:.1f} ms')
+        return index
+
+    @staticmethod
+    def _stamp(file: str):
+        st = os.stat(file)
+        return {'version': vreaderlib.INDEX_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                'cv2': cv2.__version__}
+
+    @staticmethod
+    def load_index(file: str):
+        """
+        load the cached index, None when not found or file is changed.
+        """
+        index_file = vreaderlib.index_file(file)
+        if not os.path.isfile(index_file):
+            return None
+        try:
+            with open(index_file, 'r') as f:
+                data = json.load(f)
+            if data.get('stamp') == vreaderlib._stamp(file):
+                return data['index']
+        except (IOError, ValueError, KeyError) as e:
+            vreaderlib.slogger.error(f'{type(e).__name__}!!! {e}')
+        return None
+
+    @staticmethod
+    def save_index(file: str, index: dict):
+        """
+        save index next to file (write temp file and rename), the folder may be read-only.
+        """
+        index_file = vreaderlib.index_file(file)
+        try:
+            tmp = f'{index_file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'stamp': vreaderlib._stamp(file), 'index': index}, f)
+            os.replace(tmp, index_file)
+        except IOError as e:
+            vreaderlib.slogger.warning(f'{type(e).__name__}!!! {e}')
+            return False
+        return True
+
+    def frame_at(self, ms: float):
+        """
+        frame number at time ms (the last frame starting at or before ms).
+        """
+        if self.index and self.index['stamps']:
+            return max(0, bisect.bisect_right(self.index['stamps'], ms) - 1)
+        return max(0, int(ms * self.stream.get(cv2.CAP_PROP_FPS) / 1000))
+
+    def seek_frames(self, n: int):
+        """
+        frames decoded to reach frame n by a seek (plus the cost of the seek).
+        """
+        start = max(0, n - vreaderlib.SEEK_DELTA)
+        keyframes = self.index and self.index['keyframes']
+        if keyframes:
+            k = bisect.bisect_right(keyframes, start) - 1
+            start = keyframes[k] if k >= 0 else 0
+        return n - start + vreaderlib.SEEK_COST
+
+    # endregion [index]
+
+    # region [decode]
+    def start(self):
+        if self.started:
+            vreaderlib.slogger.warning('already started!!!')
+            return None
+        self.started = True
+        self.worker = Thread(target=self._decode, name='vreaderlib', daemon=True)
+        self.worker.start()
+        return self
+
+    def _decode(self):
+        gen = -1
+        while self.started:
+            # decode within the read-ahead window, or the frame the reader waits for
+            with self.lock:
+                self.cond.wait_for(lambda: not self.started or self.gen != gen or self.waiting
+                                   or self.stream_pos < self.pos + self.window)
+            if not self.started:
+                break
+
+            with self.stream_lock:
+                # read_at may have moved the stream meanwhile
+                with self.lock:
+                    (changed, gen, target) = (self.gen != gen, self.gen, self.target)
+                if changed:
+                    self.stream_pos = self._position(self.stream_pos, target)
+                    continue
+                pos = self.stream_pos
+                (grabbed, frame) = self.stream.read()
+                item = (gen, pos, self.stream.get(cv2.CAP_PROP_POS_MSEC), frame) if grabbed else (gen, -1, 0.0, None)
+                self.stream_pos += 1
+            while self.started:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    if self.gen != gen:
+                        break
+
+            if not grabbed:
+                # end of file, wait for a seek
+                with self.lock:
+                    self.cond.wait_for(lambda: self.gen != gen or not self.started)
+
+    def _position(self, pos: int, target: int):
+        """
+        move the stream from frame pos to target, grab() forward when it's cheaper than a seek.
+        """
+        if target == pos:
+            return target
+        if pos < target and target - pos <= self.seek_frames(target):
+            for _ in range(target - pos):
+                if not self.stream.grab():
+                    break
+            self.counts['grab'] += 1
+        else:
+            self.stream.set(cv2.CAP_PROP_POS_FRAMES, target)
+            self.counts['seek'] += 1
+        return target
+
+    def read(self):
+        """
+        read the next frame.
+
+        Returns
+        -------
+        tuple
+            (frame number, ms, frame), (-1, 0.0, None) at the end of file (or when stopped)
+        """
+        if self.replay:
+            return self.replay.popleft()
+        if self.eof:
+            return -1, 0.0, None
+        if not self.started:
+            self.start()
+
+        while True:
+            try:
+                (gen, n, stamp, frame) = self.queue.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    self.waiting = True
+                    self.cond.notify_all()
+                item = None
+                while item is None:
+                    try:
+                        item = self.queue.get(timeout=0.1)
+                    except queue.Empty:
+                        if not self.started or not self.worker.is_alive():
+                            break
+                with self.lock:
+                    self.waiting = False
+                if item is None:
+                    vreaderlib.slogger.warning('decode thread is stopped!!!')
+                    return -1, 0.0, None
+                (gen, n, stamp, frame) = item
+            if gen != self.gen:
+                continue
+            if frame is None:
+                self.eof = True
+                return -1, 0.0, None
+            if n < self.skip_to:
+                continue
+            if n != self.pos:
+                self.history.clear()
+            with self.lock:
+                # read ahead more while reads are sequential
+                self.pos = n + 1
+                self.streak += 1
+                self.window = min(self.queue.maxsize, 1 << (self.streak - 1)) if self.streak > 1 else 0
+                self.cond.notify_all()
+            self.history.append((n, stamp, frame))
+            return n, stamp, frame
+
+    def seek(self, n: int):
+        """
+        seek to frame n, the next read() returns it.
+        """
+        self._seek(n)
+
+    def _seek(self, n: int):
+        """
+        see seek, True when the stream has to be moved (n is not in the history or the queue).
+        """
+        n = max(0, int(n))
+        # the history is contiguous up to pos - 1, the queue continues after it
+        for i, item in enumerate(self.history):
+            if item[0] == n:
+                self.replay = deque(list(self.history)[i:])
+                # the queue continues at pos again, drop an earlier skip
+                self.skip_to = self.pos
+                self.counts['replay'] += 1
+                return False
+        self.replay.clear()
+
+        if self.started and not self.eof and self.pos <= n < self.pos + self.queue.qsize():
+            self.skip_to = n
+            self.streak = 0
+            self.counts['skip'] += 1
+            return False
+
+        with self.lock:
+            # drop stale frames before the generation changes, so the worker isn't blocked by a full queue (after
+            # it, the worker may already queue the target)
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.gen += 1
+            self.target = n
+            self.skip_to = n
+            self.pos = n
+            (self.streak, self.window) = (0, 0)
+            self.eof = False
+            self.history.clear()
+            self.cond.notify_all()
+        return True
+
+    def read_at(self, n: int):
+        """
+        read frame n, see read(). A frame that has to be sought is decoded on the caller's thread (no hand-off to
+        the worker), random access costs about a plain CAP_PROP_POS_FRAMES seek.
+        """
+        if not self._seek(n):
+            return self.read()
+
+        with self.stream_lock:
+            n = self.target
+            self.stream_pos = self._position(self.stream_pos, n)
+            (grabbed, frame) = self.stream.read()
+            stamp = self.stream.get(cv2.CAP_PROP_POS_MSEC)
+            self.stream_pos += 1
+            with self.lock:
+                # the worker goes on after n
+                self.gen += 1
+                self.target = self.stream_pos
+                if not grabbed:
+                    self.eof = True
+                else:
+                    (self.pos, self.skip_to, self.streak) = (n + 1, n + 1, 1)
+                self.cond.notify_all()
+        if not grabbed:
+            return -1, 0.0, None
+        self.history.append((n, stamp, frame))
+        return n, stamp, frame
+
+    def read_time(self, ms: float):
+        """
+        read the frame at time ms, see read().
+        """
+        return self.read_at(self.frame_at(ms))
+
+    def stop(self):
+        self.started = False
+        with self.lock:
+            self.cond.notify_all()
+        if self.worker and self.worker.is_alive():
+            self.worker.join()
+
+    def release(self):
+        # stop before release
+        self.stop()
+        self.stream.release()
+
+    # endregion [decode]
+
+    # region [with]
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+    # endregion [with]
+
+
+def main():
+    """
+    For console test: python -m medialib.vreaderlib [video file], random access vs CAP_PROP_POS_FRAMES seek
+    """
+    import random
+    import sys
+    import tempfile
+
+    import numpy as np
+
+    with tempfile.TemporaryDirectory() as folder:
+        file = sys.argv[1] if sys.argv[1:] else os.path.join(folder, 'vreaderlib.mp4')
+        if not sys.argv[1:]:
+            writer = cv2.VideoWriter(file, cv2.VideoWriter_fourcc(*'mp4v'), 30, (1280, 720))
+            for k in range(600):
+                writer.write(np.full((720, 1280, 3), k % 256, dtype=np.uint8))
+            writer.release()
+
+        with vreaderlib(file) as vr:
+            frames = vr.index['frames']
+        rng = random.Random(0)
+        patterns = {
+            'random': [rng.randrange(frames) for _ in range(50)],
+            'stride5': list(range(0, frames, 5))[:100],
+            'scrub': [max(0, min(frames - 1, 300 + rng.randint(-20, 20))) for _ in range(50)],
+        }
+        for name, targets in patterns.items():
+            cap = cv2.VideoCapture(file)
+            start = time.perf_counter()
+            for n in targets:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, n)
+                cap.read()
+            seek_ms = (time.perf_counter() - start) / len(targets) * 1000
+            cap.release()
+
+            with vreaderlib(file) as vr:
+                start = time.perf_counter()
+                for n in targets:
+                    vr.read_at(n)
+                ms = (time.perf_counter() - start) / len(targets) * 1000
+                print(f'{name}: CAP_PROP_POS_FRAMES {seek_ms:.2f} ms, vreaderlib {ms:.2f} ms, {vr.counts}')
+
+
+if __name__ == "__main__":
+    main()
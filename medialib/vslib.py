@@ -1,8 +1,14 @@
+import json
+import os
+import sys
 import time
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+from typing import Callable
 from typing import Union
 
 import cv2
+import numpy as np
 
 import medialib
 from loglib.loglib import loglib
@@ -12,12 +18,43 @@ class vslib:
     """
     The library for camera video stream.
 
+    The capture thread (start) decodes into a ring of preallocated slots, each frame has a sequence number
+    and a capture timestamp, see read_latest/read_next/read_window.
+
+    ps. a slot (copy=False, subscribe callbacks, self.frame) is overwritten in place once ring_size - 1 newer
+    frames are captured, reading it later can get a torn frame (half of two frames), copy it before that.
+
     reference: https://gist.github.com/allskyee/7749b9318e914ca45eb0a1000a81bf56
     """
 
     slogger = loglib('__name__')
 
-    def __init__(self, src: Union[int, str] = 0, width: int = 0, height: int = 0):
+    # probe results of get_cam_list_res, None to disable
+    cam_cache_file = os.path.join(os.path.expanduser('~'), '.cache', 'pymisc2', 'vslib_cams.json')
+    CAM_CACHE_VERSION = 2
+    V4L2_SYSFS = '/sys/class/video4linux'
+    # device identities unique to a camera (see device_id), only their probe results are cached
+    CAM_CACHE_IDS = ('v4l2/', 'msmf/')
+
+    # media foundation attribute guids, see _msmf_devices
+    MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE = 'c60ac5fe-252a-478f-a0ef-bc8fa5f7cad3'
+    MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE_VIDCAP_GUID = '8ac3587a-4ae7-42d8-99e0-0a6013eef90f'
+    MF_DEVSOURCE_ATTRIBUTE_FRIENDLY_NAME = '60d0e559-52f8-4fa2-bbce-acdb34a8ec01'
+    MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE_VIDCAP_SYMBOLIC_LINK = '58f0aad8-22bf-4f8a-bb3d-d2c4978c6e2f'
+
+    def __init__(self, src: Union[int, str] = 0, width: int = 0, height: int = 0, ring_size: int = 4):
+        """
+        Parameters
+        ----------
+        src : Union[int, str]
+            camera index or video file
+        width : int
+            capture width, 0 for default
+        height : int
+            capture height, 0 for default
+        ring_size : int
+            frame slots of the ring (at least 2), the latest ring_size - 1 frames can be read back
+        """
         self.update_thread = None
         import datetime
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S.%f')
@@ -29,12 +66,28 @@ class vslib:
             self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         self.logger.info(f'(w, h, fps, fcnt): {self.getinfo()}')
+        self.started = False
+        self.read_lock = Lock()
+        # notified once per captured frame (and when capture ends)
+        self.read_cond = Condition(self.read_lock)
+        # callback(seq, timestamp, frame) of each captured frame, see subscribe
+        self.subscribers = []
+
+        # ring of preallocated frame slots, frame seq is in slot seq % ring_size (allocated at the first frame)
+        self.ring_size = max(2, ring_size)
+        self.ring = None
+        # seq/timestamp of each slot, seq 0 is empty (or being written)
+        self.seqs = [0] * self.ring_size
+        self.stamps = [0.0] * self.ring_size
+        # seq of the latest frame, 0 for no frame yet
+        self.seq = 0
+
         if type(src) == int:
             (self.grabbed, self.frame) = self.stream.read()
+            if self.grabbed:
+                self._publish(self.seq + 1, None, self.frame, time.perf_counter())
         else:
             (self.grabbed, self.frame) = (True, None)
-        self.started = False
-        self.read_lock = Lock()
 
     # region [camera]
     def start(self):
@@ -48,21 +101,188 @@ class vslib:
 
     def update(self):
         while self.started:
-            (grabbed, frame) = self.stream.read()
-            self.read_lock.acquire()
-            self.grabbed, self.frame = grabbed, frame
-            self.read_lock.release()
+            # decode straight into the next slot, it's marked empty first so no reader gets a half frame
+            with self.read_lock:
+                seq = self.seq + 1
+                slot = None
+                if self.ring is not None:
+                    slot = self.ring[seq % self.ring_size]
+                    self.seqs[seq % self.ring_size] = 0
+
+            (grabbed, frame) = self.stream.read(image=slot) if slot is not None else self.stream.read()
+            stamp = time.perf_counter()
+
+            with self.read_lock:
+                self.grabbed = grabbed
+                if grabbed and frame is not None:
+                    self._publish(seq, slot, frame, stamp)
+                    frame = self.ring[seq % self.ring_size]
+                # legacy self.frame is the latest slot (None when read fails), read() returns a copy
+                self.frame = frame
+                self.read_cond.notify_all()
+
+            if not grabbed:
+                if type(self.src) != int:
+                    # end of video file
+                    self.logger.info(f'end of {self.src}, {self.seq} frames')
+                    break
+                continue
+
+            for callback in list(self.subscribers):
+                try:
+                    callback(seq, stamp, frame)
+                except Exception as e:
+                    self.logger.error(f'{type(e).__name__}!!! {e}')
+
+        with self.read_lock:
+            self.read_cond.notify_all()
+
+    def _publish(self, seq: int, slot, frame, stamp: float):
+        """
+        make frame seq readable, call it with read_lock held.
+        """
+        index = seq % self.ring_size
+        if slot is None or frame.ctypes.data != slot.ctypes.data or frame.shape != slot.shape:
+            # first frame, or the frame size is changed: (re)allocate the ring
+            if self.ring is None or self.ring.shape[1:] != frame.shape or self.ring.dtype != frame.dtype:
+                self.ring = np.empty((self.ring_size,) + frame.shape, dtype=frame.dtype)
+                self.seqs = [0] * self.ring_size
+            np.copyto(self.ring[index], frame)
+        self.seqs[index] = seq
+        self.stamps[index] = stamp
+        self.seq = seq
+
+    def _get(self, seq: int, copy: bool):
+        """
+        get frame seq, call it with read_lock held.
+        """
+        index = seq % self.ring_size
+        frame = self.ring[index]
+        return seq, self.stamps[index], frame.copy() if copy else frame
 
     def read(self):
-        self.read_lock.acquire()
-        frame = None
-        if self.frame is not None:
-            frame = self.frame.copy()
-        else:
+        """
+        read the latest frame (copy).
+
+        Returns
+        -------
+        np.ndarray
+            frame, None when no frame yet
+        """
+        (_, _, frame) = self.read_latest()
+        if frame is None:
             self.logger.error('frame is None!!!')
-        self.read_lock.release()
         return frame
 
+    def _wait(self, after_seq: int, timeout: float):
+        """
+        wait until a frame newer than after_seq is captured or capture ends, call it with read_lock held.
+        """
+        if timeout != 0 and self.seq <= after_seq:
+            self.read_cond.wait_for(lambda: self.seq > after_seq or not self.grabbed or not self.capturing(),
+                                    timeout)
+
+    def capturing(self):
+        """
+        if the capture thread is running.
+        """
+        return self.started and self.update_thread is not None and self.update_thread.is_alive()
+
+    def read_latest(self, copy: bool = True, after_seq: int = 0, timeout: float = 0):
+        """
+        read the latest frame.
+
+        ps. with timeout, a consumer wakes once per captured frame instead of polling:
+            seq = 0
+            while True:
+                (seq, stamp, frame) = vs.read_latest(after_seq=seq, timeout=1.0)
+
+        Parameters
+        ----------
+        copy : bool
+            False to return the slot itself, only valid until ring_size - 1 newer frames are captured (then it's
+            overwritten in place), copy it before that
+        after_seq : int
+            wait for a frame newer than after_seq (when timeout is not 0)
+        timeout : float
+            0 to return at once, seconds to wait for a newer frame, None to wait until one is captured
+
+        Returns
+        -------
+        tuple : a tuple containing:
+            - seq (int): frame sequence number (from 1, increasing), 0 when no frame yet
+            - timestamp (float): capture time (time.perf_counter() when the frame is read)
+            - frame (np.ndarray): frame, None when no frame yet
+        """
+        with self.read_lock:
+            self._wait(after_seq, timeout)
+            if self.seq == 0 or (timeout != 0 and self.seq <= after_seq):
+                return 0, 0.0, None
+            return self._get(self.seq, copy)
+
+    def read_next(self, after_seq: int, copy: bool = True, timeout: float = 0):
+        """
+        read the first frame newer than after_seq, the oldest one in the ring when after_seq is overwritten.
+
+        Parameters
+        ----------
+        after_seq : int
+            seq of the frame read last time, 0 for the oldest frame in the ring
+        copy : bool
+            see read_latest
+        timeout : float
+            see read_latest
+
+        Returns
+        -------
+        tuple
+            (seq, timestamp, frame), see read_latest; (0, 0.0, None) when no newer frame
+        """
+        with self.read_lock:
+            self._wait(after_seq, timeout)
+            for seq in range(max(after_seq + 1, self.seq - self.ring_size + 1), self.seq + 1):
+                if self.seqs[seq % self.ring_size] == seq:
+                    return self._get(seq, copy)
+        return 0, 0.0, None
+
+    def read_window(self, n: int, copy: bool = True):
+        """
+        read the latest n frames (at most ring_size - 1 while capturing), oldest first.
+
+        Parameters
+        ----------
+        n : int
+            frame count
+        copy : bool
+            see read_latest
+
+        Returns
+        -------
+        list
+            [(seq, timestamp, frame)], see read_latest
+        """
+        with self.read_lock:
+            return [self._get(seq, copy) for seq in range(max(1, self.seq - n + 1), self.seq + 1)
+                    if self.seqs[seq % self.ring_size] == seq]
+
+    def subscribe(self, callback: Callable):
+        """
+        call callback(seq, timestamp, frame) on the capture thread for each captured frame.
+
+        ps. frame is the ring slot (no copy), keep the callback short and copy what must be kept.
+
+        Parameters
+        ----------
+        callback : Callable
+            callback(seq: int, timestamp: float, frame: np.ndarray)
+        """
+        with self.read_lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback: Callable):
+        with self.read_lock:
+            self.subscribers = [s for s in self.subscribers if s != callback]
+
     def stop(self):
         self.started = False
         if self.update_thread and self.update_thread.is_alive():
@@ -73,10 +293,16 @@ class vslib:
     # region [video]
     def _read(self):
         """
-        directly read for video case
+        directly read for video case, the frame is published to the ring like a captured one (see read)
         """
-        (self.grabbed, self.frame) = self.stream.read()
-        return self.frame
+        (grabbed, frame) = self.stream.read()
+        stamp = time.perf_counter()
+        with self.read_lock:
+            (self.grabbed, self.frame) = (grabbed, frame)
+            if grabbed and frame is not None:
+                self._publish(self.seq + 1, None, frame, stamp)
+            self.read_cond.notify_all()
+        return frame
 
     # endregion [video]
 
@@ -102,7 +328,7 @@ class vslib:
     @staticmethod
     def get_cam_list(scan_count: int = 10):
         """
-        get valid camera list
+        get valid camera list, cameras are opened concurrently
 
         Parameters
         ----------
@@ -115,27 +341,35 @@ class vslib:
             valid camera list
         """
 
-        cams = []
-        for index in range(scan_count):
+        def probe(index: int):
             cap = cv2.VideoCapture(index)
-            if cap and cap.isOpened():
+            try:
+                if not cap or not cap.isOpened():
+                    return False
                 if not cap.read()[0]:
                     vslib.slogger.warning(f'cam{index} read fail!!!')
-                cams.append(index)
+                return True
+            finally:
                 cap.release()
 
-        return cams
+        with ThreadPoolExecutor(vslib._probe_workers(scan_count)) as pool:
+            return [index for index, opened in zip(range(scan_count), pool.map(probe, range(scan_count))) if opened]
 
     @staticmethod
-    def get_cam_list_res(scan_count: int = 10):
+    def get_cam_list_res(scan_count: int = 10, use_cache: bool = True):
         """
         get valid camera list with supported resolutions
-        [NOTE] cap.set will spend long time...
+        [NOTE] cap.set will spend long time, so cameras are probed concurrently and the result of each camera
+        is cached in cam_cache_file by device identity (see device_id), only new cameras are probed next time.
+        A device that can't be opened (busy, or not a capture node) is probed again next time, and nothing is
+        cached when the identity isn't unique (not linux or windows, see device_id).
 
         Parameters
         ----------
         scan_count : int
             how many cameras to scan
+        use_cache : bool
+            False to probe all cameras again (and refresh the cache)
 
         Returns
         -------
@@ -143,52 +377,241 @@ class vslib:
             valid camera dict with resolutions
         """
 
-        cams = {}
-        for index in range(scan_count):
-            cap = cv2.VideoCapture(index)
-            if cap and cap.isOpened():
-                # don't read here to avoid cap.set fail!!!
-                # if not cap.read()[0]:
-                #     vslib.slogger.warning(f'cam{index} read fail!!!')
-
-                """
-                find default resolution
-                """
-                default_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                default_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                default_res = f'{default_w}x{default_h}'
-                vslib.slogger.info(f'cam{index} default_res: {default_res}')
-
-                """
-                prepare resolutions
-                """
-                resolutions = medialib.DICT_RESOLUTIONS.copy()
-
-                """
-                remove unsupported resolution
-                """
-                for res in medialib.DICT_RESOLUTIONS:
-                    (w, h) = (medialib.DICT_RESOLUTIONS[res]['w'], medialib.DICT_RESOLUTIONS[res]['h'])
-                    ret_w = cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
-                    ret_h = cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
-                    if not ret_w or not ret_h:
-                        # remove unsupported resolution
-                        resolutions.pop(res)
-                        continue
-
-                    w_get = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    h_get = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    if w != w_get or h != h_get:
-                        # remove unsupported resolution
-                        resolutions.pop(res)
-
-                if default_res in resolutions:
-                    resolutions[default_res]['default'] = True
-                cams[index] = resolutions
+        workers = vslib._probe_workers(scan_count)
+        with ThreadPoolExecutor(workers) as pool:
+            ids = list(pool.map(vslib.device_id, range(scan_count)))
+
+        cache = vslib.load_cam_cache() if use_cache else {}
+        results = {index: cache[ids[index]] for index in range(scan_count) if ids[index] in cache}
+        todo = [index for index in range(scan_count) if ids[index] is not None and index not in results]
+        if todo:
+            cached = 0
+            with ThreadPoolExecutor(min(workers, len(todo))) as pool:
+                for index, resolutions in zip(todo, pool.map(vslib._probe_res, todo)):
+                    results[index] = resolutions
+                    # only cameras, a busy device must not be cached as no camera
+                    if resolutions is not None and ids[index].startswith(vslib.CAM_CACHE_IDS):
+                        cache[ids[index]] = resolutions
+                        cached += 1
+            if cached:
+                vslib.save_cam_cache(cache)
+        vslib.slogger.info(f'{len(todo)} of {sum(i is not None for i in ids)} devices probed')
+
+        # deep copy, callers may modify it
+        return {index: {res: dict(v) for res, v in results[index].items()} for index in sorted(results)
+                if results[index] is not None}
+
+    @staticmethod
+    def _probe_workers(scan_count: int):
+        return max(1, min(scan_count, 8))
+
+    @staticmethod
+    def _probe_res(index: int):
+        """
+        probe supported resolutions of camera index, None when it can't be opened
+        """
+        cap = cv2.VideoCapture(index)
+        try:
+            if not cap or not cap.isOpened():
+                return None
+
+            # don't read here to avoid cap.set fail!!!
+            # if not cap.read()[0]:
+            #     vslib.slogger.warning(f'cam{index} read fail!!!')
+
+            """
+            find default resolution
+            """
+            default_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            default_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            default_res = f'{default_w}x{default_h}'
+            vslib.slogger.info(f'cam{index} default_res: {default_res}')
+
+            """
+            prepare resolutions (deep copy, 'default' is set below)
+            """
+            resolutions = {res: dict(v) for res, v in medialib.DICT_RESOLUTIONS.items()}
+
+            """
+            remove unsupported resolution
+            """
+            for res in medialib.DICT_RESOLUTIONS:
+                (w, h) = (medialib.DICT_RESOLUTIONS[res]['w'], medialib.DICT_RESOLUTIONS[res]['h'])
+                ret_w = cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+                ret_h = cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+                if not ret_w or not ret_h:
+                    # remove unsupported resolution
+                    resolutions.pop(res)
+                    continue
+
+                w_get = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                h_get = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                if w != w_get or h != h_get:
+                    # remove unsupported resolution
+                    resolutions.pop(res)
+
+            if default_res in resolutions:
+                resolutions[default_res]['default'] = True
+            return resolutions
+        finally:
+            cap.release()
 
+    @staticmethod
+    def device_id(index: int):
+        """
+        identity of camera index, to key the cached probe result.
+        linux: 'v4l2/...', name, bus path and node index of /dev/video{index} in sysfs, no need to open the
+               camera.
+        windows: 'msmf/...', friendly name and symbolic link (usb vid/pid and port) of the media foundation
+                 device, the index order of cv2's default backend (MSMF), no need to open the camera.
+        others: backend name, index and default resolution, the camera is opened. It's not unique (two cameras
+                with the same default resolution swapped between indexes get the same ids), so it isn't cached.
+
+        Returns
+        -------
+        str
+            device identity, None when no device
+        """
+        if os.path.isdir(vslib.V4L2_SYSFS):
+            sysfs = os.path.join(vslib.V4L2_SYSFS, f'video{index}')
+            if not os.path.isdir(sysfs):
+                return None
+            attrs = []
+            for attr in ('name', 'index'):
+                try:
+                    with open(os.path.join(sysfs, attr), 'r') as f:
+                        attrs.append(f.read().strip())
+                except IOError:
+                    attrs.append('')
+            return f'v4l2/{attrs[0]}/{os.path.realpath(os.path.join(sysfs, "device"))}/{attrs[1]}'
+
+        devices = vslib._msmf_devices()
+        if devices is not None:
+            return f'msmf/{devices[index][0]}/{devices[index][1]}' if index < len(devices) else None
+
+        cap = cv2.VideoCapture(index)
+        try:
+            if not cap or not cap.isOpened():
+                return None
+            (w, h) = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            return f'{cap.getBackendName()}/{index}/{w}x{h}'
+        finally:
             cap.release()
 
-        return cams
+    @staticmethod
+    def _msmf_devices():
+        """
+        media foundation video capture devices (ctypes, no extra package), in the index order of cv2 MSMF.
+
+        Returns
+        -------
+        list
+            [(friendly name, symbolic link)], None when not windows or failed
+        """
+        if sys.platform != 'win32':
+            return None
+
+        import ctypes
+        import uuid
+
+        def guid(value: str):
+            return (ctypes.c_ubyte * 16).from_buffer_copy(uuid.UUID(value).bytes_le)
+
+        def method(obj: ctypes.c_void_p, index: int, restype, *argtypes):
+            # COM call, the object starts with its vtable (function pointers)
+            vtable = ctypes.cast(obj, ctypes.POINTER(ctypes.POINTER(ctypes.c_void_p)))[0]
+            return ctypes.WINFUNCTYPE(restype, ctypes.c_void_p, *argtypes)(vtable[index])
+
+        def check(hr: int, name: str):
+            if hr < 0:
+                raise OSError(f'{name} fail, hr: {hr & 0xffffffff:#010x}')
+
+        (ole32, mfplat, mf) = (ctypes.windll.ole32, ctypes.windll.mfplat, ctypes.windll.mf)
+        p_guid = ctypes.POINTER(ctypes.c_ubyte * 16)
+        # COINIT_MULTITHREADED, it fails (and isn't undone) when the thread is already an STA (e.g. Qt)
+        com = ole32.CoInitializeEx(None, 0) >= 0
+        attrs = ctypes.c_void_p()
+        activates = ctypes.POINTER(ctypes.c_void_p)()
+        count = ctypes.c_uint32()
+        devices = None
+        try:
+            # MF_VERSION, MFSTARTUP_FULL
+            check(mfplat.MFStartup(0x00020070, 0), 'MFStartup')
+            try:
+                check(mfplat.MFCreateAttributes(ctypes.byref(attrs), 1), 'MFCreateAttributes')
+                # IMFAttributes::SetGUID
+                check(method(attrs, 24, ctypes.c_long, p_guid, p_guid)(
+                    attrs, ctypes.byref(guid(vslib.MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE)),
+                    ctypes.byref(guid(vslib.MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE_VIDCAP_GUID))), 'SetGUID')
+                check(mf.MFEnumDeviceSources(attrs, ctypes.byref(activates), ctypes.byref(count)),
+                      'MFEnumDeviceSources')
+
+                devices = []
+                for i in range(count.value):
+                    activate = ctypes.c_void_p(activates[i])
+                    strings = []
+                    for key in (vslib.MF_DEVSOURCE_ATTRIBUTE_FRIENDLY_NAME,
+                                vslib.MF_DEVSOURCE_ATTRIBUTE_SOURCE_TYPE_VIDCAP_SYMBOLIC_LINK):
+                        (value, length) = (ctypes.c_void_p(), ctypes.c_uint32())
+                        # IMFAttributes::GetAllocatedString
+                        hr = method(activate, 13, ctypes.c_long, p_guid, ctypes.POINTER(ctypes.c_void_p),
+                                    ctypes.POINTER(ctypes.c_uint32))(
+                            activate, ctypes.byref(guid(key)), ctypes.byref(value), ctypes.byref(length))
+                        strings.append(ctypes.wstring_at(value, length.value) if hr >= 0 else '')
+                        ole32.CoTaskMemFree(value)
+                    devices.append(tuple(strings))
+            finally:
+                # IUnknown::Release of every device and the attributes
+                for i in range(count.value):
+                    method(ctypes.c_void_p(activates[i]), 2, ctypes.c_ulong)(ctypes.c_void_p(activates[i]))
+                if activates:
+                    ole32.CoTaskMemFree(activates)
+                if attrs:
+                    method(attrs, 2, ctypes.c_ulong)(attrs)
+                mfplat.MFShutdown()
+        except (OSError, AttributeError, ValueError) as e:
+            vslib.slogger.error(f'{type(e).__name__}!!! {e}')
+            devices = None
+        finally:
+            if com:
+                ole32.CoUninitialize()
+
+        return devices
+
+    @staticmethod
+    def load_cam_cache():
+        """
+        load probe results from cam_cache_file, {device identity: resolutions}.
+        """
+        if not vslib.cam_cache_file or not os.path.isfile(vslib.cam_cache_file):
+            return {}
+        try:
+            with open(vslib.cam_cache_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == vslib.CAM_CACHE_VERSION and data.get('cv2') == cv2.__version__:
+                return data['devices']
+        except (IOError, ValueError, KeyError) as e:
+            vslib.slogger.error(f'{type(e).__name__}!!! {e}')
+        return {}
+
+    @staticmethod
+    def save_cam_cache(devices: dict):
+        """
+        save probe results to cam_cache_file (write temp file and rename).
+        """
+        if not vslib.cam_cache_file:
+            return False
+        try:
+            loglib.create_parent_folder(os.path.abspath(vslib.cam_cache_file))
+            tmp = f'{vslib.cam_cache_file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'version': vslib.CAM_CACHE_VERSION, 'cv2': cv2.__version__, 'devices': devices}, f,
+                          indent=1)
+            os.replace(tmp, vslib.cam_cache_file)
+        except IOError as e:
+            vslib.slogger.error(f'{type(e).__name__}!!! {e}')
+            return False
+        return True
     # endregion [function]
 
     # region [with]
@@ -214,12 +637,15 @@ def main():
             print(f'open source {vs.src} fail!!!')
         else:
             vs.start()
+            seq = 0
             while True:
-                # get frame (calculate time diff)
+                # wait for the next frame (calculate time diff), no duplicated frame is shown
                 time_start = datetime.datetime.now()
-                frame = vs.read()
+                (seq, _, frame) = vs.read_latest(after_seq=seq, timeout=1.0)
                 time_end = datetime.datetime.now()
-                print(f'vs.read() time: {(time_end - time_start).total_seconds() * 1000 : 0.3f} ms')
+                print(f'vs.read_latest() seq: {seq}, time: {(time_end - time_start).total_seconds() * 1000 : 0.3f} ms')
+                if frame is None:
+                    break
                 # display
                 cv2.imshow('webcam', frame)
                 # wait for ESC key
@@ -255,7 +681,7 @@ def main():
             print(f'delay: {delay} ms')
             print(f'video duration: {delay * fcnt} ms')
             while vs.grabbed:
-                # NOTE!!!set pos_frames will take around 70~140ms
+                # NOTE!!!set pos_frames will take around 70~140ms, see vreaderlib for random access
                 # set frame position
                 # vs.set(cv2.CAP_PROP_POS_FRAMES, i)
 
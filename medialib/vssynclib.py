@@ -0,0 +1,309 @@
+import time
+from collections import deque
+from threading import BrokenBarrierError, Barrier, Condition, Lock, Thread
+from typing import Callable, List, Union
+
+import numpy as np
+
+from loglib.loglib import loglib
+from medialib.vslib import vslib
+
+
+class vssynclib:
+    """
+    Synchronized capture of several sources (cameras or video files), one thread per source.
+
+    Each round all threads meet at a barrier and grab() together (grab only latches the frame, it's fast, so
+    the grab times are close), then retrieve() (decode) in parallel into preallocated slots. A frame set is
+    published when every source has retrieved its frame of the round, it carries the grab timestamp of each
+    source and the skew (max - min of the timestamps).
+
+    Usage:
+        with vssynclib([0, 1]) as sync:
+            sync.start()
+            seq = 0
+            while True:
+                fs = sync.read_set(after_seq=seq, timeout=1.0)
+                if fs is None:
+                    break
+                seq = fs['seq']
+        print(sync.stats())
+    """
+
+    slogger = loglib(__name__)
+
+    def __init__(self, srcs: List[Union[int, str]], width: int = 0, height: int = 0, ring_size: int = 4,
+                 barrier_timeout: float = 5.0):
+        """
+        Parameters
+        ----------
+        srcs : List[Union[int, str]]
+            camera indexes or video files
+        width : int
+            capture width, 0 for default
+        height : int
+            capture height, 0 for default
+        ring_size : int
+            frame set slots (at least 2), the latest ring_size - 1 sets can be read
+        barrier_timeout : float
+            seconds to wait for the other sources each round, capture ends when a source hangs; also the max
+            seconds stop() waits for the capture threads
+        """
+        self.srcs = list(srcs)
+        self.sources = [vslib(src, width, height) for src in self.srcs]
+        self.ring_size = max(2, ring_size)
+        self.barrier_timeout = barrier_timeout
+
+        n = len(self.sources)
+        self.lock = Lock()
+        self.cond = Condition(self.lock)
+        self.barrier = Barrier(n, action=self._next_round)
+        self.threads = []
+        self.started = False
+        self.subscribers = []
+
+        # slot [set index][source], allocated by the first retrieve of each source
+        self.slots = [[None] * n for _ in range(self.ring_size)]
+        self.stamps = [[0.0] * n for _ in range(self.ring_size)]
+        # seq of each set slot, 0 is empty (or being written)
+        self.set_seqs = [0] * self.ring_size
+        # retrieved frames of the round
+        self.retrieved = 0
+        # round being captured and its set index, latest published set and its set index
+        self.round = 0
+        self.index = 0
+        self.seq = 0
+        self.seq_index = 0
+
+        # stats
+        self.skews = deque(maxlen=1000)
+        self.sets = 0
+        self.dropped = 0
+
+    # region [capture]
+    def is_opened(self):
+        return all(vs.is_opened() for vs in self.sources)
+
+    def start(self):
+        if self.started:
+            vssynclib.slogger.warning('already started!!!')
+            return None
+        if any(thread.is_alive() for thread in self.threads):
+            vssynclib.slogger.error('capture threads of the last start are still running!!!')
+            return None
+        if self.threads:
+            # started again after stop, the barrier is aborted; rounds go on after the latest set, which stays
+            # readable
+            self.barrier = Barrier(len(self.sources), action=self._next_round)
+            with self.lock:
+                (self.round, self.index, self.retrieved) = (self.seq, self.seq_index, 0)
+                self.set_seqs = [self.seq if i == self.seq_index else 0 for i in range(self.ring_size)]
+        self.started = True
+        self.threads = [Thread(target=self._capture, args=(i,), name=f'vssynclib{i}', daemon=True)
+                        for i in range(len(self.sources))]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _next_round(self):
+        """
+        barrier action, run by one thread when all threads arrived.
+        """
+        with self.lock:
+            if self.round and self.set_seqs[self.index] != self.round:
+                # the previous round didn't complete (a source failed)
+                self.dropped += 1
+            self.round += 1
+            self.retrieved = 0
+            # next set index, never the latest published set (it stays readable while rounds fail)
+            self.index = (self.index + 1) % self.ring_size
+            if self.seq and self.index == self.seq_index:
+                self.index = (self.index + 1) % self.ring_size
+            self.set_seqs[self.index] = 0
+
+    def _capture(self, i: int):
+        stream = self.sources[i].stream
+        while self.started:
+            try:
+                self.barrier.wait(self.barrier_timeout)
+            except BrokenBarrierError:
+                break
+            if not self.started:
+                break
+
+            grabbed = stream.grab()
+            stamp = time.perf_counter()
+
+            (seq, index) = (self.round, self.index)
+            frame = None
+            if grabbed:
+                (grabbed, frame) = stream.retrieve(image=self.slots[index][i])
+
+            if not grabbed or frame is None:
+                if type(self.srcs[i]) != int:
+                    # end of video file, end all
+                    vssynclib.slogger.info(f'end of {self.srcs[i]}')
+                    self._end()
+                    break
+                vssynclib.slogger.warning(f'source {self.srcs[i]} read fail!!!')
+                continue
+
+            frames = None
+            with self.lock:
+                # retrieve() returns the slot itself when the size fits, or a new frame that becomes the slot
+                self.slots[index][i] = frame
+                self.stamps[index][i] = stamp
+                self.retrieved += 1
+                if self.retrieved == len(self.sources):
+                    frames = self._publish(seq, index)
+
+            if frames is not None:
+                for callback in list(self.subscribers):
+                    try:
+                        callback(frames)
+                    except Exception as e:
+                        vssynclib.slogger.error(f'{type(e).__name__}!!! {e}')
+
+        self.barrier.abort()
+
+    def _publish(self, seq: int, index: int):
+        """
+        publish frame set seq, call it with lock held.
+        """
+        stamps = self.stamps[index]
+        skew = max(stamps) - min(stamps)
+        self.skews.append(skew)
+        self.sets += 1
+        self.set_seqs[index] = seq
+        (self.seq, self.seq_index) = (seq, index)
+        self.cond.notify_all()
+        return self._get(index, False)
+
+    def _end(self):
+        self.started = False
+        self.barrier.abort()
+        with self.lock:
+            self.cond.notify_all()
+
+    def _get(self, index: int, copy: bool):
+        stamps = list(self.stamps[index])
+        frames = [frame.copy() if copy else frame for frame in self.slots[index]]
+        return {'seq': self.set_seqs[index], 'stamps': stamps, 'skew': max(stamps) - min(stamps), 'frames': frames}
+
+    def read_set(self, after_seq: int = 0, copy: bool = True, timeout: float = 0):
+        """
+        read the latest frame set.
+
+        Parameters
+        ----------
+        after_seq : int
+            wait for a set newer than after_seq (when timeout is not 0)
+        copy : bool
+            False to return the slots themselves, valid until ring_size - 1 newer rounds are captured (failed
+            rounds too), the slots of the latest set are never written
+        timeout : float
+            0 to return at once, seconds to wait for a newer set, None to wait until one is captured
+
+        Returns
+        -------
+        dict
+            seq (int), stamps (list of grab time of each source, time.perf_counter()), skew (float, seconds),
+            frames (list of np.ndarray); None when no (newer) set
+        """
+        with self.lock:
+            if timeout != 0 and self.seq <= after_seq:
+                self.cond.wait_for(lambda: self.seq > after_seq or not self.capturing(), timeout)
+            if self.seq == 0 or self.seq <= after_seq:
+                return None
+            if self.set_seqs[self.seq_index] != self.seq:
+                vssynclib.slogger.error(f'set {self.seq} is overwritten!!!')
+                return None
+            return self._get(self.seq_index, copy)
+
+    def capturing(self):
+        """
+        if capture threads are running.
+        """
+        return self.started and any(thread.is_alive() for thread in self.threads)
+
+    def subscribe(self, callback: Callable):
+        """
+        call callback(frame_set) on a capture thread for each frame set, frames are the slots (no copy).
+        """
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback: Callable):
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s != callback]
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            sets, dropped, skew_mean_ms, skew_p95_ms, skew_max_ms (of the latest 1000 sets)
+        """
+        with self.lock:
+            skews = np.array(self.skews) * 1000
+            (sets, dropped) = (self.sets, self.dropped)
+        if not len(skews):
+            return {'sets': sets, 'dropped': dropped, 'skew_mean_ms': 0.0, 'skew_p95_ms': 0.0, 'skew_max_ms': 0.0}
+        return {'sets': sets, 'dropped': dropped, 'skew_mean_ms': float(skews.mean()),
+                'skew_p95_ms': float(np.percentile(skews, 95)), 'skew_max_ms': float(skews.max())}
+
+    def stop(self):
+        self.started = False
+        self.barrier.abort()
+        # a thread hung in grab() is left behind (daemon), it ends when grab() returns
+        deadline = time.perf_counter() + self.barrier_timeout
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join(max(0.0, deadline - time.perf_counter()))
+            if thread.is_alive():
+                vssynclib.slogger.warning(f'{thread.name} is still running!!!')
+        with self.lock:
+            self.cond.notify_all()
+
+    def release(self):
+        # stop before release
+        self.stop()
+        for vs in self.sources:
+            vs.release()
+
+    # endregion [capture]
+
+    # region [with]
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+    # endregion [with]
+
+
+def main():
+    """
+    For console test, headless: python -m medialib.vssynclib 0 1 (camera indexes or video files)
+    """
+    import sys
+
+    srcs = [int(src) if src.isdigit() else src for src in sys.argv[1:]] or [0]
+    with vssynclib(srcs) as sync:
+        if not sync.is_opened():
+            print(f'open sources {srcs} fail!!!')
+            return
+        sync.start()
+        seq = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 10:
+            frame_set = sync.read_set(after_seq=seq, timeout=1.0)
+            if frame_set is None:
+                break
+            seq = frame_set['seq']
+            print(f'set {seq}: skew {frame_set["skew"] * 1000:.3f} ms')
+        print(sync.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# static geomlib backend choice, never calibrate (and write the calibration in HOME) from tests, also for the
+# workers of process pools
+os.environ['PYMISC2_GEOMLIB_CALIBRATE'] = '0'
@@ -0,0 +1,34 @@
+import os
+
+from medialib.benchlib import benchlib
+
+
+class Test_benchlib:
+    result_file = 'test_benchlib.json'
+
+    def test_run(self):
+        result = benchlib.run(['320x240'], 'rgb8882rgb565$|cv2crop', number=1, repeat=1)
+        cases = result['results']['320x240']
+        assert set(cases) == {'rgb8882rgb565', 'cv2crop_center'}
+        for r in cases.values():
+            assert set(r) == {'ms', 'ns_pixel', 'mbps', 'peak_bytes'}
+        # crop is a view
+        assert cases['cv2crop_center']['peak_bytes'] < 4096
+        # 320x240 rgb565 output
+        assert cases['rgb8882rgb565']['peak_bytes'] >= 320 * 240 * 2
+
+        benchlib.save(result, Test_benchlib.result_file)
+        base = benchlib.load(Test_benchlib.result_file)
+        assert base['results'] == result['results']
+        os.remove(Test_benchlib.result_file)
+
+    def test_compare(self):
+        base = {'results': {'320x240': {'a': {'ms': 1.0, 'peak_bytes': 0}, 'b': {'ms': 1.0, 'peak_bytes': 100000}}}}
+        new = {'results': {'320x240': {'a': {'ms': 1.05, 'peak_bytes': 1000}, 'b': {'ms': 2.0, 'peak_bytes': 200000},
+                                       'c': {'ms': 9.0, 'peak_bytes': 0}}}}
+        regressions = benchlib.compare(base, new)
+        assert [(case, metric) for _, case, metric, *_ in regressions] == [('b', 'ms'), ('b', 'peak_bytes')]
+
+        # a result of an older version without peak_bytes
+        old = {'results': {'320x240': {'b': {'ms': 1.0, 'alloc': 100000}}}}
+        assert [metric for _, _, metric, *_ in benchlib.compare(old, new)] == ['ms']
@@ -35,3 +35,135 @@ class Test_filelib:
         import os
         if os.path.exists(Test_filelib.test_file):
             os.remove(Test_filelib.test_file)
+
+    def test_file_read_binary_modes(self):
+        import os
+        import numpy as np
+
+        data = bytes(range(256)) * 4
+        filelib.file_write_binary(data, Test_filelib.test_file)
+
+        # range read
+        assert filelib.file_read_binary(Test_filelib.test_file, 10, 5) == data[10:15]
+        assert filelib.file_read_binary(Test_filelib.test_file, 1000) == data[1000:]
+
+        # mmap, zero-copy view
+        view = filelib.file_read_binary(Test_filelib.test_file, use_mmap=True)
+        assert type(view) is memoryview and view == data
+        view = filelib.file_read_binary(Test_filelib.test_file, 256, 16, use_mmap=True)
+        assert np.array_equal(np.frombuffer(view, dtype=np.uint8), np.arange(16))
+        del view
+
+        # readinto caller buffer
+        out = np.zeros((4, 8), dtype=np.uint8)
+        filled = filelib.file_read_binary(Test_filelib.test_file, 512, out=out)
+        assert filled.nbytes == 32 and np.array_equal(out.ravel(), np.arange(32))
+        out = bytearray(16)
+        filled = filelib.file_read_binary(Test_filelib.test_file, len(data) - 4, out=out)
+        assert filled == data[-4:] and out[:4] == data[-4:]
+
+        # empty file
+        open(Test_filelib.test_file, 'wb').close()
+        assert filelib.file_read_binary(Test_filelib.test_file, use_mmap=True) == b''
+
+        os.remove(Test_filelib.test_file)
+
+    def test_file_write_stream(self):
+        import os
+        import numpy as np
+        from filelib.filelib import FSYNC
+
+        chunks = [b'abc', bytearray(b'def'), memoryview(b'ghi'), np.arange(4, dtype=np.uint16)]
+        expected = b'abcdefghi' + np.arange(4, dtype=np.uint16).tobytes()
+
+        for fsync in FSYNC:
+            (written, bps) = filelib.file_write_stream(iter(chunks), Test_filelib.test_file, fsync=fsync)
+            assert written == len(expected) and bps > 0
+            assert filelib.file_read_binary(Test_filelib.test_file) == expected
+
+        # failed write keeps the old file and leaves no temp file
+        (written, _) = filelib.file_write_stream([b'new', None], Test_filelib.test_file)
+        assert written == -1
+        assert filelib.file_read_binary(Test_filelib.test_file) == expected
+        assert [f for f in os.listdir('.') if f.startswith(Test_filelib.test_file + '.')] == []
+
+        def broken():
+            yield b'new'
+            raise RuntimeError('broken generator')
+
+        (written, _) = filelib.file_write_stream(broken(), Test_filelib.test_file)
+        assert written == -1
+        assert filelib.file_read_binary(Test_filelib.test_file) == expected
+        assert [f for f in os.listdir('.') if f.startswith(Test_filelib.test_file + '.')] == []
+
+        # symlink and mode are kept
+        link = Test_filelib.test_file + '_link'
+        os.chmod(Test_filelib.test_file, 0o600)
+        os.symlink(Test_filelib.test_file, link)
+        try:
+            assert filelib.file_write_stream([b'linked'], link)[0] == 6
+            assert os.path.islink(link) and filelib.file_read_binary(Test_filelib.test_file) == b'linked'
+            assert os.stat(Test_filelib.test_file).st_mode & 0o777 == 0o600
+        finally:
+            os.remove(link)
+
+        # not atomic writes in place
+        (written, _) = filelib.file_write_stream((bytes([k]) * 2 for k in range(3)), Test_filelib.test_file,
+                                                 atomic=False)
+        assert written == 6
+        assert filelib.file_read_binary(Test_filelib.test_file) == b'\0\0\1\1\2\2'
+
+        os.remove(Test_filelib.test_file)
+
+    def test_get_format(self):
+        import os
+        import shutil
+        from filelib.filelib import FILE_FMT
+
+        folder = 'test_filelib_format'
+        os.makedirs(folder, exist_ok=True)
+        files = {'a.jpg': (b'', FILE_FMT.IMAGE), 'b.MP4': (b'', FILE_FMT.VIDEO), 'c.json': (b'', FILE_FMT.JSON),
+                 'd.bin': (b'', FILE_FMT.BIN), 'e.txt': (b'hello', FILE_FMT.UNKNOWN),
+                 'f': (b'hello', FILE_FMT.UNKNOWN),  # mimetypes returns None
+                 'png': (b'\x89PNG\r\n\x1a\n0000', FILE_FMT.IMAGE), 'mp4.dat': (b'0000ftypisom', FILE_FMT.VIDEO),
+                 'g.cfg': (b' {"a": 1}', FILE_FMT.JSON), 'h.xyz': (b'\x01\x00\x02', FILE_FMT.BIN)}
+        for name, (data, fmt) in files.items():
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(data)
+            assert filelib.get_format(os.path.join(folder, name)) == fmt, name
+        assert filelib.get_format(folder) == FILE_FMT.FOLDER
+        assert filelib.get_format(os.path.join(folder, 'png'), sniff=False) == FILE_FMT.UNKNOWN
+
+        shutil.rmtree(folder)
+
+    def test_scan(self):
+        import os
+        import shutil
+        from filelib.filelib import FILE_FMT
+
+        folder = 'test_filelib_scan'
+        expected = {}
+        for k in range(3):
+            sub = os.path.join(folder, f'sub{k}', 'deep')
+            os.makedirs(sub, exist_ok=True)
+            expected[os.path.join(folder, f'sub{k}')] = (FILE_FMT.FOLDER, 0)
+            expected[sub] = (FILE_FMT.FOLDER, 0)
+            for name, data in (('a.png', b'123'), ('b.avi', b'12345'), ('c', b'\0' * k)):
+                file = os.path.join(sub, name)
+                with open(file, 'wb') as f:
+                    f.write(data)
+                expected[file] = (filelib.get_format(file), len(data))
+        with open(os.path.join(folder, 'top.json'), 'wb') as f:
+            f.write(b'{}')
+        expected[os.path.join(folder, 'top.json')] = (FILE_FMT.JSON, 2)
+
+        for workers in (0, 4):
+            records = list(filelib.scan(folder, workers=workers))
+            assert {path: (fmt, size) for path, fmt, size, mtime in records} == expected
+            assert all(mtime > 0 for *_, mtime in records)
+
+        records = list(filelib.scan(folder, recursive=False))
+        assert len(records) == 4
+
+        assert list(filelib.scan('not_exist')) == []
+        shutil.rmtree(folder)
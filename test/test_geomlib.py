@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+
+from medialib.geomlib import geomlib
+
+
+class Test_geomlib:
+    calibration_file = 'test_geomlib.json'
+    image = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+
+    def setup_method(self):
+        # never read or write the calibration in HOME
+        (self.calibration_file, geomlib.calibration_file) = (geomlib.calibration_file, Test_geomlib.calibration_file)
+        (self.auto_calibrate, geomlib.auto_calibrate) = (geomlib.auto_calibrate, False)
+        geomlib.table = None
+
+    def teardown_method(self):
+        geomlib.calibration_file = self.calibration_file
+        geomlib.auto_calibrate = self.auto_calibrate
+        geomlib.table = None
+        if os.path.isfile(Test_geomlib.calibration_file):
+            os.remove(Test_geomlib.calibration_file)
+
+    def test_calibrate(self):
+        # opted out -> static choice
+        assert geomlib.get_table() == {} and not os.path.isfile(Test_geomlib.calibration_file)
+        assert geomlib.backend('resize', Test_geomlib.image) == 'cv2'
+        assert geomlib.backend('crop', Test_geomlib.image) == 'numpy'
+
+        # calibrated and saved at the first use
+        (geomlib.auto_calibrate, geomlib.table) = (True, None)
+        table = geomlib.get_table()
+        assert os.path.isfile(Test_geomlib.calibration_file) and geomlib.get_table() is table
+        assert set(table.values()) <= {'cv2', 'pil', 'numpy'}
+        assert table[geomlib.key('resize', Test_geomlib.image, 'area')] in ('cv2', 'pil')
+        assert geomlib.key('rotate', np.zeros((1080, 1920), np.float32), 'nearest') == 'rotate/nearest/float32/1/large'
+        assert geomlib.key('crop', Test_geomlib.image) in table
+
+        # loaded from file next time, calibrated again when out of date
+        geomlib.table = None
+        assert geomlib.get_table() == table
+        with open(Test_geomlib.calibration_file, 'w') as f:
+            f.write('{}')
+        geomlib.table = None
+        table = geomlib.get_table()
+        assert table.keys() == geomlib.calibrate(number=1).keys() and geomlib.load() == table
+
+        # calibrate(save=True) is used from now on
+        table = geomlib.calibrate(save=True)
+        assert geomlib.get_table() is table
+
+        # only the default filter is calibrated, static choice for the others
+        for key in table:
+            if key.startswith('resize/'):
+                table[key] = 'pil'
+        assert geomlib.backend('resize', Test_geomlib.image, 'area') == 'pil'
+        assert geomlib.backend('resize', Test_geomlib.image, 'lanczos') == 'cv2'
+
+    def test_resize(self):
+        for backend in ('cv2', 'pil'):
+            assert geomlib.resize(Test_geomlib.image, 40, 0, backend=backend).shape == (30, 40, 3)
+            assert geomlib.resize(Test_geomlib.image, 0, 15, backend=backend).shape == (15, 20, 3)
+            # writable whatever the backend
+            assert geomlib.resize(Test_geomlib.image, 40, 30, backend=backend).flags.writeable
+        assert geomlib.resize(Test_geomlib.image) is Test_geomlib.image
+        # area/box of 2x2 blocks are the same
+        (a, b) = (geomlib.resize(Test_geomlib.image, 40, 30, backend=backend) for backend in ('cv2', 'pil'))
+        assert np.abs(a.astype(int) - b).max() <= 1
+
+    def test_crop(self):
+        view = geomlib.crop(Test_geomlib.image, 10, 5, 20, 30)
+        assert view.shape == (30, 20, 3) and np.shares_memory(view, Test_geomlib.image)
+        for backend in ('numpy', 'pil'):
+            crop = geomlib.crop(Test_geomlib.image, 10, 5, 20, 30, copy=True, backend=backend)
+            assert np.array_equal(crop, view) and not np.shares_memory(crop, Test_geomlib.image)
+            assert crop.flags.writeable
+        # clipped to the image
+        assert geomlib.crop(Test_geomlib.image, 70, 50, 20, 20).shape == (10, 10, 3)
+        assert geomlib.crop(Test_geomlib.image, 70).shape == (60, 10, 3)
+
+    def test_rotate(self):
+        for image in (Test_geomlib.image, Test_geomlib.image[..., 0].copy()):
+            for angle in (0, 90, 180, 270, -90, 30, 12.5):
+                for expand in (True, False):
+                    a = geomlib.rotate(image, angle, expand, backend='cv2')
+                    b = geomlib.rotate(image, angle, expand, backend='pil')
+                    assert a.shape == b.shape
+                    # same sampling as PIL, a few pixels off by fixed point rounding
+                    assert (a != b).mean() < (0.01 if angle % 90 else 1e-9)
+                    assert b.flags.writeable
+        # no such PIL rotate filter, done by cv2
+        for inter in ('area', 'lanczos'):
+            assert np.array_equal(geomlib.rotate(Test_geomlib.image, 30, inter=inter, backend='pil'),
+                                  geomlib.rotate(Test_geomlib.image, 30, inter=inter, backend='cv2'))
+
+    def test_rotate_right_angle(self):
+        image = Test_geomlib.image
+        for k in range(4):
+            rotated = geomlib.rotate(image, 90 * k)
+            assert np.array_equal(rotated, np.rot90(image, k)) and rotated.flags.c_contiguous
+            view = geomlib.rotate(image, 90 * k - 360, copy=False)
+            assert np.shares_memory(view, image) and np.array_equal(view, rotated)
+        # 90 without expand keeps the size of a non-square image (not a transpose)
+        assert geomlib.right_angle(80, 60, 90, expand=False) is None
+        assert geomlib.right_angle(60, 60, 90, expand=False) == 1
+        assert geomlib.rotate(image, 90, expand=False).shape == image.shape
+
+        from medialib.imagelib import imagelib
+        assert np.array_equal(imagelib.pilrotate(image, 270), np.rot90(image, 3))
+
+    def test_rotate_batch(self):
+        frames = np.random.default_rng(1).integers(0, 256, (5, 60, 80, 4), dtype=np.uint8)
+        for angle in (90, 180, 30, 0):
+            rotated = geomlib.rotate_batch(frames, angle)
+            assert np.array_equal(rotated, np.stack([geomlib.rotate(frame, angle) for frame in frames]))
+        out = np.empty((5, 80, 60, 4), dtype=np.uint8)
+        assert geomlib.rotate_batch(list(frames), 270, out=out) is out
+        assert np.array_equal(out, np.rot90(frames, 3, axes=(1, 2)))
+        assert np.shares_memory(geomlib.rotate_batch(frames, 90, copy=False), frames)
+        # wrong out
+        assert geomlib.rotate_batch(frames, 90, out=out[:, :, :30]) is None
+        # matrix is cached
+        assert geomlib.rotate_matrix(80, 60, 30, True) is geomlib.rotate_matrix(80, 60, 30, True)
@@ -0,0 +1,325 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from medialib.imagelib import imagelib
+
+
+class Test_imagelib:
+    # every rgb565 value once, little-endian (256x256)
+    rgb565 = np.arange(0x10000, dtype='<u2').tobytes()
+
+    def test_rgb5652rgb888(self):
+        v = np.arange(0x10000).reshape(256, 256)
+        r5, g6, b5 = (v >> 11) & 0x1f, (v >> 5) & 0x3f, v & 0x1f
+
+        rgb888 = imagelib.rgb5652rgb888(Test_imagelib.rgb565, 256, 256)
+        assert rgb888.shape == (256, 256, 3)
+        assert rgb888.dtype == np.uint8
+        assert (rgb888[..., 0] == r5 << 3).all()
+        assert (rgb888[..., 1] == g6 << 2).all()
+        assert (rgb888[..., 2] == b5 << 3).all()
+
+        rgb888 = imagelib.rgb5652rgb888(Test_imagelib.rgb565, 256, 256, replicate=True)
+        assert (rgb888[..., 0] == (r5 << 3 | r5 >> 2)).all()
+        assert (rgb888[..., 1] == (g6 << 2 | g6 >> 4)).all()
+        assert (rgb888[..., 2] == (b5 << 3 | b5 >> 2)).all()
+
+        # wrong size
+        assert imagelib.rgb5652rgb888(Test_imagelib.rgb565, 255, 256) is None
+
+    def test_batch(self):
+        rng = np.random.default_rng(0)
+        frames = rng.integers(0, 256, (5, 6, 8, 3), dtype=np.uint8)
+
+        for single, batch in ((imagelib.rgb8882rgba, imagelib.rgb8882rgba_batch),
+                              (imagelib.rgb8882yuv422, imagelib.rgb8882yuv422_batch),
+                              (imagelib.rgb8882ycrcb444, imagelib.rgb8882ycrcb444_batch)):
+            stack = batch(frames)
+            for i, frame in enumerate(frames):
+                assert (stack[i] == single(frame)).all()
+
+        stack = imagelib.rgb8882rgb565_batch(frames)
+        assert stack.shape == (5, 6, 8, 2)
+        for i, frame in enumerate(frames):
+            assert stack[i].tobytes() == imagelib.rgb8882rgb565(frame)
+
+        # list of buffers
+        rgb888 = imagelib.rgb5652rgb888_batch([frame.tobytes() for frame in stack], 8, 6)
+        assert rgb888.shape == (5, 6, 8, 3)
+        for i, frame in enumerate(stack):
+            assert (rgb888[i] == imagelib.rgb5652rgb888(frame.tobytes(), 8, 6)).all()
+
+        # list of ndarrays, sizes from the first one
+        assert (imagelib.stack_frames(list(frames)) == frames).all()
+        assert imagelib.stack_frames([frames[0, ..., 0]] * 2).shape == (2, 6, 8, 1)
+        assert (imagelib.rgb8882rgba_batch(list(frames)) == imagelib.rgb8882rgba_batch(frames)).all()
+
+        # size mismatch
+        assert imagelib.rgba2rgb888_batch([b'\0' * 4, b'\0' * 8], 1, 1) is None
+
+    def test_out(self):
+        rng = np.random.default_rng(1)
+        rgb888 = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+
+        # ndarray out
+        out = np.empty((6, 8, 4), dtype=np.uint8)
+        rgba = imagelib.rgb8882rgba(rgb888, out=out)
+        assert rgba is out
+        assert (rgba[..., :3] == rgb888).all() and (rgba[..., 3] == 0xff).all()
+
+        # bytearray out
+        out = bytearray(6 * 8 * 2)
+        rgb565 = imagelib.rgb8882rgb565(rgb888, out=out)
+        assert rgb565.shape == (6, 8, 2)
+        assert bytes(out) == imagelib.rgb8882rgb565(rgb888)
+
+        out = bytearray(6 * 8 * 3)
+        imagelib.buf2rgb888(bytes(out[:6 * 8 * 2]), 8, 6, 2, out=out)
+        imagelib.rgb5652rgb888(imagelib.rgb8882rgb565(rgb888), 8, 6, out=out)
+        assert bytes(out) == imagelib.buf2rgb888(imagelib.rgb8882rgb565(rgb888), 8, 6, 2).tobytes()
+
+        out = np.empty((6, 8, 2), dtype=np.uint8)
+        for channel, buf in ((1, rgb888[..., 0].tobytes()), (3, rgb888.tobytes()), (4, rgba.tobytes())):
+            assert imagelib.buf2rgb565(buf, 8, 6, channel, out=out) is out
+            assert (out == imagelib.buf2rgb565(buf, 8, 6, channel)).all()
+
+        out = np.empty((6, 8, 2), dtype=np.uint8)
+        assert (imagelib.rgb8882yuv422(rgb888, out=out) == imagelib.rgb8882yuv422(rgb888)).all()
+
+        # wrong size / read-only / not contiguous
+        assert imagelib.rgba2rgb888(rgba.tobytes(), 8, 6, out=bytearray(10)) is None
+        assert imagelib.rgba2rgb888(rgba.tobytes(), 8, 6, out=bytes(6 * 8 * 3)) is None
+        assert imagelib.rgba2rgb888(rgba.tobytes(), 8, 6, out=np.empty((6, 16, 3), np.uint8)[:, ::2]) is None
+        with pytest.raises(ValueError):
+            imagelib.rgb8882rgb565(rgb888, out=np.empty((6, 8, 4), np.uint8)[..., :2])
+
+        # other integer dtypes (cv2 takes uint8 only)
+        for dtype in (np.uint16, np.int32):
+            assert imagelib.rgb8882rgb565(rgb888.astype(dtype)) == imagelib.rgb8882rgb565(rgb888)
+            assert imagelib.bgr8882rgb565(rgb888.astype(dtype)) == imagelib.bgr8882rgb565(rgb888)
+
+    def test_im2rgb888_reducing_gap(self):
+        test_file = 'test_imagelib.jpg'
+        y, x = np.mgrid[0:960, 0:1280]
+        image = np.dstack(((x // 5) % 256, (y // 3) % 256, ((x + y) // 7) % 256)).astype(np.uint8)
+        Image.fromarray(image).save(test_file)
+
+        w, h, c, image_info, buf = imagelib.im2rgb888(test_file, 160, 120)
+        rgb888 = np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3)
+        for reducing_gap in (1.0, 2.0):
+            w, h, c, image_info, buf = imagelib.im2rgb888(test_file, 160, 120, reducing_gap)
+            assert (w, h, c) == (160, 120, 3)
+            assert image_info['size'] == (1280, 960)
+            reduced = np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3)
+            assert np.abs(reduced.astype(int) - rgb888).mean() < 4
+
+        # less than 1.0 is used as 1.0 (PIL rejects it)
+        assert imagelib.im2rgb888(test_file, 160, 120, 0.5)[4] == imagelib.im2rgb888(test_file, 160, 120, 1.0)[4]
+        assert imagelib.im2rgb565(test_file, 160, 120, 0.5)[:2] == (160, 120)
+
+        if os.path.exists(test_file):
+            os.remove(test_file)
+
+    def test_yuv_pack(self):
+        rng = np.random.default_rng(2)
+        rgb888 = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        yuv444 = imagelib.rgb8882yuv444(rgb888)
+        (y, u, v) = (yuv444[..., 0], yuv444[..., 1], yuv444[..., 2])
+
+        yuyv = imagelib.rgb8882yuv422(rgb888).reshape(6, 4, 4)
+        assert (yuyv[..., 0] == y[:, ::2]).all() and (yuyv[..., 2] == y[:, 1::2]).all()
+        assert (yuyv[..., 1] == u[:, ::2]).all() and (yuyv[..., 3] == v[:, ::2]).all()
+
+        uyvy = imagelib.rgb8882uyvy(rgb888, avg_chroma=True).reshape(6, 4, 4)
+        assert (uyvy[..., 1] == y[:, ::2]).all() and (uyvy[..., 3] == y[:, 1::2]).all()
+        u_avg = (u[:, ::2].astype(int) + u[:, 1::2]) / 2
+        assert np.abs(uyvy[..., 0] - u_avg).max() <= 1
+
+        nv12 = imagelib.rgb8882nv12(rgb888)
+        assert nv12.shape == (9, 8)
+        assert (nv12[:6] == y).all()
+        assert (nv12[6:, 0::2] == u[::2, ::2]).all() and (nv12[6:, 1::2] == v[::2, ::2]).all()
+
+        nv21 = imagelib.rgb8882nv21(rgb888, out=bytearray(9 * 8))
+        assert (nv21[6:, 0::2] == v[::2, ::2]).all() and (nv21[6:, 1::2] == u[::2, ::2]).all()
+
+        i420 = imagelib.rgb8882i420(rgb888, avg_chroma=True).reshape(-1)
+        u_avg = u.reshape(3, 2, 4, 2).mean(axis=(1, 3))
+        assert np.abs(i420[48:60].reshape(3, 4) - u_avg).max() <= 1
+
+    def test_convert(self):
+        rng = np.random.default_rng(3)
+        rgb888 = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        rgb565 = imagelib.rgb8882rgb565(rgb888)
+
+        # 565 -> rgba in one pass
+        rgba = imagelib.convert(rgb565, 'rgb565', 'rgba', 8, 6)
+        assert (rgba[..., :3] == imagelib.rgb5652rgb888(rgb565, 8, 6)).all() and (rgba[..., 3] == 0xff).all()
+        assert (imagelib.buf2rgba(rgb565, 8, 6, 2) == rgba).all()
+
+        # rgba -> 565
+        assert imagelib.convert(rgba, 'rgba', 'rgb565', 8, 6).tobytes() == rgb565
+        assert imagelib.buf2rgb565(rgba.tobytes(), 8, 6, 4).tobytes() == rgb565
+
+        # l8 -> rgb888
+        gray = imagelib.convert(rgb888[..., 1].tobytes(), 'l8', 'rgb888', 8, 6)
+        assert (gray == rgb888[..., 1:2]).all()
+
+        # bgr888 -> yuyv
+        yuyv = imagelib.convert(rgb888[..., ::-1].copy(), 'bgr888', 'yuyv', 8, 6)
+        assert (yuyv == imagelib.rgb8882yuv422(rgb888)).all()
+
+        # unsupported
+        assert imagelib.convert(yuyv, 'yuyv', 'rgb888', 8, 6) is None
+        assert imagelib.buf2rgb888(rgb565, 8, 6, 5) is None
+
+    def test_rgb565_lut(self):
+        from medialib.lutlib import lutlib
+
+        # replicate=True of rgb5652rgb888 is the lookup table path, compare with the shift path
+        for replicate in (False, True):
+            u16 = np.frombuffer(Test_imagelib.rgb565, dtype='<u2').reshape(256, 256)
+            rgb888 = np.empty((256, 256, 3), dtype=np.uint8)
+            imagelib._rgb565_decode(u16, rgb888[..., 0], rgb888[..., 1], rgb888[..., 2], replicate)
+            assert (lutlib.decode(Test_imagelib.rgb565, 256, 256, replicate) == rgb888).all()
+
+        rng = np.random.default_rng(4)
+        rgb888 = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        assert lutlib.encode(rgb888).tobytes() == imagelib.rgb8882rgb565(rgb888)
+
+        # dither keeps the local mean of a gradient
+        gradient = np.tile(np.arange(256, dtype=np.uint8)[None, :, None], (16, 1, 3))
+        dither = imagelib.rgb8882rgb565(gradient, dither=True)
+        rgb888 = imagelib.rgb5652rgb888(dither, 256, 16, replicate=True).astype(float)
+        mean = rgb888.reshape(4, 4, 64, 4, 3).mean(axis=(1, 3))
+        assert np.abs(mean - gradient.reshape(4, 4, 64, 4, 3).mean(axis=(1, 3))).mean() < 1
+        assert imagelib.bgr8882rgb565(gradient[..., ::-1], dither=True) == dither
+        # encode fail (not an image)
+        assert imagelib.rgb8882rgb565(np.zeros(4, np.uint8), dither=True) is None
+
+    def test_im2file_tiled(self):
+        test_file = 'test_imagelib.raw'
+        rgb888 = np.random.default_rng(5).integers(0, 256, (37, 16, 3), dtype=np.uint8)
+
+        for dst_fmt in ('rgb565', 'rgba', 'yuyv'):
+            assert imagelib.im2file_tiled(rgb888, test_file, dst_fmt, band_height=8) == (16, 37)
+            with open(test_file, 'rb') as f:
+                assert f.read() == imagelib.convert(rgb888, 'rgb888', dst_fmt, 16, 37).tobytes()
+
+        # planar format can't be written in bands
+        assert imagelib.im2file_tiled(rgb888, test_file, 'i420') == (0, 0)
+
+        # a failed band keeps the old file, no temp file is left
+        broken = np.ascontiguousarray(np.concatenate((rgb888, rgb888)).astype(np.float64))
+        assert imagelib.im2file_tiled(broken, test_file, 'yuyv', band_height=8) == (0, 0)
+        with open(test_file, 'rb') as f:
+            assert f.read() == imagelib.convert(rgb888, 'rgb888', 'yuyv', 16, 37).tobytes()
+        assert [f for f in os.listdir('.') if f.startswith(test_file + '.')] == []
+
+        if os.path.exists(test_file):
+            os.remove(test_file)
+
+    def test_cache(self):
+        file = 'test_imagelib_cache.png'
+        rgb = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+        Image.fromarray(rgb).save(file)
+
+        try:
+            cache = imagelib.set_cache(3 * rgb.nbytes)
+
+            for k in range(2):
+                buf = imagelib.cv2imread(file)
+                assert np.array_equal(buf, rgb) and not buf.flags.writeable
+                pilimage = imagelib.pilopen(file)
+                assert pilimage.format == 'PNG' and np.array_equal(np.asarray(pilimage), rgb)
+                # a copy, changing it doesn't change the cached one
+                pilimage.paste((0, 0, 0), (0, 0, 80, 60))
+            assert cache.stats() == {'hits': 2, 'misses': 2, 'evictions': 0, 'entries': 2, 'bytes': 2 * rgb.nbytes}
+            (width, height, _, image_info, _) = imagelib.im2rgb888(file)
+            assert (width, height, image_info['format']) == (80, 60, 'PNG')
+
+            # lazy (drafted or header only) skips the cache
+            stats = cache.stats()
+            assert imagelib.pilopen(file, lazy=True).size == (80, 60)
+            imagelib.getiminfo(file)
+            imagelib.im2rgb888(file, 40, 30, reducing_gap=2.0)
+            assert cache.stats() == stats
+
+            # other args are other entries, the least recently used one is evicted
+            imagelib.cv2imread(file, cvt_rgb=False)
+            imagelib.cv2imread(file, reduce=2)
+            assert cache.evictions == 1 and cache.bytes <= cache.max_bytes
+
+            # file changed -> miss
+            Image.fromarray(rgb[::-1].copy()).save(file)
+            os.utime(file, ns=(0, 1))
+            assert np.array_equal(imagelib.cv2imread(file), rgb[::-1])
+            assert cache.misses == 5
+
+            assert imagelib.set_cache(0) is None
+            assert imagelib.cv2imread(file).flags.writeable
+        finally:
+            imagelib.set_cache(0)
+            os.remove(file)
+
+    def test_folder_crop_resize(self):
+        folder = 'test_imagelib_folder'
+        convert = os.path.join(folder, 'convert')
+        rng = np.random.default_rng(0)
+        os.makedirs(folder, exist_ok=True)
+        for name in ('b.png', 'c.png'):
+            Image.fromarray(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)).save(os.path.join(folder, name))
+
+        def outputs():
+            return sorted(name for name in os.listdir(convert) if name.endswith('.raw'))
+
+        try:
+            stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped'], stats['failed']) == (2, 0, 0)
+            assert outputs() == ['t_16x16_001.raw', 't_16x16_002.raw']
+            c_raw = open(os.path.join(convert, 't_16x16_002.raw'), 'rb').read()
+
+            # unchanged -> skipped
+            stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped']) == (0, 2)
+
+            # a new source sorted first doesn't shift the names of the others, a broken one is counted as failed
+            Image.fromarray(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)).save(os.path.join(folder, 'a.png'))
+            with open(os.path.join(folder, 'bad.png'), 'w') as f:
+                f.write('not an image')
+            stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped'], stats['failed']) == (1, 2, 1)
+            assert outputs() == ['t_16x16_001.raw', 't_16x16_002.raw', 't_16x16_003.raw']
+            assert open(os.path.join(convert, 't_16x16_002.raw'), 'rb').read() == c_raw
+            os.remove(os.path.join(folder, 'bad.png'))
+
+            # changed -> converted again, removed -> its outputs are removed
+            os.utime(os.path.join(folder, 'b.png'), ns=(0, 1))
+            os.remove(os.path.join(folder, 'c.png'))
+            stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped'], stats['removed']) == (1, 1, 1)
+            assert outputs() == ['t_16x16_001.raw', 't_16x16_003.raw']
+
+            # changed and the write fails -> failed, not recorded, converted again by the next run
+            from filelib.filelib import filelib
+            os.utime(os.path.join(folder, 'b.png'), ns=(0, 2))
+            with pytest.MonkeyPatch.context() as mp:
+                mp.setattr(filelib, 'file_write_binary', lambda buf, file_name: False)
+                stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped'], stats['failed']) == (0, 1, 1)
+            stats = imagelib.folder_crop_resize(folder, 't', 16, 16)
+            assert (stats['files'], stats['skipped'], stats['failed']) == (1, 1, 0)
+
+            # process pool, same outputs (numbered in walk order: a, b)
+            stats = imagelib.folder_crop_resize(folder, 'p', 16, 16, workers=2)
+            assert (stats['files'], stats['failed']) == (2, 0)
+            for a, b in (('003', '001'), ('001', '002')):
+                with open(os.path.join(convert, f't_16x16_{a}.raw'), 'rb') as f1, \
+                        open(os.path.join(convert, f'p_16x16_{b}.raw'), 'rb') as f2:
+                    assert f1.read() == f2.read()
+        finally:
+            import shutil
+            shutil.rmtree(folder)
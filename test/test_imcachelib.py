@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from medialib.imagelib import imagelib
+from medialib.imcachelib import imcachelib
+
+
+class Test_imcachelib:
+    folder = 'test_imcachelib'
+    image_file = 'test_imcachelib.png'
+
+    def setup_method(self):
+        rgb = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+        Image.fromarray(rgb).save(Test_imcachelib.image_file)
+
+    def teardown_method(self):
+        shutil.rmtree(Test_imcachelib.folder, ignore_errors=True)
+        if os.path.exists(Test_imcachelib.image_file):
+            os.remove(Test_imcachelib.image_file)
+
+    def test_convert(self):
+        cache = imcachelib(Test_imcachelib.folder)
+        file = Test_imcachelib.image_file
+
+        for conversion in ('im2rgba', 'im2rgb888', 'im2rgb565'):
+            expected = getattr(imagelib, conversion)(file, 40, 30)
+            miss = getattr(cache, conversion)(file, 40, 30)
+            hit = getattr(cache, conversion)(file, 40, 30)
+            assert miss[:4] == expected[:4]
+            assert hit[:4] == expected[:4]
+            assert bytes(hit[4]) == bytes(miss[4]) == expected[4]
+            # the same type for a hit and a miss
+            for buf in (miss[4], hit[4]):
+                assert isinstance(buf, np.ndarray) and buf.ndim == 1 and not buf.flags.writeable
+        assert (cache.hits, cache.misses) == (3, 3)
+
+        # other parameters miss
+        assert cache.im2rgb565(file, 20, 15)[:2] == (20, 15)
+        assert cache.misses == 4
+
+        # a new process (empty memo) hits the same entries
+        cache = imcachelib(Test_imcachelib.folder)
+        cache.im2rgb565(file, 40, 30)
+        assert (cache.hits, cache.misses) == (1, 0)
+
+        # content changed -> miss
+        Image.new('RGB', (80, 60), (1, 2, 3)).save(file)
+        os.utime(file, ns=(0, 1))
+        (_, _, _, _, buf) = cache.im2rgb888(file, 40, 30)
+        assert cache.misses == 1
+        assert (np.frombuffer(buf, dtype=np.uint8).reshape(-1, 3) == (1, 2, 3)).all()
+
+        # not exist
+        assert cache.im2rgb565('not_exist.png') == (0, 0, 0, None, None)
+
+    def test_evict(self):
+        file = Test_imcachelib.image_file
+        gaps = (None, 1.0, 2.0, 3.0)
+        cache = imcachelib(Test_imcachelib.folder)
+        cache.im2rgb888(file, 80, 60, gaps[0])
+        # keep 3 entries (header + 80x60 rgb888)
+        cache.max_bytes = 3 * os.path.getsize(cache.path(cache.key(file, 'im2rgb888', 80, 60, gaps[0])))
+        cache.misses = 0
+
+        for k, gap in enumerate(gaps[:3]):
+            cache.im2rgb888(file, 80, 60, gap)
+            # mtime resolution of file system
+            os.utime(cache.path(cache.key(file, 'im2rgb888', 80, 60, gap)), ns=(k * 10 ** 9, k * 10 ** 9))
+        # touch the oldest one, the 2nd one becomes the least recently used
+        cache.im2rgb888(file, 80, 60, gaps[0])
+        assert (cache.hits, cache.misses, cache.evictions) == (2, 2, 0)
+
+        cache.im2rgb888(file, 80, 60, gaps[3])
+        assert cache.evictions == 1
+        assert cache.total <= cache.max_bytes
+        for gap in (gaps[0], gaps[2], gaps[3]):
+            assert cache.get(cache.key(file, 'im2rgb888', 80, 60, gap)) is not None
+        assert cache.get(cache.key(file, 'im2rgb888', 80, 60, gaps[1])) is None
+
+        cache.clear()
+        assert cache.total == 0
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from medialib.imagelib import imagelib
+from medialib.imindexlib import imindexlib
+
+
+class Test_imindexlib:
+    test_folder = 'test_imindexlib'
+    index_file = 'test_imindexlib.json'
+
+    def test_imindexlib(self):
+        os.makedirs(Test_imindexlib.test_folder, exist_ok=True)
+        png = os.path.join(Test_imindexlib.test_folder, 'a.png')
+        txt = os.path.join(Test_imindexlib.test_folder, 'b.txt')
+        Image.fromarray(np.zeros((20, 30, 4), dtype=np.uint8)).save(png)
+        with open(txt, 'w') as f:
+            f.write('not image')
+
+        with imindexlib(Test_imindexlib.index_file) as index:
+            assert index.populate(Test_imindexlib.test_folder) == 1
+            assert index.get(png) == (30, 20, 4, 'PNG', 'RGBA')
+            assert index.get(txt) is None
+            assert imagelib.getiminfo(png, index) == imagelib.getiminfo(png)
+
+        # reload from file
+        index = imindexlib(Test_imindexlib.index_file)
+        assert index.index[os.path.abspath(png)][2:] == [30, 20, 4, 'PNG', 'RGBA']
+
+        # invalidated by mtime/size
+        Image.fromarray(np.zeros((10, 10), dtype=np.uint8)).save(png)
+        os.utime(png, ns=(0, 0))
+        assert index.getiminfo(png) == (10, 10, 1)
+
+        # a failed save keeps the changes, saved next time
+        index.index_file = os.path.join(txt, 'index.json')
+        assert not index.save() and index.dirty
+        index.index_file = Test_imindexlib.index_file
+        assert index.save() and not index.dirty
+        assert imindexlib(Test_imindexlib.index_file).index[os.path.abspath(png)][2:] == [10, 10, 1, 'PNG', 'L']
+
+        for file in (png, txt, Test_imindexlib.index_file):
+            os.remove(file)
+        os.rmdir(Test_imindexlib.test_folder)
@@ -0,0 +1,115 @@
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from medialib.geomlib import geomlib
+from medialib.imagelib import PIX_FMT, imagelib
+from medialib.pipelib import pipelib
+
+
+class Test_pipelib:
+    image = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+
+    def setup_method(self):
+        # static backend choice, never read the calibration in HOME
+        (self.calibration_file, geomlib.calibration_file) = (geomlib.calibration_file, None)
+        geomlib.table = None
+
+    def teardown_method(self):
+        geomlib.calibration_file = self.calibration_file
+        geomlib.table = None
+
+    def test_run(self):
+        image = Test_pipelib.image
+        pipe = pipelib().center_square().resize(32, 32).rotate(90).to('rgb565')
+        out = pipe.run(image)
+
+        expected = geomlib.rotate(cv2.resize(image[:, 10:70], (32, 32), interpolation=cv2.INTER_AREA), 90)
+        assert np.array_equal(pipe.image, expected)
+        assert np.array_equal(out, imagelib.rgb8882rgb565(expected, out=np.empty((32, 32, 2), np.uint8)))
+
+        # compiled once, buffers are reused
+        assert pipe.run(image[::-1].copy()) is out
+        assert len(pipe.compiled) == 1
+        assert set(pipe.timings) == {'center_square', 'resize', 'rotate', 'to'}
+        assert all(runs == 2 for _, runs in pipe.timings.values())
+
+        # bgr input
+        bgr = pipe.run(np.ascontiguousarray(image[..., ::-1]), 'bgr888')
+        assert np.array_equal(bgr, pipe.run(image))
+        assert len(pipe.compiled) == 2
+
+        # bounded, the least recently used geometry is dropped
+        for k in range(pipelib.MAX_COMPILED):
+            pipe.run(np.zeros((40 + k, 40, 3), np.uint8))
+        assert len(pipe.compiled) == pipelib.MAX_COMPILED
+        assert (image.shape, image.dtype, PIX_FMT.RGB888) not in pipe.compiled
+
+    def test_views(self):
+        image = Test_pipelib.image
+        pipe = pipelib().crop(10, 5, 20, 100)
+        out = pipe(image)
+        assert out.shape == (55, 20, 3) and np.shares_memory(out, image)
+
+        # non-right angle, aspect kept resize
+        pipe = pipelib().resize(40).rotate(30)
+        out = pipe(image)
+        assert np.array_equal(out, geomlib.rotate(cv2.resize(image, (40, 30), interpolation=cv2.INTER_AREA), 30))
+
+        # not supported format
+        assert pipelib().to('yuyv').run(np.zeros((4, 4, 2), np.uint8), 'rgb565') is None
+
+    def test_file_crop_resize(self):
+        folder = 'test_pipelib'
+        os.makedirs(folder, exist_ok=True)
+        cv2.imwrite(os.path.join(folder, 'a.png'), Test_pipelib.image)
+
+        stats = imagelib.folder_crop_resize(folder, 'test', 32, 24, workers=1)
+        assert stats['files'] == 1 and stats['failed'] == 0
+        raw = np.fromfile(os.path.join(folder, 'convert', 'test_32x24_001.raw'), dtype=np.uint8)
+        jpg = cv2.imread(os.path.join(folder, 'convert', 'test_32x24_001.jpg'))
+        assert raw.size == 32 * 24 * 2 and jpg.shape == (24, 32, 3)
+
+        expected = cv2.resize(Test_pipelib.image[:, 10:70], (32, 24), interpolation=cv2.INTER_AREA)
+        assert np.array_equal(raw, imagelib.bgr8882rgb565(expected, out=np.empty((24, 32, 2), np.uint8)).ravel())
+
+        # no resize (0x0 keeps the square size), the skipped stage has no timing
+        timings = imagelib.file_crop_resize(os.path.join(folder, 'a.png'), os.path.join(folder, 'square'), 0, 0)
+        assert timings['resize'] == 0.0 and cv2.imread(os.path.join(folder, 'square.jpg')).shape == (60, 60, 3)
+
+        # cv2 can't decode gif, decoded by PIL
+        from PIL import Image
+        Image.fromarray(Test_pipelib.image[..., 0]).save(os.path.join(folder, 'a.gif'))
+        imagelib.file_crop_resize(os.path.join(folder, 'a.gif'), os.path.join(folder, 'gif'), 32, 24)
+        gif = cv2.imread(os.path.join(folder, 'gif.jpg'))
+        assert gif.shape == (24, 32, 3)
+        shutil.rmtree(folder)
+
+    def test_file_crop_resize_threads(self):
+        folder = 'test_pipelib_threads'
+        os.makedirs(folder, exist_ok=True)
+        rng = np.random.default_rng(1)
+        images = [rng.integers(0, 256, (60, 80, 3), dtype=np.uint8) for _ in range(4)]
+        for k, image in enumerate(images):
+            cv2.imwrite(os.path.join(folder, f'{k}.png'), image)
+
+        # the same size on several threads, each thread has its own pipelib and buffers
+        from concurrent.futures import ThreadPoolExecutor
+
+        def convert(k):
+            for r in range(20):
+                imagelib.file_crop_resize(os.path.join(folder, f'{k}.png'), os.path.join(folder, f'{k}_{r}'), 32, 24)
+            return k
+
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(convert, range(len(images))))
+
+        for k, image in enumerate(images):
+            expected = imagelib.bgr8882rgb565(cv2.resize(image[:, 10:70], (32, 24), interpolation=cv2.INTER_AREA),
+                                              out=np.empty((24, 32, 2), np.uint8)).ravel()
+            for r in range(20):
+                raw = np.fromfile(os.path.join(folder, f'{k}_{r}.raw'), dtype=np.uint8)
+                assert np.array_equal(raw, expected)
+        shutil.rmtree(folder)
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from medialib.rawlib import rawlib
+
+
+class Test_rawlib:
+    test_file = 'test_rawlib.raw'
+
+    def test_rawlib(self):
+        frames = np.random.default_rng(0).integers(0, 256, (3, 6, 8, 2), dtype=np.uint8)
+
+        assert rawlib.write(Test_rawlib.test_file, frames[0], 'rgb565', 8, 6, {'source': 'test'})
+        assert rawlib.append(Test_rawlib.test_file, [frames[1].tobytes(), frames[2]])
+        assert not rawlib.append(Test_rawlib.test_file, b'\0' * 10)
+
+        header = rawlib.read_header(Test_rawlib.test_file)
+        assert header['frame_count'] == 3
+        assert (header['width'], header['height'], header['pix_fmt']) == (8, 6, 'rgb565')
+        assert header['stride'] == 16 and header['header_size'] % 64 == 0
+        assert header['meta'] == {'source': 'test'}
+
+        with rawlib(Test_rawlib.test_file) as raw:
+            assert len(raw) == 3
+            assert (raw.frames == frames).all()
+            assert (raw.frame(-1) == frames[2]).all()
+            assert raw.frame(3) is None
+            # zero copy
+            assert not raw.frame(1).flags.owndata and not raw.frame(1).flags.writeable
+
+        # planar format
+        nv12 = np.arange(9 * 8, dtype=np.uint8).reshape(9, 8)
+        assert rawlib.write(Test_rawlib.test_file, nv12, 'nv12', 8, 6)
+        with rawlib(Test_rawlib.test_file) as raw:
+            assert (raw.frame(0) == nv12).all()
+
+        # not a container
+        with open(Test_rawlib.test_file, 'wb') as f:
+            f.write(b'\0' * 64)
+        assert rawlib.read_header(Test_rawlib.test_file) is None
+
+        if os.path.exists(Test_rawlib.test_file):
+            os.remove(Test_rawlib.test_file)
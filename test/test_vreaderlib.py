@@ -0,0 +1,138 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from medialib.vreaderlib import vreaderlib
+
+
+class Test_vreaderlib:
+    video_file = 'test_vreaderlib.mp4'
+    frame_count = 60
+
+    def setup_method(self):
+        # bit i of frame number k is stripe i (8 pixels wide), white for 1 (survives lossy coding)
+        writer = cv2.VideoWriter(Test_vreaderlib.video_file, cv2.VideoWriter_fourcc(*'mp4v'), 30, (64, 48))
+        for k in range(Test_vreaderlib.frame_count):
+            bits = np.array([(k >> i) & 1 for i in range(8)], dtype=np.uint8) * 255
+            writer.write(np.repeat(bits, 8)[None, :, None].repeat(48, axis=0).repeat(3, axis=2))
+        writer.release()
+
+    def teardown_method(self):
+        for file in (Test_vreaderlib.video_file, vreaderlib.index_file(Test_vreaderlib.video_file)):
+            if os.path.exists(file):
+                os.remove(file)
+
+    @staticmethod
+    def is_frame(result: tuple, k: int):
+        (n, _, frame) = result
+        bits = frame.reshape(48, 8, 8, 3).mean(axis=(0, 2, 3)) > 128
+        return n == k and sum(int(b) << i for i, b in enumerate(bits)) == k
+
+    def test_index(self):
+        index = vreaderlib.get_index(Test_vreaderlib.video_file)
+        assert index['frames'] == Test_vreaderlib.frame_count
+        assert len(index['stamps']) == Test_vreaderlib.frame_count and index['stamps'][0] == 0.0
+        assert index['keyframes'] is None or index['keyframes'][0] == 0
+
+        # cached next to the file, invalid once the file is changed
+        assert os.path.isfile(vreaderlib.index_file(Test_vreaderlib.video_file))
+        assert vreaderlib.load_index(Test_vreaderlib.video_file) == index
+        st = os.stat(Test_vreaderlib.video_file)
+        os.utime(Test_vreaderlib.video_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+        assert vreaderlib.load_index(Test_vreaderlib.video_file) is None
+
+    def test_read(self):
+        with vreaderlib(Test_vreaderlib.video_file, queue_size=4) as vr:
+            for k in range(Test_vreaderlib.frame_count):
+                assert Test_vreaderlib.is_frame(vr.read(), k)
+            assert vr.read() == (-1, 0.0, None)
+            assert vr.read() == (-1, 0.0, None)
+
+            # seek after the end of file
+            assert Test_vreaderlib.is_frame(vr.read_at(10), 10)
+            assert Test_vreaderlib.is_frame(vr.read(), 11)
+
+    def test_random_access(self):
+        with vreaderlib(Test_vreaderlib.video_file, history=8) as vr:
+            for k in (30, 31, 32, 35, 50, 5, 6, 3, 40, 59):
+                assert Test_vreaderlib.is_frame(vr.read_at(k), k)
+            assert vr.counts['grab'] and vr.counts['seek']
+
+            # back into the history, then on into the queue
+            for k in range(20, 30):
+                assert Test_vreaderlib.is_frame(vr.read_at(k) if k == 20 else vr.read(), k)
+            replays = vr.counts['replay']
+            for k in range(25, 35):
+                assert Test_vreaderlib.is_frame(vr.read_at(k) if k == 25 else vr.read(), k)
+            assert vr.counts['replay'] == replays + 1
+
+            # skip forward into the queue, then back into the history: contiguous again
+            vr.read_at(0)
+            for k in range(1, 10):
+                assert Test_vreaderlib.is_frame(vr.read(), k)
+            deadline = time.time() + 5
+            while vr.queue.qsize() < 4 and time.time() < deadline:
+                time.sleep(0.01)
+            skips = vr.counts['skip']
+            vr.seek(12)
+            assert vr.counts['skip'] == skips + 1
+            vr.seek(5)
+            for k in range(5, 15):
+                assert Test_vreaderlib.is_frame(vr.read(), k)
+
+            n = vr.frame_at(vr.index['stamps'][42])
+            assert n == 42 and Test_vreaderlib.is_frame(vr.read_time(vr.index['stamps'][42] + 1), 42)
+
+    def test_seek_race(self):
+        with vreaderlib(Test_vreaderlib.video_file, queue_size=4) as vr:
+            for k in range(4):
+                assert Test_vreaderlib.is_frame(vr.read(), k)
+
+            # the reader waits while seek drops stale frames, give the worker time to queue the target
+            get_nowait = vr.queue.get_nowait
+
+            def slow_get_nowait():
+                vr.queue.get_nowait = get_nowait
+                while not vr.queue.empty():
+                    get_nowait()
+                vr.waiting = True
+                deadline = time.time() + 1
+                while vr.queue.empty() and time.time() < deadline:
+                    time.sleep(0.01)
+                return get_nowait()
+
+            vr.queue.get_nowait = slow_get_nowait
+            vr.seek(40)
+            assert Test_vreaderlib.is_frame(vr.read(), 40)
+            assert Test_vreaderlib.is_frame(vr.read(), 41)
+
+    def test_read_stopped(self):
+        import threading
+
+        class stream_slow:
+            # a stream hanging in read()
+            def __init__(self, stream):
+                self.stream = stream
+
+            def read(self):
+                time.sleep(2)
+                return self.stream.read()
+
+            def __getattr__(self, name):
+                return getattr(self.stream, name)
+
+        with vreaderlib(Test_vreaderlib.video_file) as vr:
+            assert Test_vreaderlib.is_frame(vr.read(), 0)
+            vr.stream = stream_slow(vr.stream)
+            # frames decoded before the stream hangs
+            time.sleep(0.1)
+            while not vr.queue.empty():
+                vr.queue.get_nowait()
+
+            # stopped while the reader waits
+            threading.Timer(0.2, vr.stop).start()
+            start = time.time()
+            assert vr.read() == (-1, 0.0, None)
+            assert time.time() - start < 1.5
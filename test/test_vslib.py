@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from medialib.vslib import vslib
+
+
+class Test_vslib:
+    video_file = 'test_vslib.avi'
+    frame_count = 20
+
+    def setup_method(self):
+        # frame k is filled with k * 10 (MJPG keeps flat frames almost exactly)
+        writer = cv2.VideoWriter(Test_vslib.video_file, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+        for k in range(Test_vslib.frame_count):
+            writer.write(np.full((48, 64, 3), k * 10, dtype=np.uint8))
+        writer.release()
+
+    def teardown_method(self):
+        if os.path.exists(Test_vslib.video_file):
+            os.remove(Test_vslib.video_file)
+
+    @staticmethod
+    def value(frame: np.ndarray):
+        return int(round(frame.mean() / 10))
+
+    @staticmethod
+    def wait_eof(vs: vslib):
+        deadline = time.time() + 5
+        while vs.seq < Test_vslib.frame_count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_ring(self):
+        with vslib(Test_vslib.video_file, ring_size=8) as vs:
+            assert vs.read_latest() == (0, 0.0, None)
+            assert vs.read_next(0) == (0, 0.0, None)
+
+            vs.start()
+            Test_vslib.wait_eof(vs)
+            assert vs.seq == Test_vslib.frame_count
+
+            (seq, stamp, frame) = vs.read_latest()
+            assert seq == Test_vslib.frame_count and stamp > 0
+            assert Test_vslib.value(frame) == seq - 1
+            assert np.array_equal(vs.read(), frame)
+
+            # the latest 7 frames are kept (one slot is for the frame being captured)
+            window = vs.read_window(100)
+            assert [s for s, _, _ in window] == list(range(Test_vslib.frame_count - 6, Test_vslib.frame_count + 1))
+            assert [Test_vslib.value(f) for _, _, f in window] == [s - 1 for s, _, _ in window]
+            assert all(a[1] <= b[1] for a, b in zip(window, window[1:]))
+            assert [s for s, _, _ in vs.read_window(2)] == [Test_vslib.frame_count - 1, Test_vslib.frame_count]
+
+            # fell behind -> the oldest one in the ring
+            assert vs.read_next(0)[0] == Test_vslib.frame_count - 6
+            assert vs.read_next(Test_vslib.frame_count - 2)[0] == Test_vslib.frame_count - 1
+            assert vs.read_next(Test_vslib.frame_count) == (0, 0.0, None)
+
+            # slot itself without copy
+            (_, _, slot) = vs.read_latest(copy=False)
+            assert np.shares_memory(slot, vs.ring)
+
+    def test_direct_read(self):
+        with vslib(Test_vslib.video_file) as vs:
+            assert vs.read() is None
+            for k in range(3):
+                frame = vs._read()
+                # published to the ring, read() returns a copy of it
+                assert vs.seq == k + 1 and Test_vslib.value(frame) == k
+                assert np.array_equal(vs.read(), frame) and vs.read() is not frame
+                assert vs.read_latest()[0] == k + 1
+
+    def test_blocking_read(self):
+        received = []
+        with vslib(Test_vslib.video_file, ring_size=32) as vs:
+            # legacy self.frame is kept in sync with the latest frame
+            vs.subscribe(lambda seq, stamp, frame: received.append((seq, Test_vslib.value(frame), vs.frame is frame)))
+            # not capturing, return at once
+            assert vs.read_next(0, timeout=None) == (0, 0.0, None)
+
+            vs.start()
+            seqs = []
+            seq = 0
+            while True:
+                (seq, _, frame) = vs.read_next(seq, timeout=2.0)
+                if frame is None:
+                    break
+                assert Test_vslib.value(frame) == seq - 1
+                seqs.append(seq)
+            # every frame exactly once, woken at end of file (not by timeout)
+            assert seqs == list(range(1, Test_vslib.frame_count + 1))
+            assert received == [(k, k - 1, True) for k in range(1, Test_vslib.frame_count + 1)]
+            # end of file
+            assert vs.frame is None and not vs.grabbed
+
+            start = time.perf_counter()
+            assert vs.read_latest(after_seq=Test_vslib.frame_count, timeout=2.0)[0] == 0
+            assert time.perf_counter() - start < 1.0
+            assert vs.read_latest(after_seq=Test_vslib.frame_count - 1, timeout=2.0)[0] == Test_vslib.frame_count
+
+    def test_cam_cache(self, monkeypatch):
+        probed = []
+
+        def probe_res(index: int):
+            time.sleep(0.2)
+            probed.append(index)
+            return None if index == 3 else {'640x480': {'w': 640, 'h': 480, 'default': True}}
+
+        devices = {0: 'v4l2/cam_a', 1: 'v4l2/cam_b', 3: 'v4l2/meta'}
+        monkeypatch.setattr(vslib, 'cam_cache_file', 'test_vslib_cams.json')
+        monkeypatch.setattr(vslib, 'device_id', lambda index: devices.get(index))
+        monkeypatch.setattr(vslib, '_probe_res', probe_res)
+        try:
+            # probed concurrently
+            start = time.perf_counter()
+            cams = vslib.get_cam_list_res(4)
+            assert time.perf_counter() - start < 0.5
+            assert sorted(probed) == [0, 1, 3]
+            assert sorted(cams) == [0, 1] and cams[0]['640x480']['default']
+            assert os.path.isfile(vslib.cam_cache_file)
+
+            # cameras are cached, a device that can't be opened (e.g. busy) and a new device are probed
+            probed.clear()
+            assert vslib.get_cam_list_res(4) == cams
+            assert probed == [3]
+            probed.clear()
+            devices[2] = 'v4l2/cam_c'
+            assert sorted(vslib.get_cam_list_res(4)) == [0, 1, 2]
+            assert sorted(probed) == [2, 3]
+
+            # windows media foundation identity is cached
+            probed.clear()
+            devices[2] = 'msmf/cam_d/\\\\?\\usb#vid_046d&pid_0825&mi_00#7&1a2b3c&0&0000#{e5323777}\\global'
+            assert sorted(vslib.get_cam_list_res(4)) == [0, 1, 2]
+            assert sorted(probed) == [2, 3]
+            assert devices[2] in vslib.load_cam_cache()
+            if sys.platform != 'win32':
+                assert vslib._msmf_devices() is None
+
+            # fallback identity (backend/index/default resolution) isn't unique, not cached
+            probed.clear()
+            devices[2] = 'AVFOUNDATION/2/640x480'
+            assert sorted(vslib.get_cam_list_res(4)) == [0, 1, 2]
+            assert sorted(probed) == [2, 3]
+            assert devices[2] not in vslib.load_cam_cache()
+
+            probed.clear()
+            vslib.get_cam_list_res(4, use_cache=False)
+            assert sorted(probed) == [0, 1, 2, 3]
+        finally:
+            if os.path.exists('test_vslib_cams.json'):
+                os.remove('test_vslib_cams.json')
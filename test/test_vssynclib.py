@@ -0,0 +1,133 @@
+import os
+
+import cv2
+import numpy as np
+
+from medialib.vssynclib import vssynclib
+
+
+class Test_vssynclib:
+    video_files = ['test_vssynclib0.avi', 'test_vssynclib1.avi', 'test_vssynclib2.avi']
+    frame_count = 20
+
+    def setup_method(self):
+        # frame k of video i is filled with k * 10 + i * 3
+        for i, file in enumerate(Test_vssynclib.video_files):
+            writer = cv2.VideoWriter(file, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+            for k in range(Test_vssynclib.frame_count):
+                writer.write(np.full((48, 64, 3), k * 10 + i * 3, dtype=np.uint8))
+            writer.release()
+
+    def teardown_method(self):
+        for file in Test_vssynclib.video_files:
+            if os.path.exists(file):
+                os.remove(file)
+
+    @staticmethod
+    def is_frame(frames: list, k: int):
+        # frame k of every video (MJPG is off by a level or two)
+        return all(abs(f.mean() - (k * 10 + i * 3)) < 1.5 for i, f in enumerate(frames))
+
+    def test_sync(self):
+        received = []
+        with vssynclib(Test_vssynclib.video_files) as sync:
+            assert sync.is_opened()
+            assert sync.read_set() is None
+            sync.subscribe(lambda fs: received.append((fs['seq'], Test_vssynclib.is_frame(fs['frames'], fs['seq'] - 1))))
+
+            sync.start()
+            sets = []
+            seq = 0
+            while True:
+                frame_set = sync.read_set(after_seq=seq, timeout=2.0)
+                if frame_set is None:
+                    break
+                seq = frame_set['seq']
+                sets.append(frame_set)
+
+            # subscribers get every set, sources are in lockstep (frame k of every video in set k + 1)
+            assert received == [(k, True) for k in range(1, Test_vssynclib.frame_count + 1)]
+            assert sets and sets[-1]['seq'] == Test_vssynclib.frame_count
+            for frame_set in sets:
+                assert Test_vssynclib.is_frame(frame_set['frames'], frame_set['seq'] - 1)
+                assert len(frame_set['stamps']) == 3
+                assert frame_set['skew'] == max(frame_set['stamps']) - min(frame_set['stamps']) >= 0
+
+            stats = sync.stats()
+            assert stats['sets'] == Test_vssynclib.frame_count and stats['dropped'] == 0
+            assert 0 <= stats['skew_mean_ms'] <= stats['skew_p95_ms'] <= stats['skew_max_ms']
+
+            # slots without copy
+            frame_set = sync.read_set(copy=False)
+            assert frame_set['seq'] == Test_vssynclib.frame_count
+            assert frame_set['frames'][0] is sync.slots[sync.seq_index][0]
+
+    def test_source_fail(self):
+        class stream_fail:
+            # a camera that stops grabbing after some frames
+            def __init__(self, stream, frames: int):
+                (self.stream, self.frames) = (stream, frames)
+
+            def grab(self):
+                self.frames -= 1
+                return self.stream.grab() if self.frames >= 0 else False
+
+            def __getattr__(self, name):
+                return getattr(self.stream, name)
+
+        with vssynclib(Test_vssynclib.video_files) as sync:
+            sync.srcs[1] = 1
+            sync.sources[1].stream = stream_fail(sync.sources[1].stream, 3)
+            sync.start()
+            for thread in sync.threads:
+                thread.join(5)
+
+            # the other sources kept retrieving for many rounds, the latest complete set stays intact
+            frame_set = sync.read_set()
+            assert frame_set['seq'] == 3 and Test_vssynclib.is_frame(frame_set['frames'], 2)
+            assert sync.stats()['dropped'] > sync.ring_size
+
+    def test_restart(self):
+        with vssynclib(Test_vssynclib.video_files) as sync:
+            sync.start()
+            frame_set = sync.read_set(timeout=2.0)
+            assert frame_set is not None
+            sync.stop()
+            assert not sync.capturing()
+
+            # captures again after the latest set
+            seq = sync.read_set()['seq']
+            assert sync.start() is sync
+            frame_set = sync.read_set(after_seq=seq, timeout=2.0)
+            assert frame_set is not None and frame_set['seq'] > seq
+
+    def test_source_hang(self):
+        import threading
+        import time
+
+        class stream_hang:
+            # a camera hanging in grab() until it's released
+            def __init__(self, stream, event: threading.Event):
+                (self.stream, self.event) = (stream, event)
+
+            def grab(self):
+                self.event.wait()
+                return self.stream.grab()
+
+            def __getattr__(self, name):
+                return getattr(self.stream, name)
+
+        event = threading.Event()
+        try:
+            with vssynclib(Test_vssynclib.video_files, barrier_timeout=0.5) as sync:
+                sync.sources[1].stream = stream_hang(sync.sources[1].stream, event)
+                sync.start()
+                time.sleep(0.2)
+
+                # stop() returns while the source hangs, not restarted until its thread ends
+                start = time.perf_counter()
+                sync.stop()
+                assert time.perf_counter() - start < 2.0
+                assert sync.threads[1].is_alive() and sync.start() is None
+        finally:
+            event.set()
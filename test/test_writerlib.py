@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+from filelib.filelib import filelib
+from filelib.writerlib import writerlib
+
+
+class Test_writerlib:
+    test_file = 'test_writerlib_{}.raw'
+
+    def test_write(self):
+        frame = np.zeros((16, 16, 2), dtype=np.uint8)
+        files = [Test_writerlib.test_file.format(k) for k in range(8)]
+
+        with writerlib(max_queue=2) as writer:
+            for k, file in enumerate(files):
+                # reuse the buffer, the queued job keeps its own copy
+                frame[...] = k
+                assert writer.write([frame, b'end'], file)
+            writer.flush()
+            assert writer.files == len(files)
+
+        assert writer.bytes == len(files) * (frame.nbytes + 3) and writer.bps > 0
+        assert writer.errors == 0 and writer.dropped == 0
+        for k, file in enumerate(files):
+            assert filelib.file_read_binary(file) == bytes([k]) * frame.nbytes + b'end'
+            os.remove(file)
+
+        # closed
+        assert writer.write([b'x'], files[0]) is False
+
+    def test_drop(self):
+        writer = writerlib(max_queue=1)
+        # hold the worker with a job that blocks on a generator
+        import threading
+        (started, event) = (threading.Event(), threading.Event())
+
+        def chunks():
+            started.set()
+            event.wait()
+            yield b'x'
+
+        file = Test_writerlib.test_file.format('drop')
+        assert writer.write(chunks(), file, copy=False)
+        # wait until the worker takes the job, then fill the queue
+        assert started.wait(5)
+        assert writer.write([b'y'], file)
+        assert writer.write([b'z'], file, block=False) is False
+        assert writer.dropped == 1
+
+        event.set()
+        writer.close()
+        assert writer.files == 2
+        assert filelib.file_read_binary(file) == b'y'
+        os.remove(file)